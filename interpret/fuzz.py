@@ -0,0 +1,507 @@
+
+import asyncio
+import getopt
+import html
+import io
+import os
+import random
+import sys
+
+from interpret import Compiler, Exceptions, Program, Scheduler
+
+USAGE = """
+\bUsage: python fuzz.py [--help|OPTIONS]\n
+\bGenerates random IPPcode23 programs (as XML) with random inputs and runs each of them
+\bwithout optimizations and in every optimized mode. Programs whose output or exit code differ
+\bare minimized and printed.
+\b
+\bOPTIONS:
+\b--help           Show this message and exit.
+\b--seed=N         Seed of the first program (default: random).
+\b--count=N        Number of programs (default: 100).
+\b--size=N         Approximate number of instructions of a program (default: 40).
+\b--modes=LIST     Comma separated modes compared with the baseline (default: all of them):
+\b                 optimizations of `Program.OPTIMIZATIONS` one by one, all, lazy, async, compiled.
+\b--quota=N        Maximal number of instructions of a baseline run (default: 100000),
+\b                 programs that need more are skipped.
+\b--out=DIR        Write minimized programs (.src, .xml and .in) into DIR.
+\b
+\bExit code is 1 when any divergence was found, otherwise 0.
+"""
+
+MODES = Program.OPTIMIZATIONS + ("all", "lazy", "async", "compiled")
+
+
+class ProgramGenerator():
+    """
+        Class that generates random well-formed programs. Programs always end: every loop
+        has its own counter that nothing else writes, jumps only skip forward inside of the same
+        block and subroutines call only the subroutines defined after them.
+
+        Every variable has one type for the whole program, so most of the programs run long
+        enough to be interesting. Errors come from a small share of operands of random types,
+        from values (like division by zero) and from input.
+
+        Instructions are tuples (opcode, [(type of operand, text of operand), ...]).
+
+        Methods:
+            generate(): Returns new program and its input lines
+    """
+
+    TYPES = ("int", "float", "string", "bool")
+    STRINGS = ("", "a", "ab", "hello", "x\\032y", "\\092", "řč", "line\\010", "Z")
+    FLOATS = (0.0, 0.5, -1.25, 3.0, 0.1, 1e10)
+    NOISE = 0.01  # probability of operand of random type
+
+    # stack instruction: (type of operands, type of result)
+    STACK = {"ADDS": None, "SUBS": None, "MULS": None, "IDIVS": "int", "DIVS": "float",
+             "LTS": "bool", "GTS": "bool", "EQS": "bool", "ANDS": "bool", "ORS": "bool"}
+
+    def __init__(self, rng: random.Random, size=40):
+        self.rng = rng
+        self.size = size
+
+    def generate(self) -> tuple:
+        """
+            Return:
+                (list of instructions, list of input lines)
+        """
+        rng = self.rng
+        # every type has at least one variable, GF@r has no type (READ and POPS of anything)
+        self.types = {f"GF@v{idx}": _type for idx, _type in enumerate(
+            self.TYPES + tuple(rng.choice(self.TYPES) for _ in range(rng.randint(0, 3))))}
+        self.types["GF@r"] = None
+        self.counters = []
+        self.undeclared = set()
+        self.labels = 0
+        self.functions = rng.randint(0, 3)
+
+        initialization = [("MOVE", [("var", name), self.constant(_type or "int")])
+                          for name, _type in self.types.items() if rng.random() > 0.02]
+        main = initialization + self.block(0, self.size, 0)
+        functions = []
+        for function in range(1, self.functions + 1):
+            functions += self.function(function)
+
+        declarations = [("DEFVAR", [("var", name)])
+                        for name in list(self.types) + [f"GF@{counter}" for counter in self.counters
+                                                        if counter not in self.undeclared]
+                        if rng.random() > 0.01]
+        rng.shuffle(declarations)
+        instructions = declarations + main
+        if functions:
+            instructions += [("JUMP", [("label", "end")])] + functions + [("LABEL", [("label", "end")])]
+        elif rng.random() < 0.2:
+            instructions.append(("EXIT", [("int", str(rng.randint(0, 49)))]))
+
+        inputs = [rng.choice((str(rng.randint(-9, 99)), "true", "false", "abc", "", "0x1.8p+1", "nil"))
+                  for _ in range(rng.randint(0, 6))]
+        return instructions, inputs
+
+    def function(self, number: int) -> list:
+        """
+            Returns subroutine, that mostly has its own frame with one variable LF@l
+        """
+        rng = self.rng
+        instructions = [("LABEL", [("label", f"f{number}")])]
+        frame = rng.random() < 0.7
+        if frame:
+            self.types["LF@l"] = rng.choice(self.TYPES)
+            instructions += [("CREATEFRAME", []), ("PUSHFRAME", []), ("DEFVAR", [("var", "LF@l")]),
+                             ("MOVE", [("var", "LF@l"), self.constant(self.types["LF@l"])])]
+        instructions += self.block(1, self.size // 4, number)
+        if frame:
+            del self.types["LF@l"]
+            instructions.append(("POPFRAME", []))
+        return instructions + [("RETURN", [])]
+
+    def label(self) -> str:
+        self.labels += 1
+        return f"l{self.labels}"
+
+    def _type(self, _type):
+        if self.rng.random() < self.NOISE:
+            return self.rng.choice(self.TYPES + ("nil",))
+        return _type
+
+    def var(self, _type=None) -> tuple:
+        """
+            Returns variable, that can be written into, of given type (GF@r if there is none)
+        """
+        rng = self.rng
+        if rng.random() < self.NOISE:
+            return ("var", rng.choice(list(self.types) + ["GF@undefined"]))
+        typed = [name for name, var_type in self.types.items() if var_type == _type]
+        return ("var", rng.choice(typed)) if typed else ("var", "GF@r")
+
+    def constant(self, _type: str) -> tuple:
+        rng = self.rng
+        if _type == "int":
+            # ints that a double can't hold exactly cover INT2FLOAT(S), typed stack and counted loop float paths
+            return ("int", str(rng.choice((0, 1, 2, -3, 7, 10, 65, rng.randint(-100, 100), 2 ** 53 + 1,
+                                           2 ** 63 - 1, 2 ** 70, 10 ** 400))))
+        if _type == "float":
+            return ("float", rng.choice(self.FLOATS).hex())
+        if _type == "string":
+            return ("string", rng.choice(self.STRINGS))
+        if _type == "bool":
+            return ("bool", rng.choice(("true", "false")))
+        return ("nil", "nil")
+
+    def symb(self, _type=None) -> tuple:
+        """
+            Returns constant or variable (also loop counters) of given type
+        """
+        rng = self.rng
+        _type = self._type(_type or rng.choice(self.TYPES + ("nil",)))
+        names = [name for name, var_type in self.types.items() if var_type == _type]
+        names += [f"GF@{counter}" for counter in self.counters
+                  if _type == "int" and counter[0] == "c" and counter not in self.undeclared]
+        if names and rng.random() < 0.5:
+            return ("var", rng.choice(names))
+        return self.constant(_type)
+
+    def index(self) -> tuple:
+        """
+            Returns index into string (mostly small int)
+        """
+        if self.rng.random() < 0.9:
+            return ("int", "0")
+        return self.symb("int")
+
+    def divisor(self, _type: str) -> tuple:
+        """
+            Returns operand, that is mostly not zero
+        """
+        if self.rng.random() < 0.9 and _type in ("int", "float"):
+            value = self.rng.choice((1, 2, -3, 7))
+            return ("int", str(value)) if _type == "int" else ("float", float(value).hex())
+        return self.symb(_type)
+
+    def code(self) -> tuple:
+        """
+            Returns operand, that is mostly valid Unicode code point
+        """
+        if self.rng.random() < 0.9:
+            return ("int", str(self.rng.randint(32, 382)))
+        return self.symb("int")
+
+    def block(self, depth: int, budget: int, function: int) -> list:
+        """
+            Returns random block of instructions. Labels of forward jumps are placed
+            between its statements.
+        """
+        rng = self.rng
+        instructions = []
+        pending = []
+        while budget > 0:
+            if pending and rng.random() < 0.3:
+                instructions.append(("LABEL", [("label", pending.pop())]))
+            kind = rng.random()
+            if kind < 0.06 and depth < 2:
+                body = self.loop(depth, min(budget, 12), function)
+            elif kind < 0.12:
+                label = self.label()
+                pending.append(label)
+                body = self.jump(label)
+            elif kind < 0.16 and function < self.functions:
+                body = [("CALL", [("label", f"f{rng.randint(function + 1, self.functions)}")])]
+                if rng.random() < 0.5:
+                    # frame of the subroutine is TF after it returns (if it has any)
+                    body.append(("WRITE", [("var", "TF@l")]))
+            else:
+                body = self.statement()
+            instructions += body
+            budget -= len(body)
+        return instructions + [("LABEL", [("label", label)]) for label in pending]
+
+    def jump(self, label: str) -> list:
+        rng = self.rng
+        opcode = rng.choice(("JUMP", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS"))
+        _type = rng.choice(self.TYPES + ("nil",))
+        if opcode == "JUMP":
+            return [(opcode, [("label", label)])]
+        if opcode in ("JUMPIFEQ", "JUMPIFNEQ"):
+            return [(opcode, [("label", label), self.symb(_type), self.symb(_type)])]
+        return [("PUSHS", [self.symb(_type)]), ("PUSHS", [self.symb(_type)]), (opcode, [("label", label)])]
+
+    def loop(self, depth: int, budget: int, function: int) -> list:
+        """
+            Returns counted loop (do-while or while) with a new counter. Some bodies are made
+            of a single update, so the loop is run at once by `LoopIdioms`. A few counters are
+            never declared nor initialized, so the first use inside of the loop fails.
+        """
+        rng = self.rng
+        counter = f"c{len(self.counters)}"
+        self.counters.append(counter)
+        var = ("var", f"GF@{counter}")
+        head, end = self.label(), self.label()
+        trips = rng.randint(1, 5)
+        if rng.random() < 0.3:
+            # body of updates only, that `LoopIdioms` runs at once
+            accumulator = self.var("int")
+            body = [(rng.choice(("ADD", "SUB")), [accumulator, accumulator, self.constant("int")])]
+        else:
+            body = self.block(depth + 1, budget, function)
+        do_while = rng.random() < 0.5
+        start = str(trips) if do_while else "0"
+        initialization = [("MOVE", [var, ("int", start)])]
+        if rng.random() < 0.1:
+            self.undeclared.add(counter)
+            initialization = []
+
+        if do_while:
+            # do-while, counts down to 0
+            return (initialization + [("LABEL", [("label", head)])] + body
+                    + [("SUB", [var, var, ("int", "1")]),
+                       ("JUMPIFNEQ", [("label", head), var, ("int", "0")])])
+        # while, counts up to the bound
+        test = ("var", f"GF@t{len(self.counters)}")
+        self.counters.append(test[1][3:])
+        return (initialization + [("LABEL", [("label", head)]),
+                                  ("LT", [test, var, ("int", str(trips))]),
+                                  ("JUMPIFNEQ", [("label", end), test, ("bool", "true")])] + body
+                + [("ADD", [var, var, ("int", "1")]), ("JUMP", [("label", head)]),
+                   ("LABEL", [("label", end)])])
+
+    def statement(self) -> list:
+        rng = self.rng
+        kind = rng.randrange(16)
+        if kind == 0:
+            var = self.var(rng.choice(self.TYPES + (None,)))
+            return [("MOVE", [var, self.symb(self.types.get(var[1]))])]
+        if kind in (1, 2, 3):
+            opcode = rng.choice(("ADD", "SUB", "MUL", "IDIV", "DIV"))
+            _type = {"IDIV": "int", "DIV": "float"}.get(opcode, rng.choice(("int", "int", "float")))
+            if "DIV" in opcode:
+                second = self.divisor(_type)
+            else:
+                # values of variables must not grow exponentially in loops
+                second = self.constant(_type) if opcode == "MUL" else self.symb(_type)
+            return [(opcode, [self.var(_type), self.symb(_type), second])]
+        if kind == 4:
+            opcode = rng.choice(("LT", "GT", "EQ"))
+            _type = rng.choice(self.TYPES + (("nil",) if opcode == "EQ" else ()))
+            return [(opcode, [self.var("bool"), self.symb(_type), self.symb(_type)])]
+        if kind == 5:
+            opcode = rng.choice(("AND", "OR", "NOT"))
+            operands = [self.symb("bool") for _ in range(1 if opcode == "NOT" else 2)]
+            return [(opcode, [self.var("bool")] + operands)]
+        if kind == 6:
+            opcode = rng.choice(("CONCAT", "GETCHAR", "STRLEN", "STRI2INT"))
+            operands = [self.symb("string")]
+            if opcode == "CONCAT":
+                operands.append(self.constant("string"))
+            elif opcode != "STRLEN":
+                operands.append(self.index())
+            _type = "int" if opcode in ("STRLEN", "STRI2INT") else "string"
+            return [(opcode, [self.var(_type)] + operands)]
+        if kind == 7:
+            char = ("string", self.rng.choice(self.STRINGS[1:])) if rng.random() < 0.9 else self.symb("string")
+            return [("SETCHAR", [self.var("string"), self.index(), char])]
+        if kind == 8:
+            opcode, source, _type = rng.choice((("INT2CHAR", "int", "string"), ("INT2FLOAT", "int", "float"),
+                                                ("FLOAT2INT", "float", "int")))
+            operand = self.code() if opcode == "INT2CHAR" else self.symb(source)
+            return [(opcode, [self.var(_type), operand])]
+        if kind == 9:
+            return [("TYPE", [self.var("string"), self.symb()])]
+        if kind in (10, 11):
+            return [("WRITE", [self.symb()])]
+        if kind == 12:
+            return [("READ", [("var", "GF@r"), ("type", rng.choice(self.TYPES))])]
+        if kind == 13:
+            opcode = rng.choice(list(self.STACK))
+            _type = {"IDIVS": "int", "DIVS": "float", "ANDS": "bool", "ORS": "bool"}.get(
+                opcode, rng.choice(("int", "int", "float", "string")))
+            result = self.STACK[opcode] or _type
+            if "DIV" in opcode:
+                second = self.divisor(_type)
+            else:
+                second = self.constant(_type) if opcode == "MULS" else self.symb(_type)
+            return [("PUSHS", [self.symb(_type)]), ("PUSHS", [second]), (opcode, []),
+                    ("POPS", [self.var(result)])]
+        if kind == 14:
+            opcode, source, result = rng.choice((("NOTS", "bool", "bool"), ("INT2CHARS", "int", "string"),
+                                                 ("INT2FLOATS", "int", "float"), ("FLOAT2INTS", "float", "int")))
+            operand = self.code() if opcode == "INT2CHARS" else self.symb(source)
+            return [("PUSHS", [operand]), (opcode, []), ("POPS", [self.var(result)])]
+        return [rng.choice((("DPRINT", [self.symb()]), ("DPRINT", [self.symb()]), ("CLEARS", []),
+                            ("PUSHS", [self.symb()]), ("PUSHS", [self.symb()]), ("POPS", [("var", "GF@r")]),
+                            ("EXIT", [self.symb("int")])))]
+
+
+def to_xml(instructions: list) -> str:
+    """
+        Returns program as XML (in the same format as parse.php)
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode23">']
+    for order, (opcode, operands) in enumerate(instructions, 1):
+        lines.append(f'  <instruction order="{order}" opcode="{opcode}">')
+        for idx, (kind, text) in enumerate(operands, 1):
+            lines.append(f'    <arg{idx} type="{kind}">{html.escape(text, quote=False)}</arg{idx}>')
+        lines.append("  </instruction>")
+    lines.append("</program>")
+    return "\n".join(lines) + "\n"
+
+
+def to_source(instructions: list) -> str:
+    """
+        Returns program as IPPcode23 source code
+    """
+    lines = [".IPPcode23"]
+    for opcode, operands in instructions:
+        texts = [text if kind in ("var", "label", "type") else f"{kind}@{text}" for kind, text in operands]
+        lines.append(" ".join([opcode] + texts))
+    return "\n".join(lines) + "\n"
+
+
+def run(xml: str, inputs: list, mode: str, quota: int = None):
+    """
+        Runs program in given mode ("baseline" runs it without optimizations)
+
+        Return:
+            (output, exit code), None if baseline exceeded quota
+    """
+    stderr = io.StringIO()
+    try:
+        if mode == "baseline":
+            scheduler = Scheduler()
+            scheduler.spawn(Program.load(xml, optimizations=()), list(inputs), "run", quota, stderr)
+            result = scheduler.run()["run"]
+            if isinstance(result.error, Exceptions.QuotaError):
+                return None
+        elif mode == "all":
+            result = Program.load(xml).run(list(inputs), stderr=stderr)
+        elif mode == "lazy":
+            result = Program.load(xml, lazy=True).run(list(inputs), stderr=stderr)
+        elif mode == "async":
+            result = asyncio.run(Program.load(xml).run_async(list(inputs), stderr=stderr))
+        elif mode == "compiled":
+            module = {"__name__": "compiled", "__file__": os.path.abspath(__file__)}
+            exec(Compiler(Program.load(xml)).compile(), module)
+            result = module["run"](list(inputs), stderr=stderr)
+        else:
+            result = Program.load(xml, optimizations=(mode,)).run(list(inputs), stderr=stderr)
+    except Exceptions._Exception as e:
+        return "", e.code
+    except Exception as e:
+        # bug of the interpreter itself
+        return "", f"{type(e).__name__}: {e}"
+    return result.stdout, result.code
+
+
+def minimize(instructions: list, inputs: list, mode: str, quota: int) -> tuple:
+    """
+        Removes instructions and input lines, while the program still diverges in given mode
+        (chunks of halving size, like delta debugging)
+
+        Return:
+            (instructions, inputs)
+    """
+    def diverges(instructions, inputs):
+        xml = to_xml(instructions)
+        expected = run(xml, inputs, "baseline", quota)
+        return expected is not None and run(xml, inputs, mode) != expected
+
+    for name in ("instructions", "inputs"):
+        items = instructions if name == "instructions" else inputs
+        chunk = max(len(items) // 2, 1)
+        while items:
+            removed = False
+            idx = 0
+            while idx < len(items):
+                candidate = items[:idx] + items[idx + chunk:]
+                if diverges(*((candidate, inputs) if name == "instructions" else (instructions, candidate))):
+                    items = candidate
+                    removed = True
+                else:
+                    idx += chunk
+                if name == "instructions":
+                    instructions = items
+                else:
+                    inputs = items
+            if chunk == 1 and not removed:
+                break
+            chunk = max(chunk // 2, 1)
+    return instructions, inputs
+
+
+def main():
+    seed = random.randrange(2 ** 32)
+    count = 100
+    size = 40
+    modes = MODES
+    quota = 100000
+    out = None
+
+    try:
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "h", ["help", "seed=", "count=", "size=", "modes=",
+                                                           "quota=", "out="])
+        except getopt.GetoptError as err:
+            raise Exceptions.OptionError(err)
+
+        for opt, arg in opts:
+            if opt in ('-h', '--help'):
+                print(USAGE)
+                exit(0)
+            elif opt == '--modes':
+                modes = tuple(arg.split(","))
+                for mode in modes:
+                    if mode not in MODES:
+                        raise Exceptions.OptionError(f"Unknown mode {mode}")
+            elif opt == '--out':
+                out = arg
+            else:
+                if not arg.isnumeric():
+                    raise Exceptions.OptionError(f"Invalid number {arg} of {opt}")
+                if opt == '--seed':
+                    seed = int(arg)
+                elif opt == '--count':
+                    count = int(arg)
+                elif opt == '--size':
+                    size = int(arg)
+                elif opt == '--quota':
+                    quota = int(arg)
+    except Exceptions.OptionError as e:
+        Exceptions.exit(e)
+
+    if out is not None:
+        os.makedirs(out, exist_ok=True)
+
+    skipped = 0
+    divergences = 0
+    for number in range(seed, seed + count):
+        instructions, inputs = ProgramGenerator(random.Random(number), size).generate()
+        xml = to_xml(instructions)
+        expected = run(xml, inputs, "baseline", quota)
+        if expected is None:
+            skipped += 1
+            continue
+        for mode in modes:
+            if run(xml, inputs, mode) == expected:
+                continue
+            divergences += 1
+            instructions, inputs = minimize(instructions, inputs, mode, quota)
+            xml = to_xml(instructions)
+            print(f"Program {number} diverges in mode {mode}:")
+            print(to_source(instructions), end="")
+            print(f"input: {inputs!r}")
+            print(f"baseline: {run(xml, inputs, 'baseline', quota)!r}")
+            print(f"{mode}: {run(xml, inputs, mode)!r}\n")
+            if out is not None:
+                name = os.path.join(out, f"{number}-{mode}")
+                for extension, text in (("src", to_source(instructions)), ("xml", xml),
+                                        ("in", "".join(f"{line}\n" for line in inputs))):
+                    with open(f"{name}.{extension}", "w") as file:
+                        file.write(text)
+            break
+
+    print(f"seeds {seed}..{seed + count - 1}: {count - skipped} programs run, {skipped} skipped "
+          f"(over quota), {divergences} diverged")
+    exit(1 if divergences else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,71 @@
 
+import array
+import asyncio
+import collections
+import gc
 import getopt
+import hashlib
+import inspect
+import io
+import json
+import math
+import os
+import py_compile
+import signal
+import struct
 import sys
+import time
+import zlib
 from enum import Enum
 import xml.etree.ElementTree as XML
 import re
 from abc import ABCMeta, abstractmethod
 
+try:
+    import numpy
+except ImportError:  # optional, float loops of `CountedLoop` are then run in plain Python
+    numpy = None
+
 USAGE = """
 \bUsage: python interpret.py [-h|--help|OPTIONS]\n
 \bOPTIONS:
 \b--help           Show this message and exit. No other options are allowed.
 \b--source=PATH    The source of the XML file.
 \b--input=PATH     The input for XML source file.
+\b--source-format=xml|ippcode23
+\b                 Format of the source, `ippcode23` reads IPPcode23 code directly
+\b                 (without parse.php). Default is xml.
+\b--metrics=FILE   Write runtime metrics as JSON into FILE at exit. Metrics are also
+\b                 written (into FILE or stderr) on SIGUSR1 while the program runs.
+\b--flight-recorder=FILE
+\b                 Write the last executed instructions into FILE (instead of stderr)
+\b                 when the program fails.
+\b--flight-recorder-size=N
+\b                 Number of recorded instructions (default: 32).
+\b--flight-recorder-values
+\b                 Record also values of operands (slower).
+\b--coverage=FILE  Write number of executions of every instruction into FILE (JSON),
+\b                 use merge_coverage.py to merge and report coverage of many runs.
+\b--record=FILE    Record every line READ got and checksum of output into FILE.
+\b--replay=FILE    Run with input recorded in FILE and check that output and exit code match.
+\b--lazy           Parse and validate operands of XML instructions on their first execution,
+\b                 invalid operands of instructions that never run are not reported.
+\b--compile-to=FILE
+\b                 Compile the program into Python module FILE (and its .pyc) and exit
+\b                 without running it. Run it with `python -m <module> [--input=PATH]`.
+\b--sample-profile=FILE
+\b                 Sample the running program and write its stacks (CALLs by their labels and
+\b                 the current instruction) into FILE in folded format for flame graph tools.
+\b--sample-hz=N    Number of samples per second of CPU time (default: 1000).
+\b--memprofile=FILE
+\b                 Write memory profile as JSON into FILE at exit: current and peak sizes of
+\b                 frames, data stack and call stack, the largest strings of variables and
+\b                 instructions that allocated the most (slower).
+\b--warm-start=DIR Run the program until its first READ only once, then fork a process from
+\b                 that state for every input file given as argument (or every path read
+\b                 from stdin, one per line). Output of input <name>.in is written into
+\b                 DIR/<name>.out, its exit code into DIR/<name>.rc and "<exit code>\\t<input>"
+\b                 onto stdout. Needs --source and fork() (POSIX only).
 \b
 \bAuthor: xturyt00 (Oleksandr Turytsia)
 """
@@ -29,12 +83,18 @@ class Exceptions:
             OptionError:  User used invalid option
             XMLFormatError: XML parsing error
             XMLUnexpectedError: Syntax error in XML
+            HeaderError: Missing or invalid header of IPPcode23 source
+            OpcodeError: Unknown opcode in IPPcode23 source
+            SourceSyntaxError: Lexical or syntax error in IPPcode23 source
             SemanticError: Semantic error in XML
             TypeError: invalid Operand type detected
             VariableUndefinedError: Non-existing value
             OperandValueError: 0-division
             StringOperationError: Error when working with string
             InternalError: Any other errors...
+            QuotaError: Program exceeded its step quota in `Scheduler`
+            ReplayError: Output of replayed run differs from the recorded one
+            ProgramExit: EXIT instruction, not an error
 
         Methods:
             exit(e): Handles custom exceptions
@@ -44,6 +104,9 @@ class Exceptions:
         ERR_PARAMETER = 10
         ERR_INPUT = 11
         ERR_OUTPUT = 12
+        ERR_HEADER = 21
+        ERR_SRC_CODE = 22
+        ERR_SYNTAX = 23
         ERR_XML_FORMAT = 31
         ERR_XML_STRUCT = 32
         ERR_SEMANTICS = 52
@@ -84,6 +147,18 @@ class Exceptions:
         def __init__(self, message):
             super().__init__(message, Exceptions.CodeTypes.ERR_XML_STRUCT)
 
+    class HeaderError(_Exception):
+        def __init__(self, message):
+            super().__init__(message, Exceptions.CodeTypes.ERR_HEADER)
+
+    class OpcodeError(_Exception):
+        def __init__(self, message):
+            super().__init__(message, Exceptions.CodeTypes.ERR_SRC_CODE)
+
+    class SourceSyntaxError(_Exception):
+        def __init__(self, message):
+            super().__init__(message, Exceptions.CodeTypes.ERR_SYNTAX)
+
     class SemanticError(_Exception):
         def __init__(self, message):
             super().__init__(message, Exceptions.CodeTypes.ERR_SEMANTICS)
@@ -117,6 +192,23 @@ class Exceptions:
         def __init__(self, message):
             super().__init__(message, Exceptions.CodeTypes.ERR_INTERNAL)
 
+    class QuotaError(_Exception):
+        def __init__(self, message):
+            super().__init__(message, Exceptions.CodeTypes.ERR_INTERNAL)
+
+    class ReplayError(_Exception):
+        def __init__(self, message):
+            super().__init__(message, Exceptions.CodeTypes.ERR_INTERNAL)
+
+    class ProgramExit(Exception):
+        """
+            Raised by EXIT instruction to stop the program with given exit code
+        """
+
+        def __init__(self, code: int):
+            super().__init__(f"Program exited with code {code}")
+            self.code = code
+
 
 class FrameTypes(Enum):
     """
@@ -161,6 +253,7 @@ class Types:
 
             Methods:
                 Special methods, that define behaviour for various operators/built-in methods.
+                copy(): Creates instance of Symb with the same type and value
 
             Classmethods:
                 Int(): Creates instance of Symb with type integer
@@ -174,7 +267,7 @@ class Types:
             self.type = Types.Type.to_type(_type)
             try:
                 if self.type.is_int():
-                    self.value = int(value)
+                    self.value = self.to_int(value) if type(value) == str else int(value)
                 elif self.type.is_bool():
                     if type(value) == bool:
                         self.value = value
@@ -194,6 +287,19 @@ class Types:
                 raise Exceptions.XMLUnexpectedError(
                     f"{value} is not valid int")
 
+        @staticmethod
+        def to_int(literal: str) -> int:
+            """
+                Converts signed decimal, octal (0o17) or hexadecimal (0x1F) literal to int.
+                Literals with leading zeros are decimal.
+            """
+            digits = literal.lstrip("+-")
+            if digits[:2] in ("0x", "0X"):
+                return int(literal, 16)
+            if digits[:2] in ("0o", "0O"):
+                return int(literal, 8)
+            return int(literal)
+
         @classmethod
         def Int(cls, value):
             """
@@ -395,6 +501,13 @@ class Types:
 
             return str(self.value) if not self.type.is_nil() and not self.type.is_undef() else ""
 
+        def copy(self) -> 'Types.Symb':
+            """
+                Creates instance of Symb with the same type and value.
+                Variables are copied as plain Symb, so the copy doesn't change with them.
+            """
+            return Types.Symb(self.value, self.type)
+
         def __repr__(self):
             return f"SYMB({self.type}, {self.value})"
 
@@ -405,12 +518,16 @@ class Types:
             Methods:
                 set_symb(symb): Assigns given Symb to a variable.
                 to_scope(scope): Converts 'TF'|'LF'|'GF' to a specific type.
+
+            Attributes:
+                defined: operand is proven to be defined in an existing frame (see `FrameShapes`)
         """
 
         def __init__(self, name, scope):
             super().__init__(None, None)
             self.name = name
             self.scope = self.to_scope(scope)
+            self.defined = False
 
         def set_symb(self, symb: 'Types.Symb'):
             """
@@ -422,6 +539,7 @@ class Types:
         def to_scope(self, scope: str):
             """
                 Converts 'TF'|'LF'|'GF' to a specific type.
+                Constants of type FrameTypes are returned as they are.
 
                 Raise:
                     InternalError: if given type of frame is not valid.
@@ -429,6 +547,8 @@ class Types:
                 Return:
                     constant of type FrameTypes.
             """
+            if isinstance(scope, FrameTypes):
+                return scope
             if scope == "TF":
                 return FrameTypes.TF
             elif scope == "LF":
@@ -621,9 +741,9 @@ class Parser:
             self.order = element.get('order')
             self.operands = list(element)
 
-        def parse(self):
+        def parse(self, lazy=False):
             """
-                returns instance of Types.Instruction
+                returns instance of Types.Instruction, its operands are parsed on demand if `lazy` is True
 
                 Raise:
                     XMLUnexpectedError: instruction object is not valid XML.
@@ -634,7 +754,7 @@ class Parser:
             if not self.is_valid():
                 raise Exceptions.XMLUnexpectedError("Instruction is not valid")
 
-            return Instruction(self.opcode, self.order, self.operands)
+            return Instruction(self.opcode, self.order, self.operands, lazy=lazy)
 
         def is_valid(self):
             """
@@ -896,16 +1016,26 @@ EXPECTED_TYPES = {
 
 class Instruction:
     """
-        Class, that represents instruction. Its instances are created when parsing XML.
+        Class, that represents instruction. Its instances are created when parsing XML
+        or IPPcode23 source (then `operands` are already parsed and `parsed` is True).
+
+        When `lazy` is True, XML operands are kept as they are and `operands` is None
+        until `decode()` is called (interpreter does it on the first execution).
+
+        Methods:
+            decode(): Parses and validates operands, if it wasn't done yet
 
         Raise:
             XMLUnexpectedError: any operand errors
     """
 
-    def __init__(self, opcode: str, order: str, operands: list):
+    def __init__(self, opcode: str, order: str, operands: list, parsed=False, lazy=False):
         self.opcode = opcode.upper()
         self.order = int(order)
-        self.operands = []
+        self.operands = None
+        self.tail_call = False
+        self.unchecked = False
+        self.loop = None
 
         expectTypeList = EXPECTED_TYPES[self.opcode]
 
@@ -913,35 +1043,216 @@ class Instruction:
             raise Exceptions.XMLUnexpectedError(
                 f"Invalid number of arguments in {self.opcode}")
 
+        if parsed:
+            self.operands = list(operands)
+        elif lazy:
+            self._elements = operands
+        else:
+            self.operands = self._parse(operands)
+
+    def decode(self) -> list:
+        """
+            Parses and validates operands, if it wasn't done yet
+
+            Raise:
+                XMLUnexpectedError: any operand errors
+
+            Return:
+                List of operands
+        """
+        if self.operands is None:
+            self.operands = self._parse(self._elements)
+            del self._elements
+        return self.operands
+
+    def _parse(self, operands: list) -> list:
+        expectTypeList = EXPECTED_TYPES[self.opcode]
+        parsed = []
         try:
             for idx, child in enumerate(sorted(operands, key=lambda child: child.tag)):
                 if child.tag != f"arg{idx+1}":
                     raise Exceptions.XMLUnexpectedError(
                         f"Invalid operand at {self.opcode}, order={self.order}")
                 TypeParser = expectTypeList[idx]
-                self.operands.append(TypeParser(child).parse())
+                parsed.append(TypeParser(child).parse())
         except IndexError:
             raise Exceptions.XMLUnexpectedError(
                 f"Too many arguments for {self.opcode}")
+        return parsed
 
     def __repr__(self):
         return f"(order={self.order},instruction={self.opcode},operands={self.operands})"
 
 
+class SourceParser:
+    """
+        Parses IPPcode23 source code directly into instances of `Instruction`,
+        without parse.php and XML. Uses the same rules as `Validators` in parser/parse.php.
+
+        Methods:
+            parse(source): Parses IPPcode23 code into list of instructions
+            format_line(line): Removes comment and whitespaces around the line
+            is_header(line): Checks whether line is a header
+            is_var(var): Checks whether operand is a variable
+            is_symb(symb): Checks whether operand is a constant or a variable
+            is_type(_type): Checks whether operand is a type
+            is_label(label): Checks whether operand is a label
+    """
+
+    LABEL = re.compile(r"^[a-zA-Z_\-$&%*!?][\w\-$&%*!?]*$")
+    TYPE = re.compile(r"^(int|bool|string|float|nil)$")
+    LITERALS = {
+        "int": re.compile(r"^(([-+]?\d+)|(0[oO]?[0-7]+)|(0[xX][0-9a-fA-F]+))$"),
+        "bool": re.compile(r"^(true|false)$"),
+        "nil": re.compile(r"^nil$"),
+    }
+    ESCAPE = re.compile(r"\\(?!\d\d\d)")
+
+    def parse(self, source: str) -> list:
+        """
+            Parses IPPcode23 code into list of instructions
+
+            Raise:
+                HeaderError: missing or invalid header
+                OpcodeError: unknown opcode
+                SourceSyntaxError: invalid number of operands or invalid operand
+
+            Return:
+                List of instances of `Instruction`
+        """
+        lines = [line for line in map(self.format_line, source.splitlines()) if line]
+
+        if not lines or not self.is_header(lines[0]):
+            raise Exceptions.HeaderError("Invalid header")
+
+        instructions = []
+        for order, line in enumerate(lines[1:], start=1):
+            opcode, *operands = line.split()
+            opcode = opcode.upper()
+
+            if opcode not in EXPECTED_TYPES:
+                raise Exceptions.OpcodeError(f"Instruction {opcode} does not exist")
+
+            kinds = EXPECTED_TYPES[opcode] or []
+            if len(operands) != len(kinds):
+                raise Exceptions.SourceSyntaxError(
+                    f"Invalid number of operands in {opcode}")
+
+            instructions.append(Instruction(opcode, order, [
+                self.operand(operand, kind) for operand, kind in zip(operands, kinds)
+            ], parsed=True))
+
+        return instructions
+
+    @staticmethod
+    def format_line(line: str) -> str:
+        """
+            Removes comment and whitespaces around the line
+        """
+        return line.split("#", 1)[0].strip()
+
+    def operand(self, operand: str, kind):
+        """
+            Validates operand and converts it to a specific literal.
+
+            Params:
+                kind: one of `Parser.Var`, `Parser.Symb`, `Parser.Type`, `Parser.Label` (see `EXPECTED_TYPES`)
+
+            Raise:
+                SourceSyntaxError: operand is not valid
+
+            Return:
+                Instance of `Types.Var`, `Types.Symb`, `Types.Type` or `Types.Label`
+        """
+        if kind is Parser.Var:
+            if not self.is_var(operand):
+                raise Exceptions.SourceSyntaxError(f"Invalid variable {operand}")
+            scope, name = operand.split("@", 1)
+            return Types.Var(name, scope)
+
+        if kind is Parser.Symb:
+            if self.is_var(operand):
+                return self.operand(operand, Parser.Var)
+            if not self.is_symb(operand):
+                raise Exceptions.SourceSyntaxError(f"Invalid constant {operand}")
+            _type, literal = operand.split("@", 1)
+            return Types.Symb(literal, _type)
+
+        if kind is Parser.Type:
+            if not self.is_type(operand):
+                raise Exceptions.SourceSyntaxError(f"Invalid type {operand}")
+            return Types.Type.to_type(operand)
+
+        if not self.is_label(operand):
+            raise Exceptions.SourceSyntaxError(f"Invalid label {operand}")
+        return Types.Label(operand)
+
+    @staticmethod
+    def is_header(line: str) -> bool:
+        """
+            Checks whether line is a header
+        """
+        return line.lower() == ".ippcode23"
+
+    def is_var(self, var: str) -> bool:
+        """
+            Checks whether operand is a variable
+        """
+        frame, _, name = var.partition("@")
+        return frame in ("GF", "LF", "TF") and self.is_label(name)
+
+    def is_symb(self, symb: str) -> bool:
+        """
+            Checks whether operand is a constant (or a variable)
+        """
+        _type, at, literal = symb.partition("@")
+        if not at:
+            return False
+        if not self.is_type(_type):
+            return self.is_var(symb)
+        if _type == "string":
+            return self.ESCAPE.search(literal) is None
+        if _type == "float":
+            try:
+                float.fromhex(literal)
+                return True
+            except ValueError:
+                return False
+        return self.LITERALS[_type].search(literal) is not None
+
+    def is_type(self, _type: str) -> bool:
+        """
+            Checks whether operand is a type
+        """
+        return self.TYPE.search(_type) is not None
+
+    def is_label(self, label: str) -> bool:
+        """
+            Checks whether operand is a label
+        """
+        return self.LABEL.search(label) is not None
+
+
 class Frame():
     """
         Class that represents frames in IFJcode23.
 
+        Every frame owns its variables, parsed `Types.Var` operands are used
+        only as names and are never stored inside of a frame.
+
         Raise:
             SemanticError: variable is already defined
 
         Methods:
             get_var(var_name): Gets variable by its name.
             set_var(var): Declares variable in specific frame.
+            clear(): Undefines all the variables, keeps their storage for reuse.
     """
 
-    def __init__(self):
+    def __init__(self, site=None):
+        self.site = site
         self._data = {}
+        self._slots = {}
 
     def get_var(self, var_name):
         """
@@ -966,13 +1277,57 @@ class Frame():
             raise Exceptions.SemanticError(
                 f"Variable {var.name} is already defined at {var.scope}")
 
-        var.type = Types.Type.Undef()
-        self._data[var.name] = var
+        slot = self._slots.get(var.name)
+        if slot is None:
+            slot = Types.Var(var.name, var.scope)
+            self._slots[var.name] = slot
+        slot.type = Types.Type.Undef()
+        slot.value = None
+        self._data[var.name] = slot
+
+    def clear(self):
+        """
+            Undefines all the variables, storage of variables is kept for reuse.
+        """
+        self._data.clear()
 
     def __repr__(self):
         return repr(self._data)
 
 
+class FramePool():
+    """
+        Class that recycles frames. Frames are pooled per call site (index of CREATEFRAME),
+        so a recycled frame usually has the same shape and DEFVAR reuses its storage.
+
+        Methods:
+            acquire(site): Returns empty frame for given call site
+            release(frame): Returns frame back to the pool
+    """
+
+    def __init__(self, limit=16):
+        self.limit = limit
+        self._frames = {}
+
+    def acquire(self, site=None) -> Frame:
+        """
+            Returns empty frame for given call site
+        """
+        frames = self._frames.get(site)
+        if frames:
+            return frames.pop()
+        return Frame(site)
+
+    def release(self, frame: Frame):
+        """
+            Returns frame back to the pool. Frame must not be referenced anymore.
+        """
+        frames = self._frames.setdefault(frame.site, [])
+        if len(frames) < self.limit:
+            frame.clear()
+            frames.append(frame)
+
+
 class FrameManager():
     """
         Class for managing memory model in IFJcode23.
@@ -980,15 +1335,21 @@ class FrameManager():
         Methods:
             set_var(var): Declares variable in specific frame
             get_var(var): Returns var out of specific frame
-            create_frame(): Creates frame TF
+            get_var_unchecked(var): Returns var out of specific frame without checks
+            create_frame(site): Creates frame TF
             push_frame(): Moves TF onto LF
             pop_frame(): Moves LF onto TF
+
+        Attributes:
+            created: number of frames created by CREATEFRAME
     """
 
-    def __init__(self):
+    def __init__(self, pool: FramePool = None):
+        self._pool = FramePool() if pool is None else pool
         self._gframe = Frame()
         self._lframe = []
         self._tframe = None
+        self.created = 0
 
     def set_var(self, var: Types.Var):
         """
@@ -1014,7 +1375,8 @@ class FrameManager():
 
     def get_var(self, var: Types.Var) -> Types.Var:
         """
-            Returns var out of specific frame.
+            Returns var out of specific frame. Operands proven to be defined
+            (see `FrameShapes`) are looked up without checks.
 
             Raise:
                 FrameError: Frame does not exist.
@@ -1023,16 +1385,23 @@ class FrameManager():
             Return:
                 Instance of `Types.Var`
         """
-
-        if var.scope == FrameTypes.TF:
+        scope = var.scope
+        if var.defined:
+            if scope is FrameTypes.GF:
+                return self._gframe._data[var.name]
+            if scope is FrameTypes.LF:
+                return self._lframe[-1]._data[var.name]
+            return self._tframe._data[var.name]
+
+        if scope == FrameTypes.TF:
             if self._tframe is None:
                 raise Exceptions.FrameError("Frame TF does not exist.")
             _var = self._tframe.get_var(var.name)
-        elif var.scope == FrameTypes.LF:
+        elif scope == FrameTypes.LF:
             if len(self._lframe) == 0:
                 raise Exceptions.FrameError("Frame LF does not exist.")
             _var = self._lframe[-1].get_var(var.name)
-        elif var.scope == FrameTypes.GF:
+        elif scope == FrameTypes.GF:
             _var = self._gframe.get_var(var.name)
 
         if _var is None:
@@ -1041,11 +1410,28 @@ class FrameManager():
         else:
             return _var
 
-    def create_frame(self):
+    def get_var_unchecked(self, var: Types.Var) -> Types.Var:
+        """
+            Returns var out of specific frame without any checks.
+            Frame must exist and variable must be defined.
+        """
+        if var.scope == FrameTypes.GF:
+            return self._gframe._data[var.name]
+        if var.scope == FrameTypes.LF:
+            return self._lframe[-1]._data[var.name]
+        return self._tframe._data[var.name]
+
+    def create_frame(self, site=None):
         """
-            Creates frame TF
+            Creates frame TF. Previous TF is dropped and recycled.
+
+            Params:
+                site: call site of the frame (index of CREATEFRAME), used for pooling
         """
-        self._tframe = Frame()
+        if self._tframe is not None:
+            self._pool.release(self._tframe)
+        self._tframe = self._pool.acquire(site)
+        self.created += 1
 
     def push_frame(self):
         """
@@ -1068,6 +1454,8 @@ class FrameManager():
         """
         if len(self._lframe) == 0:
             raise Exceptions.FrameError(f"Unable to pop LF when it is empty")
+        if self._tframe is not None:
+            self._pool.release(self._tframe)
         self._tframe = self._lframe.pop()
 
     def __repr__(self):
@@ -1080,13 +1468,19 @@ class StackManager():
 
         Methods:
             Instruction implementation.
+
+        Attributes:
+            peak: the biggest depth of the stack
     """
 
     def __init__(self):
         self._data = []
+        self.peak = 0
 
     def push(self, symb: Types.Symb):
         self._data.append(symb)
+        if len(self._data) > self.peak:
+            self.peak = len(self._data)
 
     def pop(self) -> Types.Symb:
         if self.is_empty():
@@ -1162,7 +1556,7 @@ class StackManager():
                 "Invalid type in INT2CHARS")
         try:
             self.push(Types.Symb.String(chr(symb.value)))
-        except ValueError:
+        except (ValueError, OverflowError):
             raise Exceptions.StringOperationError(
                 f"{symb} is not valid unicode")
 
@@ -1196,726 +1590,4257 @@ class StackManager():
     def is_empty(self):
         return len(self._data) == 0
 
-    def __repr__(self):
-        return str(self._data)
-
-
-def read_input_generator(filename=None):
-    if filename is None:
-        file = sys.stdin
-    else:
-        file = open(filename, 'r')
-    try:
-        for line in file:
-            yield line.rstrip('\n')
-    finally:
-        if file is not sys.stdin:
-            file.close()
-
-
-def _write(symb: Types.Symb, file=sys.stdout):
-    if symb.type.is_string():
-        print(deescape_str(str(symb.value)), end="", file=file)
-    else:
-        print(symb, end="", file=file)
-
+    def depth(self) -> int:
+        return len(self._data)
 
-class InstructionManager():
+    def nbytes(self) -> int:
+        """
+            Returns approximate size of the stack and values of its entries in bytes
+        """
+        return self.base_nbytes() + self.top_nbytes(self.depth())
 
-    def __init__(self):
-        self._instructions = []
+    def base_nbytes(self) -> int:
+        """
+            Returns size of the stack itself in bytes (without values of its entries)
+        """
+        return sys.getsizeof(self._data)
 
-    def insert(self, instruction: Instruction):
-        self._instructions.append(instruction)
+    def top_nbytes(self, count: int) -> int:
+        """
+            Returns size of values of `count` entries at the top of the stack in bytes
+        """
+        return sum(sys.getsizeof(symb.value) for symb in self._data[len(self._data) - count:])
 
-    def instructions(self):
-        return sorted(self._instructions, key=lambda i: i.order)
+    def __repr__(self):
+        return str(self._data)
 
 
-class CallStack():
+class TypedStackManager(StackManager):
     """
-        Class for managing CALL and RETURN instructions. It stores indexes of Calls.
+        Data stack that keeps int, bool and float entries in compact arrays: a type tag
+        per entry in `bytearray` and values in `array('q')` (floats are stored by their bits).
+        Strings, nil, ints that don't fit into 64 bits and floats with int values (results
+        of INT2FLOAT) are kept as objects in a list.
+        Arithmetic, relational and logic stack instructions on int/bool entries
+        are computed in the arrays, without creating `Types.Symb` objects.
 
         Methods:
-            push(label): Saves index of specific label in order to return back to it
-            pop(): Pops saved index
-            is_empty(): Checks if call stack is empty
+            Same as `StackManager`.
     """
 
+    OBJECT, INT, BOOL, FLOAT = range(4)
+    MIN, MAX = -2 ** 63, 2 ** 63 - 1
+
+    _INT_TYPE = Types.Type.Int()
+    _BOOL_TYPE = Types.Type.Bool()
+    _FLOAT_TYPE = Types.Type.Float()
+    _DOUBLE = struct.Struct("<d")
+    _QWORD = struct.Struct("<q")
+
     def __init__(self):
-        self._calls = []
+        super().__init__()
+        self._tags = bytearray()
+        self._values = array.array("q")
+        self._objects = []
 
-    def push(self, label):
+    def push(self, symb: Types.Symb):
+        _type = symb.type
+        if _type.is_int() and self.MIN <= symb.value <= self.MAX:
+            self._tags.append(self.INT)
+            self._values.append(symb.value)
+        elif _type.is_bool():
+            self._tags.append(self.BOOL)
+            self._values.append(1 if symb.value else 0)
+        elif _type.is_float() and type(symb.value) is float:
+            # INT2FLOAT keeps ints as they are, those must not be rounded into a double
+            self._tags.append(self.FLOAT)
+            self._values.append(self._QWORD.unpack(self._DOUBLE.pack(symb.value))[0])
+        else:
+            self._tags.append(self.OBJECT)
+            self._objects.append(symb)
+        if len(self._tags) > self.peak:
+            self.peak = len(self._tags)
+
+    def _symb(self, tag: int, value: int) -> Types.Symb:
         """
-            Saves index of specific label in order to return back to it
+            Creates `Types.Symb` out of tag and value from the arrays
         """
-        self._calls.append(label)
+        if tag == self.INT:
+            return Types.Symb(value, self._INT_TYPE)
+        if tag == self.BOOL:
+            return Types.Symb(value == 1, self._BOOL_TYPE)
+        return Types.Symb(self._DOUBLE.unpack(self._QWORD.pack(value))[0], self._FLOAT_TYPE)
 
-    def pop(self):
+    def pop(self) -> Types.Symb:
+        if not self._tags:
+            raise Exceptions.ValueUndefinedError("Data stack is empty")
+        tag = self._tags.pop()
+        if tag == self.OBJECT:
+            return self._objects.pop()
+        return self._symb(tag, self._values.pop())
+
+    def _peek(self, depth: int) -> list:
         """
-            Pops saved index.
+            Returns top `depth` entries as `Types.Symb` (the top one is the last)
+        """
+        values, objects = len(self._values), len(self._objects)
+        entries = []
+        for tag in reversed(self._tags[-depth:]):
+            if tag == self.OBJECT:
+                objects -= 1
+                entries.append(self._objects[objects])
+            else:
+                values -= 1
+                entries.append(self._symb(tag, self._values[values]))
+        return entries[::-1]
 
-            Raise:
-                ValueUndefinedError: Call stack is empty
+    def get_symb(self):
+        if len(self._tags) < 1:
+            raise Exceptions.ValueUndefinedError("Data stack is empty")
+        return self._peek(1)[0]
+
+    def get_symb_symb(self):
+        if len(self._tags) < 2:
+            raise Exceptions.ValueUndefinedError("Data stack is empty")
+        symb1, symb2 = self._peek(2)
+        return symb1, symb2
+
+    def clear(self):
+        self._tags = bytearray()
+        self._values = array.array("q")
+        self._objects = []
+
+    def _top_two(self, tag: int) -> bool:
         """
-        if self.is_empty():
-            raise Exceptions.ValueUndefinedError("Call stack is empty")
-        return self._calls.pop()
+            Checks if two top entries have given tag
+        """
+        tags = self._tags
+        return len(tags) >= 2 and tags[-1] == tag and tags[-2] == tag
 
-    def is_empty(self):
+    def _replace_two(self, result: int, tag: int) -> bool:
         """
-            Checks if call stack is empty
+            Replaces two top entries with result, if it fits into 64 bits
         """
-        return len(self._calls) == 0
+        if not self.MIN <= result <= self.MAX:
+            return False
+        self._values.pop()
+        self._values[-1] = result
+        self._tags.pop()
+        self._tags[-1] = tag
+        return True
 
-    def __repr__(self):
-        return f"Call stack: {self._calls}"
+    def add(self):
+        if not (self._top_two(self.INT)
+                and self._replace_two(self._values[-2] + self._values[-1], self.INT)):
+            super().add()
 
+    def sub(self):
+        if not (self._top_two(self.INT)
+                and self._replace_two(self._values[-2] - self._values[-1], self.INT)):
+            super().sub()
 
-def main():
+    def mul(self):
+        if not (self._top_two(self.INT)
+                and self._replace_two(self._values[-2] * self._values[-1], self.INT)):
+            super().mul()
 
-    source = None  # XML file with source code
-    input = None  # input file
+    def idiv(self):
+        if not (self._top_two(self.INT) and self._values[-1] != 0
+                and self._replace_two(self._values[-2] // self._values[-1], self.INT)):
+            super().idiv()
 
-    try:
+    def lt(self):
+        if not (self._top_two(self.INT)
+                and self._replace_two(int(self._values[-2] < self._values[-1]), self.BOOL)):
+            super().lt()
 
-        try:
-            opts, args = getopt.getopt(
-                sys.argv[1:], "hs:i:", ["help", "source=", "input="])
-        except getopt.GetoptError as err:
-            raise Exceptions.OptionError(err)
+    def gt(self):
+        if not (self._top_two(self.INT)
+                and self._replace_two(int(self._values[-2] > self._values[-1]), self.BOOL)):
+            super().gt()
 
-        for opt, arg in opts:
-            if opt in ('-h', '--help'):
-                if len(opts) > 1:
-                    raise Exceptions.OptionError(
-                        "Option --help(-h) can only be used without any other options)")
-                print(USAGE)
-                exit(0)
-            elif opt in ('-s', '--source'):
-                source = arg
-            elif opt in ('-i', '--input'):
-                input = arg
+    def eq(self):
+        if not ((self._top_two(self.INT) or self._top_two(self.BOOL))
+                and self._replace_two(int(self._values[-2] == self._values[-1]), self.BOOL)):
+            super().eq()
 
-        if source is None:
-            source = sys.stdin
+    def ands(self):
+        if not (self._top_two(self.BOOL)
+                and self._replace_two(self._values[-2] & self._values[-1], self.BOOL)):
+            super().ands()
 
-        input = read_input_generator(input)
+    def ors(self):
+        if not (self._top_two(self.BOOL)
+                and self._replace_two(self._values[-2] | self._values[-1], self.BOOL)):
+            super().ors()
 
-        try:
-            tree = XML.parse(source)
-        except FileNotFoundError:
-            raise Exceptions.OptionError(
-                f"{source}: No such file or directory")
-        except XML.ParseError:
-            raise Exceptions.XMLFormatError("Invalid XML format")
+    def nots(self):
+        if self._tags and self._tags[-1] == self.BOOL:
+            self._values[-1] = 1 - self._values[-1]
+        else:
+            super().nots()
 
-        root = tree.getroot()
+    def is_empty(self):
+        return len(self._tags) == 0
 
-        # TODO validate <?xml version="1.0" encoding="UTF-8"?>
-        if root.tag != "program":
-            raise Exceptions.XMLUnexpectedError("Expected <program> element")
+    def depth(self) -> int:
+        return len(self._tags)
 
-        IManager = InstructionManager()
+    def base_nbytes(self) -> int:
+        """
+            Returns size of the arrays in bytes, values of int, bool and float entries are included
+        """
+        return sys.getsizeof(self._tags) + sys.getsizeof(self._values) + sys.getsizeof(self._objects)
 
-        for child in root:
-            IManager.insert(Parser.Instruction(child).parse())
+    def top_nbytes(self, count: int) -> int:
+        """
+            Returns size of values of object entries among `count` entries at the top of the stack in bytes
+        """
+        objects = self._tags[len(self._tags) - count:].count(self.OBJECT) if count else 0
+        if not objects:
+            return 0
+        return sum(sys.getsizeof(symb.value) for symb in self._objects[len(self._objects) - objects:])
 
-        instructions = IManager.instructions()
+    def __repr__(self):
+        return str(self._peek(len(self._tags))) if self._tags else "[]"
 
-        # dublicate order check
-        orders = list(map(lambda i: i.order, instructions))
-        if len(orders) != len(set(orders)):
-            raise Exceptions.XMLUnexpectedError("Duplicate order")
 
-        FManager = FrameManager()
-        SManager = StackManager()
-        CStack = CallStack()
-        labels = {}
+def read_input_generator(filename=None):
+    """
+        Opens input file (stdin if filename is None) and returns generator of its lines.
+
+        Raise:
+            OptionError: file does not exist
+    """
+    if filename is None:
+        return _read_lines(sys.stdin)
+    try:
+        return _read_lines(open(filename, 'r'))
+    except FileNotFoundError:
+        raise Exceptions.OptionError(f"{filename}: No such file or directory")
+
+
+def _read_lines(file):
+    try:
+        for line in file:
+            yield line.rstrip('\n')
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def read_input_lines(input=None):
+    """
+        Converts input of a program into generator of lines.
+
+        Params:
+            input: None (no input), string or iterable of lines
+    """
+    if input is None:
+        return iter(())
+    if isinstance(input, str):
+        input = io.StringIO(input)
+    return (line.rstrip('\n') for line in input)
+
+
+def _write(symb: Types.Symb, file=sys.stdout) -> int:
+    """
+        Writes symb into file
+
+        Return:
+            number of written bytes
+    """
+    if symb.type.is_string():
+        text = deescape_str(str(symb.value))
+    else:
+        text = str(symb)
+    file.write(text)
+    return len(text.encode("utf-8"))
+
+
+class ChecksumWriter():
+    """
+        Writer that forwards output into another writer and computes its CRC-32 and length in bytes
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.crc = 0
+        self.length = 0
+
+    def write(self, text: str):
+        data = text.encode("utf-8")
+        self.crc = zlib.crc32(data, self.crc)
+        self.length += len(data)
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+
+class RecordLog():
+    """
+        Binary log of program input for deterministic replay.
+
+        Format:
+            MAGIC, then one record for every line, that READ got: b"R" <u32 length> <UTF-8 line>,
+            b"E" when the input ended, and b"X" <i32 exit code> <u32 CRC-32> <u64 length> of output at the end.
+
+        Methods:
+            replay(): Returns iterator of recorded lines
+            verify(code, output): Compares exit code and output of replay with the recorded ones
+
+        Staticmethods:
+            record(input, file): Returns generator of input lines, that writes every line into log
+            finish(file, code, output): Writes exit code and checksum of output into log
+
+        Classmethods:
+            load(path): Loads log from file
+    """
+
+    MAGIC = b"IPPR\x01"
+
+    def __init__(self, lines: list, code: int, crc: int, length: int):
+        self.lines = lines
+        self.code = code
+        self.crc = crc
+        self.length = length
+
+    @staticmethod
+    def record(input, file):
+        """
+            Returns generator of input lines, that writes every line into log when it is read
+        """
+        file.write(RecordLog.MAGIC)
+
+        def lines():
+            for line in input:
+                data = line.encode("utf-8")
+                file.write(b"R" + struct.pack("<I", len(data)) + data)
+                yield line
+            file.write(b"E")
+        return lines()
+
+    @staticmethod
+    def finish(file, code: int, output: ChecksumWriter):
+        """
+            Writes exit code and checksum of output into log
+        """
+        file.write(b"X" + struct.pack("<iIQ", code, output.crc, output.length))
+        file.flush()
+
+    @classmethod
+    def load(cls, path: str) -> 'RecordLog':
+        """
+            Loads log from file
+
+            Raise:
+                OptionError: file does not exist or is not valid log
+        """
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            raise Exceptions.OptionError(f"{path}: No such file or directory")
+
+        if not data.startswith(cls.MAGIC):
+            raise Exceptions.OptionError(f"{path}: Invalid record file")
+
+        lines, pos = [], len(cls.MAGIC)
+        try:
+            while data[pos:pos + 1] == b"R":
+                length, = struct.unpack_from("<I", data, pos + 1)
+                lines.append(data[pos + 5:pos + 5 + length].decode("utf-8"))
+                pos += 5 + length
+            if data[pos:pos + 1] == b"E":
+                pos += 1
+            if data[pos:pos + 1] != b"X":
+                raise ValueError("missing end of record")
+            code, crc, length = struct.unpack_from("<iIQ", data, pos + 1)
+        except (struct.error, ValueError):
+            raise Exceptions.OptionError(f"{path}: Invalid record file")
+        return cls(lines, code, crc, length)
+
+    def replay(self):
+        """
+            Returns iterator of recorded lines
+        """
+        return iter(self.lines)
+
+    def verify(self, code: int, output: ChecksumWriter):
+        """
+            Compares exit code and output of replay with the recorded ones
+
+            Raise:
+                ReplayError: exit code or output differs
+        """
+        if code != self.code:
+            raise Exceptions.ReplayError(
+                f"Replay exited with code {code}, recorded {self.code}")
+        if (output.crc, output.length) != (self.crc, self.length):
+            raise Exceptions.ReplayError(
+                f"Replay output differs (crc32 {output.crc:08x}, {output.length} bytes), "
+                f"recorded crc32 {self.crc:08x}, {self.length} bytes")
+
+
+class InstructionManager():
+
+    def __init__(self):
+        self._instructions = []
+
+    def insert(self, instruction: Instruction):
+        self._instructions.append(instruction)
+
+    def instructions(self):
+        return sorted(self._instructions, key=lambda i: i.order)
+
+
+class CallStack():
+    """
+        Class for managing CALL and RETURN instructions. It stores indexes of Calls.
+
+        Methods:
+            push(label): Saves index of specific label in order to return back to it
+            pop(): Pops saved index
+            is_empty(): Checks if call stack is empty
+
+        Attributes:
+            peak: the biggest depth of the call stack
+    """
+
+    def __init__(self):
+        self._calls = []
+        self.peak = 0
+
+    def push(self, label):
+        """
+            Saves index of specific label in order to return back to it
+        """
+        self._calls.append(label)
+        if len(self._calls) > self.peak:
+            self.peak = len(self._calls)
+
+    def pop(self):
+        """
+            Pops saved index.
+
+            Raise:
+                ValueUndefinedError: Call stack is empty
+        """
+        if self.is_empty():
+            raise Exceptions.ValueUndefinedError("Call stack is empty")
+        return self._calls.pop()
+
+    def is_empty(self):
+        """
+            Checks if call stack is empty
+        """
+        return len(self._calls) == 0
+
+    def __repr__(self):
+        return f"Call stack: {self._calls}"
+
+
+class Linker():
+    """
+        Class that links sorted instructions before they are executed.
+
+        Methods:
+            link(instructions): Resolves labels and marks tail calls
+            find_labels(instructions): Maps label names to instruction indexes
+            mark_tail_calls(instructions): Marks CALLs that are immediately followed by RETURN
+    """
+
+    def __init__(self, tail_calls=True):
+        self.tail_calls = tail_calls
+
+    def link(self, instructions: list) -> dict:
+        """
+            Resolves labels and marks tail calls.
+
+            Raise:
+                SemanticError: label is defined more than once
+
+            Return:
+                Dictionary of label names and their indexes
+        """
+        labels = self.find_labels(instructions)
+        if self.tail_calls:
+            self.mark_tail_calls(instructions)
+        return labels
+
+    def find_labels(self, instructions: list) -> dict:
+        """
+            Maps label names to instruction indexes.
+
+            Raise:
+                SemanticError: label is defined more than once
+        """
+        labels = {}
+        for idx, i in enumerate(instructions):
+            if i.opcode == "LABEL":
+                label, = i.decode()
+                if labels.get(label.value) is None:
+                    labels[label.value] = idx
+                else:
+                    raise Exceptions.SemanticError(
+                        f"Label {label.value} is already defined")
+        return labels
+
+    def mark_tail_calls(self, instructions: list):
+        """
+            Marks CALLs that are immediately followed by RETURN (labels in between
+            are skipped, they do nothing). Such CALL does not need to save its index,
+            since the callee's RETURN can go straight back to the caller's caller.
+            Frames are not touched by CALL/RETURN, so their semantics is preserved.
+        """
+        for idx, i in enumerate(instructions):
+            if i.opcode != "CALL":
+                continue
+            next_idx = idx + 1
+            while next_idx < len(instructions) and instructions[next_idx].opcode == "LABEL":
+                next_idx += 1
+            i.tail_call = (next_idx < len(instructions)
+                           and instructions[next_idx].opcode == "RETURN")
+
+
+class ControlFlowGraph():
+    """
+        Class that splits linked instructions into basic blocks and connects them.
+        Blocks start at the first instruction, at LABELs and after jumps, CALL, RETURN and EXIT.
+        CALL continues at its label and every RETURN can continue after any CALL (except tail calls).
+
+        Methods:
+            successors(block): Returns indexes of blocks that can follow the block
+            uses(instruction): Returns names of GF variables, whose values the instruction reads
+            defines(instruction): Returns name of GF variable the instruction writes into, or None
+
+        Attributes:
+            blocks: list of `ControlFlowGraph.Block`
+            block_of: index of block of every instruction
+            names: names of all GF variables of the program
+    """
+
+    JUMPS = ("JUMP", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS")
+    ENDS = JUMPS + ("CALL", "RETURN", "EXIT")
+
+    class Block():
+        """
+            Basic block, instructions from index `start` to `end` (exclusive)
+        """
+
+        def __init__(self, start: int, end: int):
+            self.start = start
+            self.end = end
+            self.successors = []
+            self.predecessors = []
+
+        def __repr__(self):
+            return f"Block({self.start}, {self.end}, successors={self.successors})"
+
+    def __init__(self, instructions: list, labels: dict):
+        self.instructions = instructions
+        self.labels = labels
+        self.names = frozenset(operand.name
+                               for i in instructions for operand in i.operands
+                               if isinstance(operand, Types.Var) and operand.scope == FrameTypes.GF)
+
+        starts = {0} if instructions else set()
+        for idx, instruction in enumerate(instructions):
+            if instruction.opcode == "LABEL":
+                starts.add(idx)
+            elif instruction.opcode in self.ENDS and idx + 1 < len(instructions):
+                starts.add(idx + 1)
+        starts = sorted(starts)
+
+        self.blocks = [ControlFlowGraph.Block(start, end)
+                       for start, end in zip(starts, starts[1:] + [len(instructions)])]
+        self.block_of = [0] * len(instructions)
+        for number, block in enumerate(self.blocks):
+            for idx in range(block.start, block.end):
+                self.block_of[idx] = number
+
+        returns = [self.block_of[idx + 1] for idx, i in enumerate(instructions)
+                   if i.opcode == "CALL" and not i.tail_call and idx + 1 < len(instructions)]
+        for number, block in enumerate(self.blocks):
+            block.successors = self._successors(block, returns)
+            for successor in block.successors:
+                self.blocks[successor].predecessors.append(number)
+
+    def _successors(self, block: 'ControlFlowGraph.Block', returns: list) -> list:
+        last = self.instructions[block.end - 1]
+        following = [self.block_of[block.end]] if block.end < len(self.instructions) else []
+
+        if last.opcode == "RETURN":
+            return sorted(set(returns))
+        if last.opcode == "EXIT":
+            return []
+        if last.opcode in self.JUMPS or last.opcode == "CALL":
+            jump_to = self.labels.get(last.operands[0].value)
+            targets = [] if jump_to is None else [self.block_of[jump_to]]
+            if last.opcode in ("JUMP", "CALL"):
+                return targets
+            return sorted(set(following + targets))
+        return following
+
+    def successors(self, block: int) -> list:
+        """
+            Returns indexes of blocks that can follow the block
+        """
+        return self.blocks[block].successors
+
+    def uses(self, instruction: Instruction) -> frozenset:
+        """
+            Returns names of GF variables, whose values the instruction reads
+            (BREAK prints the whole GF, SETCHAR also reads the variable it writes into)
+        """
+        if instruction.opcode == "BREAK":
+            return self.names
+        operands = instruction.operands
+        if self.defines(instruction) is not None and instruction.opcode != "SETCHAR":
+            operands = operands[1:]
+        return frozenset(operand.name for operand in operands
+                         if isinstance(operand, Types.Var) and operand.scope == FrameTypes.GF)
+
+    @staticmethod
+    def defines(instruction: Instruction):
+        """
+            Returns name of GF variable the instruction writes into, or None
+        """
+        kinds = EXPECTED_TYPES[instruction.opcode]
+        if not kinds or kinds[0] is not Parser.Var:
+            return None
+        var = instruction.operands[0]
+        return var.name if var.scope == FrameTypes.GF else None
+
+
+class Liveness():
+    """
+        Class that computes live GF variables (their values can be read later) with backward
+        dataflow analysis over `ControlFlowGraph`. Nothing is live at the end of the program,
+        at EXIT or when an error stops it.
+
+        Methods:
+            live_after(idx): Returns names of variables live right after instruction at idx
+            transfer(live, instruction): Changes variables live after instruction to variables live before it
+    """
+
+    def __init__(self, cfg: ControlFlowGraph):
+        self.cfg = cfg
+        blocks = cfg.blocks
+        uses, kills = [], []
+        for block in blocks:
+            used, killed = set(), set()
+            for idx in reversed(range(block.start, block.end)):
+                instruction = cfg.instructions[idx]
+                self.transfer(used, instruction)
+                defined = cfg.defines(instruction)
+                if defined is not None and instruction.opcode != "SETCHAR":
+                    killed.add(defined)
+            uses.append(frozenset(used))
+            kills.append(frozenset(killed))
+
+        self.live_in = [frozenset()] * len(blocks)
+        self.live_out = [frozenset()] * len(blocks)
+        work = list(range(len(blocks)))
+        while work:
+            number = work.pop()
+            live_out = frozenset().union(*(self.live_in[s] for s in blocks[number].successors))
+            live_in = uses[number] | (live_out - kills[number])
+            self.live_out[number] = live_out
+            if live_in != self.live_in[number]:
+                self.live_in[number] = live_in
+                work.extend(blocks[number].predecessors)
+
+    def live_after(self, idx: int) -> frozenset:
+        """
+            Returns names of variables live right after instruction at idx
+        """
+        cfg = self.cfg
+        block = cfg.blocks[cfg.block_of[idx]]
+        live = set(self.live_out[cfg.block_of[idx]])
+        for i in reversed(range(idx + 1, block.end)):
+            self.transfer(live, cfg.instructions[i])
+        return frozenset(live)
+
+    def transfer(self, live: set, instruction: Instruction):
+        """
+            Changes set of variables live after instruction to variables live before it
+        """
+        defined = self.cfg.defines(instruction)
+        if defined is not None and instruction.opcode != "SETCHAR":
+            live.discard(defined)
+        live |= self.cfg.uses(instruction)
+
+
+class ReachingDefinitions():
+    """
+        Class that computes, which writes into GF variables (indexes of instructions)
+        can reach every instruction, with forward dataflow analysis over `ControlFlowGraph`.
+
+        Methods:
+            reaching(idx): Returns indexes of writes, that can reach instruction at idx
+            definitions(idx, name): Returns indexes of writes into variable, that can reach instruction at idx
+    """
+
+    def __init__(self, cfg: ControlFlowGraph):
+        self.cfg = cfg
+        blocks = cfg.blocks
+        self.writes = {}
+        for idx, instruction in enumerate(cfg.instructions):
+            defined = cfg.defines(instruction)
+            if defined is not None:
+                self.writes.setdefault(defined, set()).add(idx)
+
+        gens, kills = [], []
+        for block in blocks:
+            gen, kill = {}, set()
+            for idx in range(block.start, block.end):
+                defined = cfg.defines(cfg.instructions[idx])
+                if defined is not None:
+                    gen[defined] = idx
+                    kill |= self.writes[defined]
+            gens.append(frozenset(gen.values()))
+            kills.append(frozenset(kill))
+
+        self.reach_in = [frozenset()] * len(blocks)
+        self.reach_out = [frozenset()] * len(blocks)
+        work = list(reversed(range(len(blocks))))
+        while work:
+            number = work.pop()
+            reach_in = frozenset().union(*(self.reach_out[p] for p in blocks[number].predecessors))
+            reach_out = gens[number] | (reach_in - kills[number])
+            self.reach_in[number] = reach_in
+            if reach_out != self.reach_out[number]:
+                self.reach_out[number] = reach_out
+                work.extend(blocks[number].successors)
+
+    def reaching(self, idx: int) -> frozenset:
+        """
+            Returns indexes of writes, that can reach instruction at idx (before it is executed)
+        """
+        cfg = self.cfg
+        block = cfg.blocks[cfg.block_of[idx]]
+        reach = set(self.reach_in[cfg.block_of[idx]])
+        for i in range(block.start, idx):
+            defined = cfg.defines(cfg.instructions[i])
+            if defined is not None:
+                reach -= self.writes[defined]
+                reach.add(i)
+        return frozenset(reach)
+
+    def definitions(self, idx: int, name: str) -> frozenset:
+        """
+            Returns indexes of writes into variable, that can reach instruction at idx
+        """
+        return self.reaching(idx) & self.writes.get(name, frozenset())
+
+
+class Inliner():
+    """
+        Class that inlines small subroutines. CALL of a subroutine, whose body is a short
+        sequence of instructions without jumps and labels ending with RETURN, is replaced
+        by a copy of the body. The subroutine itself stays in place for the other callers.
+
+        If the body is wrapped in PUSHFRAME/POPFRAME and uses only LF in between, the frame
+        is not moved: PUSHFRAME/POPFRAME are left out and LF variables are rewritten to TF,
+        so the variables are the same and frames end up in the same state.
+
+        Tail calls are not inlined, they don't use the call stack already and RETURN after them
+        is never executed. Executions of CALL and RETURN are counted by the first and the last
+        copied instruction, so RETURN is counted also when the last one fails.
+
+        Methods:
+            inline(instructions, labels): Returns instructions with inlined calls and their origins
+            body(instructions, labels, label): Returns copy of the body of subroutine at label
+    """
+
+    SIZE = 8
+    BUDGET = 1024
+
+    # jumps need the call stack, labels would be defined twice, BREAK prints the call stack
+    CONTROL = ("LABEL", "JUMP", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS",
+               "CALL", "BREAK")
+    FRAMES = ("CREATEFRAME", "PUSHFRAME", "POPFRAME")
+
+    def __init__(self, size=SIZE, budget=BUDGET):
+        self.size = size
+        self.budget = budget
+
+    def inline(self, instructions: list, labels: dict) -> tuple:
+        """
+            Returns instructions with inlined calls (at most `budget` instructions are added).
+
+            Return:
+                (instructions, origins), where origins are indexes of original instructions,
+                whose executions every instruction stands for. If nothing was inlined,
+                given instructions and None are returned.
+        """
+        code, origins = [], []
+        budget = self.budget
+        for idx, instruction in enumerate(instructions):
+            body = None
+            if instruction.opcode == "CALL" and not instruction.tail_call:
+                body = self.body(instructions, labels, instruction.operands[0].value)
+            if body is None or len(body[0]) > budget:
+                code.append(instruction)
+                origins.append((idx,))
+                continue
+            copies, body_origins = body
+            budget -= len(copies)
+            body_origins[0] = (idx,) + body_origins[0]
+            code += copies
+            origins += body_origins
+
+        if budget == self.budget:
+            return instructions, None
+        return code, origins
+
+    def body(self, instructions: list, labels: dict, label: str):
+        """
+            Returns copy of the body of subroutine at label and origins of its instructions
+            (the first one stands also for CALL, the last one for RETURN), None if it can't be inlined
+        """
+        start = labels.get(label)
+        if start is None:
+            return None
+        end = start + 1
+        while end < len(instructions) and instructions[end].opcode != "RETURN":
+            if instructions[end].opcode in self.CONTROL:
+                return None
+            end += 1
+        if end == len(instructions):
+            return None
+
+        body = list(range(start + 1, end))
+        frame = self._is_frame_body(instructions, body)
+        if frame:
+            body = body[1:-1]
+        if len(body) == 0 or len(body) > self.size:
+            return None
+
+        copies = [self._copy(instructions[idx], frame) for idx in body]
+        origins = [(idx,) for idx in body]
+        if frame:
+            origins[0] = (start + 1,) + origins[0]
+            origins[-1] = origins[-1] + (end - 1,)
+        origins[-1] = origins[-1] + (end,)
+        return copies, origins
+
+    def _is_frame_body(self, instructions: list, body: list) -> bool:
+        """
+            Checks if body is PUSHFRAME, instructions using LF (not TF, not frames), POPFRAME.
+            The first instruction must start with LF variable, so missing TF is reported by it,
+            before anything else happens (instead of by PUSHFRAME).
+        """
+        if (len(body) < 3 or instructions[body[0]].opcode != "PUSHFRAME"
+                or instructions[body[-1]].opcode != "POPFRAME"):
+            return False
+        for idx in body[1:-1]:
+            instruction = instructions[idx]
+            if instruction.opcode in self.FRAMES:
+                return False
+            if any(isinstance(operand, Types.Var) and operand.scope == FrameTypes.TF
+                   for operand in instruction.operands):
+                return False
+        operands = instructions[body[1]].operands
+        return (len(operands) > 0 and isinstance(operands[0], Types.Var)
+                and operands[0].scope == FrameTypes.LF)
+
+    @staticmethod
+    def _copy(instruction: Instruction, frame: bool) -> Instruction:
+        operands = instruction.operands
+        if frame:
+            operands = [Types.Var(operand.name, FrameTypes.TF)
+                        if isinstance(operand, Types.Var) and operand.scope == FrameTypes.LF
+                        else operand
+                        for operand in operands]
+        return Instruction(instruction.opcode, instruction.order, operands, parsed=True)
+
+
+class TypeInference():
+    """
+        Class that infers possible types of GF variables with dataflow analysis over
+        linked instructions. Instructions, whose operand types are proven, are marked
+        as `unchecked`, so `Interpreter` executes them without runtime checks.
+
+        Variables of LF and TF are not analyzed, instructions that use them keep all the checks.
+
+        Methods:
+            analyze(instructions, labels): Returns possible types of GF variables before each instruction
+            mark_unchecked(instructions, labels): Marks instructions with proven operand types
+            proven(instructions, labels): Returns, which instructions can be executed without runtime checks
+            successors(instructions, labels, idx, returns): Returns indexes that can follow instruction at idx
+    """
+
+    NOTDEF = "notdef"
+    UNDEF = "undef"
+    VALUES = frozenset(("int", "float", "string", "bool", "nil"))
+    ANY = VALUES | {NOTDEF, UNDEF}
+
+    # types of results, that don't depend on types of operands
+    RESULTS = {
+        "IDIV": frozenset(("int",)),
+        "LT": frozenset(("bool",)),
+        "GT": frozenset(("bool",)),
+        "EQ": frozenset(("bool",)),
+        "AND": frozenset(("bool",)),
+        "OR": frozenset(("bool",)),
+        "NOT": frozenset(("bool",)),
+        "INT2CHAR": frozenset(("string",)),
+        "STRI2INT": frozenset(("int",)),
+        "INT2FLOAT": frozenset(("float",)),
+        "FLOAT2INT": frozenset(("int",)),
+        "CONCAT": frozenset(("string",)),
+        "STRLEN": frozenset(("int",)),
+        "GETCHAR": frozenset(("string",)),
+        "SETCHAR": frozenset(("string",)),
+        "POPS": VALUES,
+    }
+
+    def analyze(self, instructions: list, labels: dict) -> list:
+        """
+            Returns possible types of GF variables before each instruction.
+
+            Return:
+                List of dictionaries (variable name: set of types), None for unreachable instructions
+        """
+        states = [None] * len(instructions)
+        if len(instructions) == 0:
+            return states
+
+        names = {operand.name
+                 for i in instructions for operand in i.operands
+                 if isinstance(operand, Types.Var) and operand.scope == FrameTypes.GF}
+        returns = [idx + 1 for idx, i in enumerate(instructions)
+                   if i.opcode == "CALL" and not i.tail_call]
+
+        states[0] = {name: frozenset((self.NOTDEF,)) for name in names}
+        work = [0]
+        while work:
+            idx = work.pop()
+            state = self._transfer(instructions[idx], states[idx])
+            for succ in self.successors(instructions, labels, idx, returns):
+                old = states[succ]
+                if old is None:
+                    new = dict(state)
+                else:
+                    new = {name: old[name] | state[name] for name in old}
+                if new != old:
+                    states[succ] = new
+                    work.append(succ)
+        return states
+
+    def mark_unchecked(self, instructions: list, labels: dict):
+        """
+            Marks instructions with proven operand types as `unchecked`
+        """
+        for instruction, proven in zip(instructions, self.proven(instructions, labels)):
+            instruction.unchecked = proven
+
+    def proven(self, instructions: list, labels: dict) -> list:
+        """
+            Returns True for every instruction, that can be executed without runtime checks
+        """
+        return [state is not None and self._is_proven(instruction, labels, state)
+                for instruction, state in zip(instructions, self.analyze(instructions, labels))]
+
+    def successors(self, instructions: list, labels: dict, idx: int, returns: list) -> list:
+        """
+            Returns indexes that can follow instruction at idx.
+
+            Params:
+                returns: indexes that RETURN can go back to
+        """
+        instruction = instructions[idx]
+        opcode = instruction.opcode
+        following = [idx + 1] if idx + 1 < len(instructions) else []
+
+        if opcode == "RETURN":
+            return [i for i in returns if i < len(instructions)]
+        if opcode == "EXIT":
+            return []
+        if opcode in ("JUMP", "CALL", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS"):
+            label = instruction.operands[0]
+            jump_to = labels.get(label.value)
+            targets = [] if jump_to is None else [jump_to]
+            if opcode in ("JUMP", "CALL"):
+                return targets
+            return following + targets
+        return following
+
+    def _types(self, symb, state: dict) -> frozenset:
+        """
+            Returns possible types of symb
+        """
+        if not isinstance(symb, Types.Var):
+            return frozenset((str(symb.type),))
+        if symb.scope == FrameTypes.GF:
+            return state[symb.name]
+        return self.ANY
+
+    def _proven_type(self, symb, state: dict):
+        """
+            Returns type of symb if it is proven, otherwise - None
+        """
+        types = self._types(symb, state)
+        if len(types) == 1 and types <= self.VALUES:
+            return next(iter(types))
+        return None
+
+    def _is_defined(self, var, state: dict) -> bool:
+        """
+            Checks if variable is proven to be defined
+        """
+        if var.scope != FrameTypes.GF:
+            return False
+        types = state[var.name]
+        return len(types) > 0 and self.NOTDEF not in types
+
+    def _transfer(self, instruction: Instruction, state: dict) -> dict:
+        """
+            Returns possible types of GF variables after instruction is executed
+        """
+        operands = instruction.operands
+        if (len(operands) == 0 or not isinstance(operands[0], Types.Var)
+                or operands[0].scope != FrameTypes.GF):
+            return state
+
+        opcode = instruction.opcode
+        if opcode == "DEFVAR":
+            types = frozenset((self.UNDEF,))
+        elif opcode == "MOVE":
+            types = self._types(operands[1], state) & self.VALUES
+        elif opcode in ("ADD", "SUB", "MUL", "DIV"):
+            types = (self._types(operands[1], state) & self._types(operands[2], state)
+                     & frozenset(("int", "float")))
+        elif opcode == "READ":
+            types = frozenset((str(operands[1]), "nil"))
+        elif opcode == "TYPE":
+            types = frozenset(("string",))
+            if self.UNDEF in self._types(operands[1], state):
+                types |= {"nil"}
+        elif opcode in self.RESULTS:
+            types = self.RESULTS[opcode]
+        else:
+            return state
+
+        state = dict(state)
+        state[operands[0].name] = types
+        return state
+
+    def _is_proven(self, instruction: Instruction, labels: dict, state: dict) -> bool:
+        """
+            Checks if instruction can be executed without runtime checks
+        """
+        opcode = instruction.opcode
+        operands = instruction.operands
+        types = [self._proven_type(operand, state) if isinstance(operand, Types.Symb) else None
+                 for operand in operands]
+
+        if opcode in ("WRITE", "PUSHS"):
+            return types[0] is not None
+        if opcode in ("JUMPIFEQ", "JUMPIFNEQ"):
+            return (operands[0].value in labels
+                    and types[1] is not None and types[1] == types[2])
+
+        if len(operands) == 0 or not isinstance(operands[0], Types.Var):
+            return False
+        if not self._is_defined(operands[0], state):
+            return False
+
+        if opcode == "MOVE":
+            return types[1] is not None
+        if opcode in ("ADD", "SUB", "MUL", "DIV"):
+            return types[1] in ("int", "float") and types[1] == types[2]
+        if opcode == "IDIV":
+            return types[1] == "int" and types[2] == "int"
+        if opcode in ("LT", "GT"):
+            return types[1] in ("int", "float", "bool", "string") and types[1] == types[2]
+        if opcode == "EQ":
+            return types[1] is not None and types[1] == types[2]
+        if opcode in ("AND", "OR"):
+            return types[1] == "bool" and types[2] == "bool"
+        if opcode == "NOT":
+            return types[1] == "bool"
+        if opcode == "CONCAT":
+            return types[1] == "string" and types[2] == "string"
+        if opcode == "STRLEN":
+            return types[1] == "string"
+        return False
+
+
+class FrameShapes():
+    """
+        Class that proves with dataflow analysis over linked instructions, that frames exist
+        and variables are defined (their DEFVAR was executed on every path). Var operands
+        that are proven get flag `defined`, so `FrameManager` looks them up without checks.
+
+        The analysis keeps a `FrameShapes.Shape` before each instruction: defined variables
+        of GF, of TF (if TF surely exists) and of the known frames on top of LF. LF is tracked
+        relatively to the last CALL, that did not return yet, so after RETURN from a subroutine,
+        that leaves LF as it was, the caller knows its LF again.
+
+        Methods:
+            analyze(instructions, labels): Returns shapes of frames before each instruction
+            mark_defined(instructions, labels): Flags proven Var operands as `defined`
+            proven(instructions, labels): Returns indexes of proven operands of each instruction
+    """
+
+    class Shape():
+        """
+            Frames before an instruction. Names in sets are surely defined.
+
+            Attributes:
+                gf: names of GF variables
+                tf: names of TF variables, None if TF may not exist
+                lf: tuple of known frames on top of LF (sets of names, the top is the last)
+                exact: there are exactly the frames of the last CALL below `lf`
+        """
+
+        def __init__(self, gf=frozenset(), tf=None, lf=(), exact=True):
+            self.gf = gf
+            self.tf = tf
+            self.lf = lf
+            self.exact = exact
+
+        def meet(self, other: 'FrameShapes.Shape') -> 'FrameShapes.Shape':
+            """
+                Returns shape that holds on both of the paths
+            """
+            tf = None if self.tf is None or other.tf is None else self.tf & other.tf
+            exact = self.exact and other.exact and len(self.lf) == len(other.lf)
+            depth = min(len(self.lf), len(other.lf))
+            lf = tuple(a & b for a, b in zip(self.lf[len(self.lf) - depth:], other.lf[len(other.lf) - depth:]))
+            return FrameShapes.Shape(self.gf & other.gf, tf, lf, exact)
+
+        def define(self, var: Types.Var) -> 'FrameShapes.Shape':
+            """
+                Returns shape, where variable is defined
+            """
+            if var.scope == FrameTypes.GF:
+                return FrameShapes.Shape(self.gf | {var.name}, self.tf, self.lf, self.exact)
+            if var.scope == FrameTypes.TF:
+                return FrameShapes.Shape(self.gf, (self.tf or frozenset()) | {var.name}, self.lf, self.exact)
+            if self.lf:
+                return FrameShapes.Shape(self.gf, self.tf, self.lf[:-1] + (self.lf[-1] | {var.name},), self.exact)
+            return self
+
+        def is_defined(self, var: Types.Var) -> bool:
+            """
+                Checks if variable is proven to be defined
+            """
+            if var.scope == FrameTypes.GF:
+                return var.name in self.gf
+            if var.scope == FrameTypes.TF:
+                return self.tf is not None and var.name in self.tf
+            return len(self.lf) > 0 and var.name in self.lf[-1]
+
+        def __eq__(self, other):
+            return (isinstance(other, FrameShapes.Shape) and self.gf == other.gf and self.tf == other.tf
+                    and self.lf == other.lf and self.exact == other.exact)
+
+        def __repr__(self):
+            return f"Shape(gf={set(self.gf)}, tf={self.tf and set(self.tf)}, lf={self.lf}, exact={self.exact})"
+
+    def analyze(self, instructions: list, labels: dict) -> list:
+        """
+            Returns shapes of frames before each instruction.
+
+            Return:
+                List of `FrameShapes.Shape`, None for unreachable instructions
+        """
+        shapes = [None] * len(instructions)
+        if len(instructions) == 0:
+            return shapes
+
+        calls = [idx for idx, i in enumerate(instructions) if i.opcode == "CALL" and not i.tail_call]
+        returned = None  # meet of shapes before all RETURNs
+
+        shapes[0] = FrameShapes.Shape()
+        work = [0]
+        while work:
+            idx = work.pop()
+            instruction = instructions[idx]
+            shape = shapes[idx]
+            following = []
+
+            if instruction.opcode == "RETURN":
+                new = shape if returned is None else returned.meet(shape)
+                if new != returned:
+                    returned = new
+                    work += [call for call in calls if shapes[call] is not None]
+            elif instruction.opcode == "CALL":
+                jump_to = labels.get(instruction.operands[0].value)
+                if instruction.tail_call:
+                    # the callee returns to the caller's caller
+                    following.append((jump_to, shape))
+                else:
+                    following.append((jump_to, FrameShapes.Shape(shape.gf, shape.tf)))
+                    if returned is not None:
+                        following.append((idx + 1, self._returned(shape, returned)))
+            else:
+                shape = self._transfer(instruction, shape)
+                following = [(succ, shape)
+                             for succ in TypeInference().successors(instructions, labels, idx, [])]
+
+            for succ, shape in following:
+                if succ is None or succ >= len(instructions):
+                    continue
+                old = shapes[succ]
+                new = shape if old is None else old.meet(shape)
+                if new != old:
+                    shapes[succ] = new
+                    work.append(succ)
+        return shapes
+
+    def mark_defined(self, instructions: list, labels: dict):
+        """
+            Flags proven Var operands as `defined`. Operands are replaced by new
+            variables, since copies of instructions share them (see `Inliner`).
+        """
+        for instruction, proven in zip(instructions, self.proven(instructions, labels)):
+            operands = instruction.operands
+            for k, operand in enumerate(operands):
+                if isinstance(operand, Types.Var) and operand.defined != (k in proven):
+                    operands[k] = Types.Var(operand.name, operand.scope)
+                    operands[k].defined = k in proven
+
+    def proven(self, instructions: list, labels: dict) -> list:
+        """
+            Returns set of indexes of proven Var operands of every instruction.
+            DEFVAR is never proven, it also checks that the variable is not defined yet.
+        """
+        return [frozenset() if shape is None or instruction.opcode == "DEFVAR" else
+                frozenset(k for k, operand in enumerate(instruction.operands)
+                          if isinstance(operand, Types.Var) and shape.is_defined(operand))
+                for instruction, shape in zip(instructions, self.analyze(instructions, labels))]
+
+    def _transfer(self, instruction: Instruction, shape: 'FrameShapes.Shape') -> 'FrameShapes.Shape':
+        """
+            Returns shape of frames after instruction is executed (without an error)
+        """
+        opcode = instruction.opcode
+        if opcode == "CREATEFRAME":
+            return FrameShapes.Shape(shape.gf, frozenset(), shape.lf, shape.exact)
+        if opcode == "PUSHFRAME":
+            return FrameShapes.Shape(shape.gf, None, shape.lf + (shape.tf or frozenset(),), shape.exact)
+        if opcode == "POPFRAME":
+            if shape.lf:
+                return FrameShapes.Shape(shape.gf, shape.lf[-1], shape.lf[:-1], shape.exact)
+            # frame of the caller was popped
+            return FrameShapes.Shape(shape.gf, frozenset(), (), False)
+
+        # DEFVAR defines its variable, every other instruction fails on undefined variables
+        for operand in instruction.operands:
+            if isinstance(operand, Types.Var):
+                shape = shape.define(operand)
+        return shape
+
+    def _returned(self, call: 'FrameShapes.Shape', returned: 'FrameShapes.Shape') -> 'FrameShapes.Shape':
+        """
+            Returns shape after RETURN back to CALL, given shapes before CALL and before RETURNs.
+            GF variables are never undefined, TF is left by the callee. LF of the caller
+            is known only if all subroutines leave it as it was at their CALL (or push onto it).
+        """
+        if returned.exact:
+            return FrameShapes.Shape(call.gf | returned.gf, returned.tf, call.lf + returned.lf, call.exact)
+        return FrameShapes.Shape(call.gf | returned.gf, returned.tf, returned.lf, False)
+
+
+class DeadStoreElimination():
+    """
+        Class that removes writes into GF variables, whose values are never read (see `Liveness`).
+        Only instructions that can't fail and have no other effect are removed, that is MOVE
+        and operations with types proven by `TypeInference`, so errors stay the same.
+
+        Removed instruction can't fail, so it is executed exactly as many times as the previous
+        instruction in the same basic block, which counts its executions. The first instruction
+        of a block is counted by the instruction after it instead (it is in the same block, or it is
+        LABEL, which runs only when it is not jumped to).
+
+        Methods:
+            eliminate(instructions, labels, origins): Returns instructions without dead stores and their origins
+    """
+
+    REMOVABLE = ("MOVE", "ADD", "SUB", "MUL", "LT", "GT", "EQ", "AND", "OR", "NOT",
+                 "CONCAT", "STRLEN")
+    # instructions, after which a basic block starts
+    LEADS = ControlFlowGraph.ENDS + ("LABEL",)
+
+    def eliminate(self, instructions: list, labels: dict, origins: list = None) -> tuple:
+        """
+            Returns instructions without dead stores. Removing a store can make other
+            stores dead (their values were read only by it), so it is repeated.
+
+            Params:
+                origins: indexes of original instructions every instruction stands for (see `Inliner`)
+
+            Return:
+                (instructions, origins), given instructions and origins if nothing was removed
+        """
+        if origins is None:
+            origins = [(idx,) for idx in range(len(instructions))]
+        removed = False
+        while True:
+            dead = self.dead_stores(instructions, labels)
+            if not dead:
+                break
+            removed = True
+            code, code_origins, pending = [], [], ()
+            for idx, instruction in enumerate(instructions):
+                if idx in dead:
+                    if pending or idx == 0 or instructions[idx - 1].opcode in self.LEADS:
+                        pending += origins[idx]
+                    else:
+                        code_origins[-1] += origins[idx]
+                    continue
+                code.append(instruction)
+                code_origins.append(pending + origins[idx])
+                pending = ()
+            instructions, origins = code, code_origins
+            # tail calls are not marked again, RETURN after CALL keeps counting removed stores
+            labels = Linker(tail_calls=False).find_labels(instructions)
+
+        return instructions, origins if removed else None
+
+    def dead_stores(self, instructions: list, labels: dict) -> set:
+        """
+            Returns indexes of removable instructions, whose results are never read
+        """
+        cfg = ControlFlowGraph(instructions, labels)
+        liveness = Liveness(cfg)
+        proven = TypeInference().proven(instructions, labels)
+        dead = set()
+        for number, block in enumerate(cfg.blocks):
+            live = set(liveness.live_out[number])
+            for idx in reversed(range(block.start, block.end)):
+                instruction = instructions[idx]
+                defined = cfg.defines(instruction)
+                if (instruction.opcode in self.REMOVABLE and proven[idx] and defined is not None
+                        and defined not in live and idx + 1 < len(instructions)):
+                    # removed instruction reads nothing
+                    dead.add(idx)
+                    continue
+                liveness.transfer(live, instruction)
+        return dead
+
+
+class CountedLoop():
+    """
+        Counted loop recognized by `LoopIdioms`. Its LABEL runs the whole loop at once:
+        number of iterations is computed from the counter, step and bound, int accumulators
+        are updated in closed form and float accumulators by repeated operation
+        (vectorized with NumPy if it is installed), so results are exactly the same.
+
+        If any operand is not as expected at runtime (undefined, wrong type, the loop would
+        never end), nothing is changed and instructions are executed one by one as usual.
+
+        Methods:
+            run(interpreter): Executes the loop, returns False if it must be run as usual
+            trips(start, step, bound): Returns number of iterations of the loop
+
+        Attributes:
+            end: index the interpreter continues from (it is incremented after the LABEL)
+            first: 1 if condition is checked after the body (do-while), 0 if before it
+            kind: counter is compared with bound, loop continues while "counter <kind> bound"
+            test: variable set by LT/GT in condition (None if there is none) and its value at exit
+            updates: (opcode, variable, operand, operand is counter already updated in the iteration)
+                of accumulators, operand is `counter` itself when the counter is added
+            executions: (index, executions per iteration, additional executions) of every instruction
+    """
+
+    BLOCK = 65536
+
+    def __init__(self, end: int, first: int, counter: Types.Var, step: Types.Symb, sign: int,
+                 bound: Types.Symb, kind: str, test, updates: list, executions: list):
+        # operands are looked up at the LABEL, where proofs of `FrameShapes` don't hold
+        self.end = end
+        self.first = first
+        self.counter = self._checked(counter)
+        self.step = self._checked(step)
+        self.sign = sign
+        self.bound = self._checked(bound)
+        self.kind = kind
+        self.test = None if test is None else (self._checked(test[0]), test[1])
+        self.updates = [(opcode, self._checked(var),
+                         self.counter if operand is counter else self._checked(operand), after)
+                        for opcode, var, operand, after in updates]
+        self.executions = executions
+
+    @staticmethod
+    def _checked(symb: Types.Symb) -> Types.Symb:
+        """
+            Returns copy of a variable, that is not flagged as `defined`, constants are kept
+        """
+        return Types.Var(symb.name, symb.scope) if isinstance(symb, Types.Var) else symb
+
+    def trips(self, start: int, step: int, bound: int):
+        """
+            Returns number of iterations of the loop, None if the loop never ends
+        """
+        kind, first = self.kind, self.first
+        if kind == "le":
+            kind, bound = "lt", bound + 1
+        elif kind == "ge":
+            kind, bound = "gt", bound - 1
+
+        if kind == "ne":
+            if step == 0:
+                return first if start == bound else None
+            if (bound - start) % step != 0 or (bound - start) // step < first:
+                return None
+            return (bound - start) // step
+        if kind == "lt":
+            if start + first * step >= bound:
+                return first
+            return None if step <= 0 else -((start - bound) // step)
+        if start + first * step <= bound:
+            return first
+        return None if step >= 0 else -((bound - start) // -step)
+
+    def run(self, interpreter: 'Interpreter') -> bool:
+        """
+            Executes the loop
+
+            Return:
+                False if nothing was changed and the loop must be executed as usual
+        """
+        frames = interpreter.FManager
+        try:
+            counter = frames.get_var(self.counter)
+            step = self._symb(frames, self.step)
+            bound = self._symb(frames, self.bound)
+            test = None if self.test is None else frames.get_var(self.test[0])
+            updates = [(opcode, frames.get_var(var),
+                        None if operand is self.counter else self._symb(frames, operand), after)
+                       for opcode, var, operand, after in self.updates]
+        except Exceptions._Exception:
+            return False
+        if not (counter.type.is_int() and step.type.is_int() and bound.type.is_int()):
+            return False
+
+        start, step = counter.value, self.sign * step.value
+        trips = self.trips(start, step, bound.value)
+        if trips is None:
+            return False
+
+        results = []
+        for opcode, var, operand, after in updates:
+            if operand is None:
+                if not var.type.is_int():
+                    return False
+                results.append(self._progression(opcode, var.value, start + after * step, step, trips))
+            elif var.type.is_int() and operand.type.is_int():
+                results.append(self._constant(opcode, var.value, operand.value, trips))
+            elif type(var.value) is float and type(operand.value) is float:
+                # floats converted by INT2FLOAT keep their int values, those are not doubles
+                results.append(self._repeat(opcode, var.value, operand.value, trips))
+            else:
+                return False
+
+        for (opcode, var, operand, after), value in zip(updates, results):
+            var.value = value
+        counter.value = start + trips * step
+        if test is not None:
+            test.set_symb(Types.Symb.Bool(self.test[1]))
+
+        counts = interpreter.counts
+        for idx, per_iteration, additional in self.executions:
+            counts[idx] += trips * per_iteration + additional
+        interpreter.idx = self.end
+        return True
+
+    @staticmethod
+    def _symb(frames: FrameManager, symb: Types.Symb) -> Types.Symb:
+        if isinstance(symb, Types.Var):
+            return frames.get_var(symb)
+        return symb
+
+    @staticmethod
+    def _constant(opcode: str, value: int, operand: int, trips: int) -> int:
+        """
+            Returns int value after `trips` times repeated operation with loop invariant operand
+        """
+        if opcode == "ADD":
+            return value + trips * operand
+        if opcode == "SUB":
+            return value - trips * operand
+        return 0 if value == 0 else value * operand ** trips
+
+    @staticmethod
+    def _progression(opcode: str, value: int, first: int, step: int, trips: int) -> int:
+        """
+            Returns int value after `trips` times repeated operation with counter,
+            which is `first` in the first iteration and is increased by `step`
+        """
+        total = trips * first + step * trips * (trips - 1) // 2
+        if opcode == "ADD":
+            return value + total
+        if opcode == "SUB":
+            return value - total
+        if value == 0:
+            return 0
+        if step == 0:
+            return value * first ** trips
+        return value * math.prod(range(first, first + trips * step, step))
+
+    @classmethod
+    def _repeat(cls, opcode: str, value: float, operand: float, trips: int) -> float:
+        """
+            Returns float value after `trips` times repeated operation. Every operation
+            is rounded, so it can't be computed in closed form, NumPy's accumulate does
+            the operations one by one in the same order.
+        """
+        if numpy is None:
+            for _ in range(trips):
+                if opcode == "ADD":
+                    value = value + operand
+                elif opcode == "SUB":
+                    value = value - operand
+                else:
+                    value = value * operand
+            return value
+
+        ufunc = {"ADD": numpy.add, "SUB": numpy.subtract, "MUL": numpy.multiply}[opcode]
+        block = numpy.full(min(trips, cls.BLOCK) + 1, operand, dtype=numpy.float64)
+        with numpy.errstate(all="ignore"):
+            while trips > 0:
+                size = min(trips, cls.BLOCK)
+                block[0] = value
+                value = float(ufunc.accumulate(block[:size + 1])[-1])
+                trips -= size
+        return value
+
+
+class LoopIdioms():
+    """
+        Class that recognizes counted loops in linked instructions and marks their LABELs,
+        so `Interpreter` runs them at once (see `CountedLoop`). Recognized loops are
+
+            LABEL loop                      LABEL loop
+            <updates>                       [LT|GT test counter bound]
+            [LT|GT test counter bound]      JUMPIFEQ|JUMPIFNEQ end counter|test bound|bool
+            JUMPIFEQ|JUMPIFNEQ loop ...     <updates>
+                                            JUMP loop
+
+        where every update is ADD/SUB/MUL of a variable with itself and a loop invariant
+        (or counter), and counter is updated by ADD/SUB with a loop invariant.
+
+        Methods:
+            mark_loops(instructions, labels): Sets `loop` of LABELs of recognized loops
+            recognize(instructions, labels, head): Returns `CountedLoop` starting at LABEL at head or None
+    """
+
+    UPDATES = ("ADD", "SUB", "MUL")
+    COMPARISONS = ("LT", "GT")
+    JUMPS = ("JUMPIFEQ", "JUMPIFNEQ")
+    NEGATED = {"ne": None, "lt": "ge", "gt": "le"}
+
+    def mark_loops(self, instructions: list, labels: dict):
+        """
+            Sets `loop` of LABELs of recognized loops (`CountedLoop`), others get None
+        """
+        for idx, instruction in enumerate(instructions):
+            instruction.loop = None
+            if instruction.opcode == "LABEL":
+                instruction.loop = self.recognize(instructions, labels, idx)
+
+    def recognize(self, instructions: list, labels: dict, head: int):
+        """
+            Returns `CountedLoop` starting at LABEL at head, None if the loop is not recognized
+        """
+        label = instructions[head].operands[0].value
+        idx = self._skip(instructions, head + 1, self.UPDATES + self.COMPARISONS)
+        if idx >= len(instructions) or instructions[idx].opcode not in self.JUMPS:
+            return None
+        jump = instructions[idx]
+
+        if jump.operands[0].value == label:
+            # do-while, condition is at the end of the body
+            body, check = self._split_condition(instructions, head + 1, idx)
+            condition = self._condition(instructions[check:idx], jump, True)
+            end, first = idx, 1
+            executions = [(i, 1, 0) for i in range(head + 1, idx + 1)]
+        else:
+            # while, condition is before the body and the body ends with JUMP back
+            condition = self._condition(instructions[head + 1:idx], jump, False)
+            back = self._skip(instructions, idx + 1, self.UPDATES)
+            if (back >= len(instructions) or instructions[back].opcode != "JUMP"
+                    or instructions[back].operands[0].value != label
+                    or jump.operands[0].value not in labels):
+                return None
+            body = instructions[idx + 1:back]
+            end, first = labels[jump.operands[0].value], 0
+            executions = ([(i, 1, 1) for i in range(head + 1, idx + 1)]
+                          + [(i, 1, 0) for i in range(idx + 1, back + 1)])
+
+        if condition is None:
+            return None
+        operands, kind, test = condition
+        return self._loop(body, operands, kind, test, end, first, executions)
+
+    @staticmethod
+    def _skip(instructions: list, idx: int, opcodes: tuple) -> int:
+        while idx < len(instructions) and instructions[idx].opcode in opcodes:
+            idx += 1
+        return idx
+
+    def _split_condition(self, instructions: list, start: int, jump: int) -> tuple:
+        """
+            Returns body and index, where condition before jump starts
+        """
+        check = jump - 1 if jump > start and instructions[jump - 1].opcode in self.COMPARISONS else jump
+        return instructions[start:check], check
+
+    def _condition(self, compare: list, jump: Instruction, jump_continues: bool):
+        """
+            Returns compared operands, kind of comparison, which must be true to continue
+            the loop, and (test variable, its value at exit), None if condition is not recognized
+        """
+        label, symb1, symb2 = jump.operands
+        if len(compare) == 0:
+            # JUMPIFNEQ loop / JUMPIFEQ end, loop continues while operands are not equal
+            if jump_continues != (jump.opcode == "JUMPIFNEQ"):
+                return None
+            return (symb1, symb2), "ne", None
+        if len(compare) != 1 or compare[0].opcode not in self.COMPARISONS:
+            return None
+
+        var, operand1, operand2 = compare[0].operands
+        if self._same(symb1, var) and self._is_bool(symb2):
+            value = symb2.value
+        elif self._same(symb2, var) and self._is_bool(symb1):
+            value = symb1.value
+        else:
+            return None
+
+        # value of test, at which the loop continues
+        jumps_at = value if jump.opcode == "JUMPIFEQ" else not value
+        continues_at = jumps_at if jump_continues else not jumps_at
+        kind = "lt" if compare[0].opcode == "LT" else "gt"
+        if not continues_at:
+            kind = self.NEGATED[kind]
+        return (operand1, operand2), kind, (var, not continues_at)
+
+    def _loop(self, body: list, operands: tuple, kind: str, test, end: int, first: int,
+              executions: list):
+        """
+            Returns `CountedLoop` with given body and condition, None if the body is not
+            made of updates of distinct variables by loop invariants and one counter
+        """
+        updates = {}
+        for instruction in body:
+            if instruction.opcode not in self.UPDATES:
+                return None
+            var, symb1, symb2 = instruction.operands
+            if self._same(var, symb1):
+                operand = symb2
+            elif self._same(var, symb2) and instruction.opcode != "SUB":
+                operand = symb1
+            else:
+                return None
+            if self._key(var) in updates:
+                return None
+            updates[self._key(var)] = (instruction.opcode, var, operand)
+
+        test_key = None if test is None else self._key(test[0])
+        if test_key in updates:
+            return None
+
+        def invariant(symb):
+            key = self._key(symb)
+            return key is None or (key not in updates and key != test_key)
+
+        symb1, symb2 = operands
+        if self._key(symb1) in updates and invariant(symb2):
+            counter, bound = symb1, symb2
+        elif self._key(symb2) in updates and invariant(symb1):
+            counter, bound = symb2, symb1
+            kind = {"lt": "gt", "gt": "lt", "le": "ge", "ge": "le"}.get(kind, kind)
+        else:
+            return None
+
+        counter_key = self._key(counter)
+        opcode, _, step = updates[counter_key]
+        if opcode == "MUL" or not invariant(step):
+            return None
+
+        keys = list(updates)
+        position = keys.index(counter_key)
+        accumulators = []
+        for at, key in enumerate(keys):
+            if key == counter_key:
+                continue
+            update_opcode, var, operand = updates[key]
+            if self._key(operand) == counter_key:
+                accumulators.append((update_opcode, var, counter, at > position))
+            elif invariant(operand):
+                accumulators.append((update_opcode, var, operand, False))
+            else:
+                return None
+
+        return CountedLoop(end, first, counter, step, 1 if opcode == "ADD" else -1, bound, kind,
+                           test, accumulators, executions)
+
+    @staticmethod
+    def _key(symb):
+        """
+            Returns identity of variable (frame and name), None for literals
+        """
+        if isinstance(symb, Types.Var):
+            return (symb.scope, symb.name)
+        return None
+
+    def _same(self, symb1, symb2) -> bool:
+        return self._key(symb1) is not None and self._key(symb1) == self._key(symb2)
+
+    @staticmethod
+    def _is_bool(symb) -> bool:
+        return not isinstance(symb, Types.Var) and symb.type.is_bool()
+
+
+def operand_text(operand) -> str:
+    """
+        Returns operand as it is written in IPPcode23 (e.g. GF@a, int@1, label)
+    """
+    if isinstance(operand, Types.Var):
+        return f"{operand.scope.name}@{operand.name}"
+    if isinstance(operand, Types.Symb):
+        return f"{operand.type}@{operand.value}"
+    if isinstance(operand, Types.Type):
+        return str(operand)
+    return str(operand.value)
+
+
+class FlightRecorder():
+    """
+        Ring buffer of the last executed instructions. Interpreter records only index of every
+        executed instruction, orders and opcodes are looked up when the buffer is dumped.
+        Values of operands are recorded only if `values` is True, because it is much slower.
+
+        Methods:
+            attach(instructions): Clears the buffer for a new run of given instructions
+            record_values(interpreter, instruction): Records values of operands of an instruction
+            forget(): Removes the last recorded instruction
+            report(): Returns recorded instructions as text
+            dump(file): Writes report into file
+    """
+
+    SIZE = 32
+
+    def __init__(self, size=SIZE, values=False):
+        self.size = size
+        self.values = values
+        self.instructions = []
+        self.indexes = collections.deque(maxlen=size)
+        self.operands = collections.deque(maxlen=size)
+
+    def attach(self, instructions: list):
+        """
+            Clears the buffer for a new run of given instructions
+        """
+        self.instructions = instructions
+        self.indexes.clear()
+        self.operands.clear()
+
+    def forget(self):
+        """
+            Removes the last recorded instruction, that did not finish and will be executed again
+        """
+        if self.indexes:
+            self.indexes.pop()
+        if self.values and self.operands:
+            self.operands.pop()
+
+    def record_values(self, interpreter: 'Interpreter', instruction: Instruction):
+        """
+            Records values of operands of an instruction before it is executed
+        """
+        values = []
+        for operand in instruction.decode():
+            if isinstance(operand, Types.Var):
+                try:
+                    var = interpreter.FManager.get_var(operand)
+                    values.append(f"{operand_text(operand)}={var.type}@{var.value}")
+                except Exceptions._Exception:
+                    values.append(f"{operand_text(operand)}=?")
+            else:
+                values.append(operand_text(operand))
+        self.operands.append(" ".join(values))
+
+    def report(self) -> str:
+        """
+            Returns recorded instructions as text, the last one is the instruction that failed
+        """
+        operands = list(self.operands) if self.values else []
+        operands = [""] * (len(self.indexes) - len(operands)) + operands
+        lines = [f"Flight recorder (last {len(self.indexes)} instructions):"]
+        for idx, values in zip(list(self.indexes), operands):
+            instruction = self.instructions[idx]
+            lines.append(f"  order={instruction.order} {instruction.opcode} {values}".rstrip())
+        return "\n".join(lines)
+
+    def dump(self, file=sys.stderr):
+        """
+            Writes report into file
+
+            Params:
+                file: path (file is rewritten) or writer
+        """
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                print(self.report(), file=f)
+        else:
+            print(self.report(), file=file)
+
+
+class Interpreter():
+    """
+        Class that executes linked instructions. It holds the whole state of a running program.
+
+        Every opcode has its handler `_<opcode>()`. Some opcodes also have unchecked handler
+        `_<opcode>_unchecked()` that is used for instructions, whose operand types were proven
+        by `TypeInference`, so it skips the runtime checks.
+
+        Every executed instruction is recorded in `recorder` (see `FlightRecorder`), and accounted
+        by `memory` if it is given (see `MemoryProfiler`).
+        LABEL of a counted loop (see `LoopIdioms`) runs the whole loop, instructions of the loop
+        are then counted, but not recorded.
+
+        Methods:
+            run(): Executes instructions until the end of the program
+            run_slice(count): Executes at most `count` instructions
+            retry(): Forgets the instruction that raised and will be executed again
+
+        Raise:
+            ProgramExit: program was stopped by EXIT
+    """
+
+    def __init__(self, instructions: list, labels: dict, input, stdout=None, stderr=None,
+                 recorder: FlightRecorder = None, stack: StackManager = None, memory: 'MemoryProfiler' = None):
+        self.instructions = instructions
+        self.labels = labels
+        self.input = input
+        self.stdout = sys.stdout if stdout is None else stdout
+        self.stderr = sys.stderr if stderr is None else stderr
+        self.FManager = FrameManager()
+        self.SManager = StackManager() if stack is None else stack
+        self.CStack = CallStack()
+        self.idx = 0
+        self.steps = 0
+        self.counts = [0] * len(instructions)
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.recorder = FlightRecorder() if recorder is None else recorder
+        self.recorder.attach(instructions)
+        self.memory = memory
+        self._handlers = [self._first_execution if i.operands is None else self._handler(i)
+                          for i in instructions]
+
+    def _handler(self, instruction: Instruction):
+        """
+            Selects handler for given instruction
+        """
+        name = f"_{instruction.opcode.lower()}"
+        if instruction.unchecked and hasattr(self, f"{name}_unchecked"):
+            name = f"{name}_unchecked"
+        if instruction.loop is not None:
+            name = "_loop"
+        handler = getattr(self, name)
+
+        if self.recorder.values:
+            handler = self._recorded(handler)
+        if self.memory is not None:
+            handler = self.memory.profiled(self, instruction, handler)
+        return handler
+
+    def _recorded(self, handler):
+        """
+            Returns handler, that records values of operands before the instruction is executed
+        """
+        def recorded(instruction: Instruction):
+            self.recorder.record_values(self, instruction)
+            handler(instruction)
+        return recorded
+
+    def _first_execution(self, instruction: Instruction):
+        """
+            Handler of instructions with lazy operands. It decodes operands, replaces
+            itself with the selected handler and executes the instruction.
+        """
+        instruction.decode()
+        handler = self._handler(instruction)
+        self._handlers[self.idx] = handler
+        handler(instruction)
+
+    def run(self):
+        """
+            Executes instructions until the end of the program
+        """
+        instructions = self.instructions
+        handlers = self._handlers
+        counts = self.counts
+        record = self.recorder.indexes.append
+        while self.idx < len(instructions):
+            idx = self.idx
+            record(idx)
+            # counted before, so EXIT and instructions that fail are counted as well
+            counts[idx] += 1
+            handlers[idx](instructions[idx])
+            self.idx += 1
+
+    def run_slice(self, count: int) -> bool:
+        """
+            Executes at most `count` instructions. When an instruction raises,
+            index still points to it and it is counted (see `retry()`).
+            Executed instructions are counted in `steps`.
+
+            Return:
+                False if there are no instructions left, otherwise - True
+        """
+        instructions = self.instructions
+        handlers = self._handlers
+        counts = self.counts
+        record = self.recorder.indexes.append
+        end = len(instructions)
+        remaining = count
+        try:
+            while remaining > 0 and self.idx < end:
+                idx = self.idx
+                record(idx)
+                counts[idx] += 1
+                handlers[idx](instructions[idx])
+                self.idx += 1
+                remaining -= 1
+        finally:
+            self.steps += count - remaining
+        return self.idx < end
+
+    def retry(self):
+        """
+            Forgets the instruction at `idx`, that raised and will be executed again
+            (in counts and in the flight recorder)
+        """
+        self.counts[self.idx] -= 1
+        self.recorder.forget()
+
+    def _symb(self, symb: Types.Symb) -> Types.Symb:
+        """
+            Returns symb. Variables are looked up in frames.
+
+            Raise:
+                ValueUndefinedError: variable's value is undefined
+        """
+        if isinstance(symb, Types.Var):
+            symb = self.FManager.get_var(symb)
+            if symb.type.is_undef():
+                raise Exceptions.ValueUndefinedError(
+                    "Var's value is undefined")
+        return symb
+
+    def _value(self, symb: Types.Symb) -> Types.Symb:
+        """
+            Returns symb just like `_symb()`, but variable also must not be nil.
+
+            Raise:
+                ValueUndefinedError: variable's value is undefined or nil
+        """
+        if isinstance(symb, Types.Var):
+            symb = self._symb(symb)
+            if symb.type.is_nil():
+                raise Exceptions.ValueUndefinedError("Missing value")
+        return symb
+
+    def _jump_to(self, label: Types.Label) -> int:
+        """
+            Returns index of label
+
+            Raise:
+                SemanticError: label is undefined
+        """
+        jump_to = self.labels.get(label.value)
+        if jump_to is None:
+            raise Exceptions.SemanticError(
+                f"Label {label.value} is undefined")
+        return jump_to
+
+    def _proven(self, symb: Types.Symb) -> Types.Symb:
+        """
+            Returns symb, which was proven to be defined and set. Variables are looked up without checks.
+        """
+        if isinstance(symb, Types.Var):
+            return self.FManager.get_var_unchecked(symb)
+        return symb
+
+    def _createframe(self, instruction: Instruction):
+        self.FManager.create_frame(self.idx)
+
+    def _pushframe(self, instruction: Instruction):
+        self.FManager.push_frame()
+
+    def _popframe(self, instruction: Instruction):
+        self.FManager.pop_frame()
+
+    def _defvar(self, instruction: Instruction):
+        var, = instruction.operands
+        self.FManager.set_var(var)
+
+    def _write(self, instruction: Instruction):
+        symb, = instruction.operands
+        self.bytes_written += _write(self._symb(symb), file=self.stdout)
+
+    def _write_unchecked(self, instruction: Instruction):
+        symb, = instruction.operands
+        self.bytes_written += _write(self._proven(symb), file=self.stdout)
+
+    def _dprint(self, instruction: Instruction):
+        symb, = instruction.operands
+        if isinstance(symb, Types.Var):
+            symb = self.FManager.get_var(symb)
+        _write(symb, file=self.stderr)
+
+    def _break(self, instruction: Instruction):
+        print(instruction.order, end="", file=self.stderr)
+        print(self.FManager, end="", file=self.stderr)
+        print(self.SManager, end="", file=self.stderr)
+        print(self.CStack, end="", file=self.stderr)
+
+    def _read(self, instruction: Instruction):
+        var, _type = instruction.operands
+        try:
+            var = self.FManager.get_var(var)
+            value = next(self.input)
+            self.bytes_read += len(value.encode("utf-8"))
+            if _type.is_int():
+                int(value)
+            elif _type.is_float():
+                float.fromhex(value)
+
+            var.set_symb(Types.Symb(value, _type))
+        except (ValueError, StopIteration):
+            var.set_symb(Types.Symb.Nil(None))
+
+    def _move(self, instruction: Instruction):
+        var, symb = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._symb(symb))
+
+    def _move_unchecked(self, instruction: Instruction):
+        var, symb = instruction.operands
+        self.FManager.get_var_unchecked(var).set_symb(self._proven(symb))
+
+    def _add(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._value(symb1) + self._value(symb2))
+
+    def _sub(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._value(symb1) - self._value(symb2))
+
+    def _mul(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._value(symb1) * self._value(symb2))
+
+    def _idiv(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._value(symb1) // self._value(symb2))
+
+    def _div(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._value(symb1) / self._value(symb2))
+
+    def _add_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        var.type = symb1.type
+        var.value = symb1.value + symb2.value
+
+    def _sub_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        var.type = symb1.type
+        var.value = symb1.value - symb2.value
+
+    def _mul_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        var.type = symb1.type
+        var.value = symb1.value * symb2.value
+
+    def _idiv_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        if symb2.value == 0:
+            raise Exceptions.OperandValueError(
+                "0 division is not allowed")
+        var.type = symb1.type
+        var.value = symb1.value // symb2.value
+
+    def _div_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        if symb2.value == 0:
+            raise Exceptions.OperandValueError(
+                "0 division is not allowed")
+        var.type = symb1.type
+        if symb1.type.is_int():
+            var.value = int(symb1.value / symb2.value)
+        else:
+            var.value = symb1.value / symb2.value
+
+    def _exit(self, instruction: Instruction):
+        symb, = instruction.operands
+        symb = self._symb(symb)
+        if not symb.type.is_int():
+            raise Exceptions.TypeError(
+                "EXIT accepts only integer")
+        if symb.value < 0 or symb.value > 49:
+            raise Exceptions.OperandValueError(
+                "EXIT code must be in interval <0, 49>")
+        raise Exceptions.ProgramExit(symb.value)
+
+    def _type(self, instruction: Instruction):
+        var, symb = instruction.operands
+        var = self.FManager.get_var(var)
+        if isinstance(symb, Types.Var):
+            symb = self.FManager.get_var(symb)
+        if symb.type.is_undef():
+            var.set_symb(Types.Symb.Nil(None))
+        else:
+            var.set_symb(Types.Symb.String(str(symb.type)))
+
+    def _lt(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._symb(symb1) < self._symb(symb2))
+
+    def _gt(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._symb(symb1) > self._symb(symb2))
+
+    def _eq(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._symb(symb1) == self._symb(symb2))
+
+    def _lt_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        if symb1.type.is_string():
+            var.set_symb(Types.Symb.Bool(deescape_str(str(symb1.value)) < deescape_str(str(symb2.value))))
+        else:
+            var.set_symb(Types.Symb.Bool(symb1.value < symb2.value))
+
+    def _gt_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        if symb1.type.is_string():
+            var.set_symb(Types.Symb.Bool(deescape_str(str(symb1.value)) > deescape_str(str(symb2.value))))
+        else:
+            var.set_symb(Types.Symb.Bool(symb1.value > symb2.value))
+
+    def _eq_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        var.set_symb(Types.Symb.Bool(self._equal_unchecked(symb1, symb2)))
+
+    def _equal_unchecked(self, symb1: Types.Symb, symb2: Types.Symb) -> bool:
+        """
+            Compares symbs, that were proven to be of the same type
+        """
+        symb1, symb2 = self._proven(symb1), self._proven(symb2)
+        if symb1.type.is_string():
+            return deescape_str(str(symb1.value)) == deescape_str(str(symb2.value))
+        return symb1.value == symb2.value
+
+    def _and(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._value(symb1) & self._value(symb2))
+
+    def _or(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self._value(symb1) | self._value(symb2))
+
+    def _not(self, instruction: Instruction):
+        var, symb1 = instruction.operands
+        var = self.FManager.get_var(var)
+        if isinstance(symb1, Types.Var):
+            symb1 = self._symb(symb1)
+            if symb1.type.is_nil():
+                raise Exceptions.TypeError("Missing value")
+        var.set_symb(~symb1)
+
+    def _and_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        var.set_symb(Types.Symb.Bool(self._proven(symb1).value and self._proven(symb2).value))
+
+    def _or_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        var.set_symb(Types.Symb.Bool(self._proven(symb1).value or self._proven(symb2).value))
+
+    def _not_unchecked(self, instruction: Instruction):
+        var, symb1 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        var.set_symb(Types.Symb.Bool(not self._proven(symb1).value))
+
+    def _int2char(self, instruction: Instruction):
+        var, symb = instruction.operands
+        var = self.FManager.get_var(var)
+        symb = self._symb(symb)
+        if not symb.type.is_int():
+            raise Exceptions.TypeError(
+                "Invalid type in INT2CHAR")
+        try:
+            var.set_symb(Types.Symb.String(chr(symb.value)))
+        except (ValueError, OverflowError) as e:
+            raise Exceptions.StringOperationError(e)
+
+    def _stri2int(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        symb1, symb2 = self._symb(symb1), self._symb(symb2)
+        var.set_symb(Types.Symb.Int(ord(symb1[symb2].value)))
+
+    def _int2float(self, instruction: Instruction):
+        var, symb = instruction.operands
+        var = self.FManager.get_var(var)
+        if isinstance(symb, Types.Var):
+            symb = self._symb(symb)
+            if symb.type.is_nil():
+                raise Exceptions.ValueUndefinedError(
+                    "Cannot convert NIL to FLOAT")
+        if not symb.type.is_int():
+            raise Exceptions.TypeError(
+                "Invalid type in convert")
+
+        var.set_symb(Types.Symb.Float(symb.value))
+
+    def _float2int(self, instruction: Instruction):
+        var, symb = instruction.operands
+        var = self.FManager.get_var(var)
+        if isinstance(symb, Types.Var):
+            symb = self._symb(symb)
+            if symb.type.is_nil():
+                raise Exceptions.ValueUndefinedError(
+                    "Cannot convert NIL to INT")
+        if not symb.type.is_float():
+            raise Exceptions.TypeError(
+                "Invalid type in convert")
+
+        var.set_symb(Types.Symb.Int(int(symb.value)))
+
+    def _label(self, instruction: Instruction):
+        pass
+
+    def _loop(self, instruction: Instruction):
+        instruction.loop.run(self)
+
+    def _call(self, instruction: Instruction):
+        label, = instruction.operands
+        jump_to = self._jump_to(label)
+        if not instruction.tail_call:
+            self.CStack.push(self.idx)
+        self.idx = jump_to
+
+    def _return(self, instruction: Instruction):
+        self.idx = self.CStack.pop()
+
+    def _jump(self, instruction: Instruction):
+        label, = instruction.operands
+        self.idx = self._jump_to(label)
+
+    def _jumpifeq(self, instruction: Instruction):
+        label, symb1, symb2 = instruction.operands
+        jump_to = self._jump_to(label)
+
+        if not symb1.type.is_nil and not symb2.type.is_nil():
+            if symb1.type != symb2.type:
+                raise Exceptions.TypeError(
+                    "Incompatible types in JUMPIFEQ")
+
+        if bool(self._symb(symb1) == self._symb(symb2)):
+            self.idx = jump_to
+
+    def _jumpifneq(self, instruction: Instruction):
+        label, symb1, symb2 = instruction.operands
+        jump_to = self._jump_to(label)
+
+        if not symb1.type.is_nil() and not symb2.type.is_nil():
+            if symb1.type != symb2.type:
+                raise Exceptions.TypeError(
+                    "Incompatible types in JUMPIFNEQ")
+
+        if bool(self._symb(symb1) != self._symb(symb2)):
+            self.idx = jump_to
+
+    def _jumpifeq_unchecked(self, instruction: Instruction):
+        label, symb1, symb2 = instruction.operands
+        if self._equal_unchecked(symb1, symb2):
+            self.idx = self.labels[label.value]
+
+    def _jumpifneq_unchecked(self, instruction: Instruction):
+        label, symb1, symb2 = instruction.operands
+        if not self._equal_unchecked(symb1, symb2):
+            self.idx = self.labels[label.value]
+
+    def _jumpifeqs(self, instruction: Instruction):
+        label, = instruction.operands
+        jump_to = self._jump_to(label)
+
+        symb1, symb2 = self.SManager.get_symb_symb()
+
+        if not symb1.type.is_nil() and not symb2.type.is_nil():
+            if symb1.type != symb2.type:
+                raise Exceptions.TypeError(
+                    "Incompatible types in JUMPIFEQS")
+
+        if bool(symb1 == symb2):
+            self.idx = jump_to
+
+    def _jumpifneqs(self, instruction: Instruction):
+        label, = instruction.operands
+        jump_to = self._jump_to(label)
+
+        symb1, symb2 = self.SManager.get_symb_symb()
+
+        if not symb1.type.is_nil() and not symb2.type.is_nil():
+            if symb1.type != symb2.type:
+                raise Exceptions.TypeError(
+                    "Incompatible types in JUMPIFNEQ")
+
+        if bool(symb1 != symb2):
+            self.idx = jump_to
+
+    def _pushs(self, instruction: Instruction):
+        symb, = instruction.operands
+        self.SManager.push(self._symb(symb).copy())
+
+    def _pushs_unchecked(self, instruction: Instruction):
+        symb, = instruction.operands
+        self.SManager.push(self._proven(symb).copy())
+
+    def _pops(self, instruction: Instruction):
+        var, = instruction.operands
+        var = self.FManager.get_var(var)
+        var.set_symb(self.SManager.pop())
+
+    def _clears(self, instruction: Instruction):
+        self.SManager.clear()
+
+    def _adds(self, instruction: Instruction):
+        self.SManager.add()
+
+    def _subs(self, instruction: Instruction):
+        self.SManager.sub()
+
+    def _muls(self, instruction: Instruction):
+        self.SManager.mul()
+
+    def _divs(self, instruction: Instruction):
+        self.SManager.div()
+
+    def _idivs(self, instruction: Instruction):
+        self.SManager.idiv()
+
+    def _lts(self, instruction: Instruction):
+        self.SManager.lt()
+
+    def _gts(self, instruction: Instruction):
+        self.SManager.gt()
+
+    def _eqs(self, instruction: Instruction):
+        self.SManager.eq()
+
+    def _ands(self, instruction: Instruction):
+        self.SManager.ands()
+
+    def _ors(self, instruction: Instruction):
+        self.SManager.ors()
+
+    def _nots(self, instruction: Instruction):
+        self.SManager.nots()
+
+    def _int2chars(self, instruction: Instruction):
+        self.SManager.int2char()
+
+    def _stri2ints(self, instruction: Instruction):
+        self.SManager.stri2int()
+
+    def _float2ints(self, instruction: Instruction):
+        self.SManager.float2int()
+
+    def _int2floats(self, instruction: Instruction):
+        self.SManager.int2float()
+
+    def _concat(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        symb1, symb2 = self._symb(symb1), self._symb(symb2)
+        if not symb1.type.is_string() or not symb2.type.is_string():
+            raise Exceptions.TypeError(
+                "Both operands must be of type string in CONCAT")
+        var.set_symb(Types.Symb.String(symb1.value + symb2.value))
+
+    def _concat_unchecked(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        var.set_symb(Types.Symb.String(self._proven(symb1).value + self._proven(symb2).value))
+
+    def _strlen(self, instruction: Instruction):
+        var, symb1 = instruction.operands
+        var = self.FManager.get_var(var)
+        symb1 = self._symb(symb1)
+        if not symb1.type.is_string():
+            raise Exceptions.TypeError(
+                "Operand must be of type string in STRLEN")
+        var.set_symb(Types.Symb.Int(len(symb1.value or "")))
+
+    def _strlen_unchecked(self, instruction: Instruction):
+        var, symb1 = instruction.operands
+        var = self.FManager.get_var_unchecked(var)
+        var.set_symb(Types.Symb.Int(len(self._proven(symb1).value or "")))
+
+    def _getchar(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        symb1, symb2 = self._symb(symb1), self._symb(symb2)
+        if not symb1.type.is_string():
+            raise Exceptions.TypeError(
+                "Second operand in GETCHAR must be string")
+        if not symb2.type.is_int():
+            raise Exceptions.TypeError(
+                "Third operand in GETCHAR must be integer")
+        if symb2.value < 0:
+            raise Exceptions.StringOperationError(
+                "Second operand in GETCHAR must be >= 0")
+        var.set_symb(symb1[symb2])
+
+    def _setchar(self, instruction: Instruction):
+        var, symb1, symb2 = instruction.operands
+        var = self.FManager.get_var(var)
+        if var.type.is_undef():
+            raise Exceptions.ValueUndefinedError(
+                "Var's value is undefined")
+        symb1, symb2 = self._symb(symb1), self._symb(symb2)
+        if not var.type.is_string():
+            raise Exceptions.TypeError(
+                "First operand in SETCHAR must be string")
+        if not symb1.type.is_int():
+            raise Exceptions.TypeError(
+                "Second operand in SETCHAR must be integer")
+        if symb1.value < 0:
+            raise Exceptions.StringOperationError(
+                "Second operand in SETCHAR must be >= 0")
+        if not symb2.type.is_string():
+            raise Exceptions.TypeError(
+                "Third operand in SETCHAR must be string")
+        try:
+            val1 = deescape_str(var.value)
+            val2 = deescape_str(symb2.value)
+            listValue = list(val1)
+            listValue[symb1.value] = val2[0]
+            var.set_symb(Types.Symb.String("".join(listValue)))
+        except IndexError as e:
+            raise Exceptions.StringOperationError(e)
+
+
+class AsyncInput():
+    """
+        Iterator of lines for READ, that are fetched from async source by `Program.run_async()`.
+
+        Raise:
+            Pending: READ needs a line that was not fetched yet
+
+        Methods:
+            fetch(): Awaits next line of the source
+    """
+
+    class Pending(Exception):
+        pass
+
+    def __init__(self, source):
+        self._source = source.__aiter__()
+        self._lines = collections.deque()
+        self._exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._lines:
+            return self._lines.popleft()
+        if self._exhausted:
+            raise StopIteration
+        raise AsyncInput.Pending()
+
+    async def fetch(self):
+        """
+            Awaits next line of the source
+        """
+        try:
+            line = await self._source.__anext__()
+        except StopAsyncIteration:
+            self._exhausted = True
+            return
+        if isinstance(line, bytes):
+            line = line.decode()
+        self._lines.append(line.rstrip('\n'))
+
+
+class AsyncOutput():
+    """
+        Buffer for WRITE, that is flushed into async sink by `Program.run_async()`.
+        Sink can be an async function, or an object with `write()` (sync or async)
+        and optional async `drain()`, like `asyncio.StreamWriter`.
+
+        Methods:
+            write(text): Writes text into the buffer
+            flush(): Sends the buffer into the sink and waits for it
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.buffer = io.StringIO()
+
+    def write(self, text: str):
+        return self.buffer.write(text)
+
+    async def flush(self):
+        """
+            Sends the buffer into the sink and waits for it (backpressure)
+        """
+        data = self.buffer.getvalue()
+        if not data:
+            return
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        if not hasattr(self.sink, "write"):
+            await self.sink(data)
+            return
+        written = self.sink.write(data)
+        if inspect.isawaitable(written):
+            await written
+        if hasattr(self.sink, "drain"):
+            await self.sink.drain()
+
+
+class Metrics():
+    """
+        Class that collects runtime metrics of a program run. Counters are kept by
+        `Interpreter` and its managers all the time, they are only read when snapshot is taken,
+        so it is safe to take it at any moment (e.g. from signal handler).
+
+        Methods:
+            attach(program, interpreter): Starts measuring of given run
+            stop(): Stops measuring of execution time
+            snapshot(): Returns metrics as dictionary
+            dump(file): Writes metrics as JSON into file
+    """
+
+    def __init__(self):
+        self.program = None
+        self.interpreter = None
+        self._start = None
+        self._end = None
+
+    def attach(self, program: 'Program', interpreter: Interpreter):
+        """
+            Starts measuring of given run
+        """
+        self.program = program
+        self.interpreter = interpreter
+        self._start = time.perf_counter()
+        self._end = None
+
+    def stop(self):
+        """
+            Stops measuring of execution time
+        """
+        self._end = time.perf_counter()
+
+    def snapshot(self) -> dict:
+        """
+            Returns metrics as dictionary
+        """
+        interpreter = self.interpreter
+        metrics = {
+            "running": False,
+            "load_time": 0.0 if self.program is None else self.program.load_time,
+            "execution_time": 0.0,
+            "instructions": 0,
+            "opcodes": {},
+            "data_stack_peak": 0,
+            "call_depth_peak": 0,
+            "frames_created": 0,
+            "bytes_read": 0,
+            "bytes_written": 0,
+        }
+        if interpreter is None:
+            return metrics
+
+        opcodes = {}
+        counts = self.program.instruction_counts(interpreter.counts)
+        for instruction, count in zip(self.program.instructions, counts):
+            if count:
+                opcodes[instruction.opcode] = opcodes.get(instruction.opcode, 0) + count
+
+        end = time.perf_counter() if self._end is None else self._end
+        metrics.update({
+            "running": self._end is None,
+            "execution_time": end - self._start,
+            "instructions": sum(opcodes.values()),
+            "opcodes": dict(sorted(opcodes.items(), key=lambda item: -item[1])),
+            "data_stack_peak": interpreter.SManager.peak,
+            "call_depth_peak": interpreter.CStack.peak,
+            "frames_created": interpreter.FManager.created,
+            "bytes_read": interpreter.bytes_read,
+            "bytes_written": interpreter.bytes_written,
+        })
+        return metrics
+
+    def dump(self, file=sys.stderr):
+        """
+            Writes metrics as JSON into file
+
+            Params:
+                file: path (file is rewritten) or writer
+        """
+        text = json.dumps(self.snapshot(), indent=2)
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                print(text, file=f)
+        else:
+            print(text, file=file, flush=True)
+
+
+class SamplingProfiler():
+    """
+        Statistical profiler of a program run. Interval timer (SIGPROF, process CPU time)
+        interrupts the run `hz` times per second and the handler records the current instruction
+        together with labels of all the CALLs on the call stack. Instructions are not instrumented,
+        so the run is slowed down only by the samples.
+
+        Stacks are written in collapsed (folded) format of flame graph tools, one line
+        `main;<label of CALL>;...;<order>:<opcode> <number of samples>` per stack. Tail calls
+        don't stay on the call stack, so their callee is shown as a part of the caller.
+
+        Needs `signal.setitimer()` (POSIX).
+
+        Methods:
+            attach(program, interpreter): Starts sampling of given run
+            stop(): Stops sampling
+            folded(): Returns samples as folded stacks
+            dump(file): Writes folded stacks into file
+    """
+
+    HZ = 1000
+
+    def __init__(self, hz=HZ):
+        self.hz = hz
+        self.samples = collections.Counter()
+        self.interpreter = None
+        self._handler = None
+
+    def attach(self, program: 'Program', interpreter: Interpreter):
+        """
+            Starts sampling of given run
+        """
+        self.interpreter = interpreter
+        self._handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, 1 / self.hz, 1 / self.hz)
+
+    def stop(self):
+        """
+            Stops sampling
+        """
+        if self._handler is None:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._handler)
+        self._handler = None
+
+    def _sample(self, signum, frame):
+        """
+            Handler of SIGPROF, records the current stack
+        """
+        interpreter = self.interpreter
+        instructions = interpreter.instructions
+        idx = interpreter.idx
+        if idx >= len(instructions):
+            return
+        stack = ["main"]
+        stack += [instructions[call].operands[0].value for call in interpreter.CStack._calls]
+        stack.append(f"{instructions[idx].order}:{instructions[idx].opcode}")
+        self.samples[";".join(stack)] += 1
+
+    def folded(self) -> str:
+        """
+            Returns samples as folded stacks (the most frequent first)
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def dump(self, file):
+        """
+            Writes folded stacks into file
+
+            Params:
+                file: path (file is rewritten) or writer
+        """
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                f.write(self.folded())
+        else:
+            file.write(self.folded())
+
+
+class MemoryProfiler():
+    """
+        Memory profiler of a program run. Handlers of all the instructions are wrapped,
+        so every write into a variable and every PUSHS is accounted: size of the new value
+        (`sys.getsizeof`) is added to the allocations of the instruction's order, and the largest
+        string of every variable is remembered.
+
+        Sizes of GF, LF (all the frames), TF, data stack and call stack are measured when
+        the run starts and ends. In between they are kept up to date by every instruction:
+        written variables, DEFVAR, frame instructions, CALL/RETURN and entries pushed
+        and popped off the data stack change them by the sizes of the values involved,
+        so peaks are exact even if they last for a single instruction.
+
+        Methods:
+            attach(program, interpreter): Starts profiling of given run
+            profiled(interpreter, instruction, handler): Returns handler, that accounts what the instruction allocated
+            measure(): Measures current sizes of frames and stacks
+            stop(): Takes the last measurement
+            snapshot(): Returns report as dictionary
+            dump(file): Writes report as JSON into file
+    """
+
+    TOP = 10
+    PREVIEW = 32
+    AREAS = ("GF", "LF", "TF", "data_stack", "call_stack")
+    # number of entries popped off the data stack by instruction (None - all of them)
+    POPPED = {**dict.fromkeys(("ADDS", "SUBS", "MULS", "IDIVS", "DIVS", "LTS", "GTS", "EQS", "ANDS", "ORS",
+                               "STRI2INTS", "JUMPIFEQS", "JUMPIFNEQS"), 2),
+              **dict.fromkeys(("POPS", "NOTS", "INT2CHARS", "INT2FLOATS", "FLOAT2INTS"), 1),
+              "PUSHS": 0, "CLEARS": None}
+    FRAMES = ("DEFVAR", "CREATEFRAME", "PUSHFRAME", "POPFRAME", "CALL", "RETURN")
+
+    def __init__(self):
+        self.interpreter = None
+        self.steps = 0
+        self.current = dict.fromkeys(self.AREAS, 0)
+        self.peak = dict.fromkeys(self.AREAS, 0)
+        self.allocations = collections.Counter()  # order: bytes
+        self.counts = collections.Counter()  # order: number of allocations
+        self.opcodes = {}  # order: opcode
+        self.strings = {}  # variable: (bytes, order, preview)
+        self._lframes = []  # sizes of frames on LF
+        self._stack_values = 0  # size of values of data stack entries (not in `base_nbytes()`)
+
+    def attach(self, program: 'Program', interpreter: Interpreter):
+        """
+            Starts profiling of given run (handlers must be already wrapped, see `Program.interpreter()`)
+        """
+        self.interpreter = interpreter
+        self.measure()
+
+    def profiled(self, interpreter: Interpreter, instruction: Instruction, handler):
+        """
+            Returns handler of the instruction, that accounts values it allocated after it is executed
+        """
+        opcode = instruction.opcode
+        writes = instruction.loop is not None or (
+            opcode != "DEFVAR" and bool(instruction.operands) and EXPECTED_TYPES[opcode][0] is Parser.Var)
+        stack = opcode in self.POPPED
+        if not (writes or stack or opcode in self.FRAMES):
+            def counted(instruction: Instruction):
+                handler(instruction)
+                self.steps += 1
+            return counted
+        if writes and not stack and instruction.loop is None:
+            # the most common case, instruction only writes into a variable
+            target = instruction.operands[0]
+            get_var = interpreter.FManager.get_var
+
+            def written(instruction: Instruction):
+                try:
+                    var = get_var(target)
+                except Exceptions._Exception:
+                    # the instruction fails as well
+                    handler(instruction)
+                    raise
+                old = sys.getsizeof(var.value)
+                handler(instruction)
+                self.steps += 1
+                self._written(instruction, var, old)
+            return written
+
+        def profiled(instruction: Instruction):
+            targets = self._targets(interpreter, instruction) if writes else ()
+            frame = self._frame_size(interpreter.FManager, instruction) if opcode == "DEFVAR" else None
+            popped = self._popped(interpreter.SManager, opcode) if stack else None
+            handler(instruction)
+            self._account(interpreter, instruction, targets, frame, popped)
+        return profiled
+
+    def _targets(self, interpreter: Interpreter, instruction: Instruction) -> list:
+        """
+            Returns variables the instruction writes into and sizes of their values
+        """
+        loop = instruction.loop
+        if loop is not None:
+            names = [loop.counter] + [var for _, var, _, _ in loop.updates]
+            if loop.test is not None:
+                names.append(loop.test[0])
+        else:
+            names = instruction.operands[:1]
+        try:
+            return [(var, sys.getsizeof(var.value)) for var in map(interpreter.FManager.get_var, names)]
+        except Exceptions._Exception:
+            # the instruction fails as well (or the loop is run as usual)
+            return []
+
+    def _frame_size(self, frames: FrameManager, instruction: Instruction):
+        """
+            Returns size of the table of variables of the frame DEFVAR declares in, None if there is no frame
+        """
+        frame = self._frame(frames, instruction.operands[0].scope)
+        return None if frame is None else sys.getsizeof(frame._data)
+
+    def _popped(self, data_stack: StackManager, opcode: str) -> tuple:
+        """
+            Returns number of entries that stay on the data stack and size of values that are popped
+        """
+        depth = data_stack.depth()
+        popped = self.POPPED[opcode]
+        popped = depth if popped is None else min(popped, depth)
+        return depth - popped, data_stack.top_nbytes(popped)
+
+    @staticmethod
+    def _frame(frames: FrameManager, scope) -> Frame:
+        if scope is FrameTypes.GF:
+            return frames._gframe
+        if scope is FrameTypes.TF:
+            return frames._tframe
+        return frames._lframe[-1] if frames._lframe else None
+
+    def _set(self, area: str, size: int):
+        self.current[area] = size
+        if size > self.peak[area]:
+            self.peak[area] = size
+
+    def _grow(self, scope, size: int):
+        """
+            Changes size of given frame (GF, TF or the top of LF)
+        """
+        if scope is FrameTypes.LF:
+            self._lframes[-1] += size
+        self._set(scope.name, self.current[scope.name] + size)
+
+    def _account(self, interpreter: Interpreter, instruction: Instruction, targets, frame, popped):
+        self.steps += 1
+        opcode = instruction.opcode
+        operands = instruction.operands
+        frames = interpreter.FManager
+        current = self.current
+
+        if opcode == "PUSHS":
+            symb = operands[0]
+            if isinstance(symb, Types.Var):
+                symb = frames.get_var(symb)
+            self._allocated(instruction, symb.value)
+        elif instruction.loop is not None:
+            for var, old in targets:
+                self._grow(var.scope, sys.getsizeof(var.value) - old)
+        elif targets:
+            self._written(instruction, *targets[0])
+
+        if frame is not None:
+            scope = operands[0].scope
+            self._grow(scope, sys.getsizeof(self._frame(frames, scope)._data) - frame + sys.getsizeof(None))
+        elif opcode == "CREATEFRAME":
+            self._set("TF", self._frame_nbytes(frames._tframe))
+        elif opcode == "PUSHFRAME":
+            self._lframes.append(current["TF"])
+            self._set("LF", current["LF"] + current["TF"])
+            current["TF"] = 0
+        elif opcode == "POPFRAME":
+            self._set("TF", self._lframes.pop())
+            current["LF"] -= current["TF"]
+        elif opcode in ("CALL", "RETURN"):
+            self._set("call_stack", sys.getsizeof(interpreter.CStack._calls))
+
+        if popped is not None:
+            kept, size = popped
+            data_stack = interpreter.SManager
+            self._stack_values += data_stack.top_nbytes(data_stack.depth() - kept) - size
+            self._set("data_stack", data_stack.base_nbytes() + self._stack_values)
+
+    def _written(self, instruction: Instruction, var: Types.Var, old: int):
+        """
+            Accounts new value of the variable, whose previous value had given size
+        """
+        value = var.value
+        size = self._allocated(instruction, value)
+        self._grow(var.scope, size - old)
+        if isinstance(value, str):
+            name = f"{var.scope.name}@{var.name}"
+            largest = self.strings.get(name)
+            if largest is None or size > largest[0]:
+                self.strings[name] = (size, instruction.order, value[:self.PREVIEW])
+
+    def _allocated(self, instruction: Instruction, value) -> int:
+        size = sys.getsizeof(value)
+        self.allocations[instruction.order] += size
+        self.counts[instruction.order] += 1
+        self.opcodes[instruction.order] = instruction.opcode
+        return size
+
+    @staticmethod
+    def _frame_nbytes(frame: Frame) -> int:
+        return sys.getsizeof(frame._data) + sum(sys.getsizeof(var.value) for var in frame._data.values())
+
+    def measure(self):
+        """
+            Measures current sizes of frames and stacks, and updates their peaks
+        """
+        interpreter = self.interpreter
+        frames = interpreter.FManager
+        data_stack = interpreter.SManager
+        self._lframes = [self._frame_nbytes(frame) for frame in frames._lframe]
+        self._stack_values = data_stack.top_nbytes(data_stack.depth())
+        self.current = {
+            "GF": self._frame_nbytes(frames._gframe),
+            "LF": sum(self._lframes),
+            "TF": 0 if frames._tframe is None else self._frame_nbytes(frames._tframe),
+            "data_stack": data_stack.base_nbytes() + self._stack_values,
+            "call_stack": sys.getsizeof(interpreter.CStack._calls),
+        }
+        for area, size in self.current.items():
+            self.peak[area] = max(self.peak[area], size)
+
+    def stop(self):
+        """
+            Takes the last measurement, `current` are then sizes at the end of the run
+        """
+        if self.interpreter is not None:
+            self.measure()
+
+    def snapshot(self) -> dict:
+        """
+            Returns report as dictionary (sizes are in bytes)
+        """
+        interpreter = self.interpreter
+        strings = sorted(self.strings.items(), key=lambda item: -item[1][0])[:self.TOP]
+        return {
+            "instructions": self.steps,
+            "current": self.current,
+            "peak": self.peak,
+            "data_stack_depth_peak": 0 if interpreter is None else interpreter.SManager.peak,
+            "call_depth_peak": 0 if interpreter is None else interpreter.CStack.peak,
+            "largest_strings": [{"variable": name, "bytes": size, "order": order, "preview": preview}
+                                for name, (size, order, preview) in strings],
+            "allocations": [{"order": order, "opcode": self.opcodes[order], "bytes": size,
+                             "count": self.counts[order]}
+                            for order, size in self.allocations.most_common(self.TOP)],
+        }
+
+    def dump(self, file=sys.stderr):
+        """
+            Writes report as JSON into file
+
+            Params:
+                file: path (file is rewritten) or writer
+        """
+        text = json.dumps(self.snapshot(), indent=2)
+        if isinstance(file, str):
+            with open(file, "w") as f:
+                print(text, file=f)
+        else:
+            print(text, file=file, flush=True)
+
+
+class Result():
+    """
+        Class that represents result of a program run.
+
+        Attributes:
+            code: exit code of the program
+            stdout: captured output, None when output was written to given writer
+            error: instance of `Exceptions._Exception` if program failed, otherwise - None
+            counts: number of executions of every instruction (indexes as in `Program.instructions`)
+    """
+
+    def __init__(self, code: int, stdout: str = None, error: 'Exceptions._Exception' = None,
+                 counts: list = None):
+        self.code = code
+        self.stdout = stdout
+        self.error = error
+        self.counts = counts
+
+    def __repr__(self):
+        return f"Result(code={self.code}, error={self.error!r})"
+
+
+class Program():
+    """
+        Class that represents loaded and linked program. Instructions are never changed
+        while running, so the same program can be run many times in the same process.
+
+        Operands of lazily loaded program are decoded on their first execution,
+        optimizations of `_analyze()` need all of them, so they are run only after `validate()`.
+
+        Attributes:
+            instructions: instructions as they were loaded
+            code: instructions that are executed (with inlined calls and without dead stores,
+                see `Inliner` and `DeadStoreElimination`)
+            origins: indexes of `instructions` every instruction of `code` stands for (None if they are the same)
+            labels: label names and their indexes in `code`
+
+        Classmethods:
+            load(source, optimizations, source_format, lazy): Loads program from XML/IPPcode23 string, path or file object
+
+        Methods:
+            validate(): Decodes and validates all operands of lazily loaded program
+            instruction_counts(counts): Maps numbers of executions of `code` onto `instructions`
+            interpreter(input, stdout, stderr): Creates new `Interpreter` for this program
+            run(input, stdout, stderr, metrics, recorder): Runs program and returns `Result`
+            run_async(input, stdout, stderr, slice_size): Runs program cooperatively in asyncio
+    """
+
+    OPTIMIZATIONS = ("tail_calls", "type_inference", "typed_stack", "loop_idioms", "inlining",
+                     "dead_stores", "frame_shapes")
+
+    def __init__(self, instructions: list, optimizations=OPTIMIZATIONS):
+        self.instructions = instructions
+        self.optimizations = frozenset(optimizations)
+        self.load_time = 0.0
+        self.labels = Linker(
+            tail_calls="tail_calls" in self.optimizations).link(instructions)
+        self.code = instructions
+        self.origins = None
+        self.lazy = any(i.operands is None for i in instructions)
+        if not self.lazy:
+            self._analyze()
+
+    def validate(self):
+        """
+            Decodes and validates all operands of lazily loaded program (full validation pass)
+
+            Raise:
+                XMLUnexpectedError, TypeError: invalid operand
+        """
+        if not self.lazy:
+            return
+        for instruction in self.instructions:
+            instruction.decode()
+        self.lazy = False
+        self._analyze()
+
+    def _analyze(self):
+        """
+            Runs optimizations, that need decoded operands
+        """
+        if "inlining" in self.optimizations:
+            self.code, self.origins = Inliner().inline(self.instructions, self.labels)
+            if self.origins is not None:
+                self.labels = Linker(
+                    tail_calls="tail_calls" in self.optimizations).link(self.code)
+        if "dead_stores" in self.optimizations:
+            code, origins = DeadStoreElimination().eliminate(self.code, self.labels, self.origins)
+            if origins is not None:
+                self.code, self.origins = code, origins
+                self.labels = Linker().find_labels(code)
+        if "type_inference" in self.optimizations:
+            TypeInference().mark_unchecked(self.code, self.labels)
+        if "frame_shapes" in self.optimizations:
+            FrameShapes().mark_defined(self.code, self.labels)
+        if "loop_idioms" in self.optimizations:
+            LoopIdioms().mark_loops(self.code, self.labels)
+
+    def instruction_counts(self, counts: list) -> list:
+        """
+            Returns number of executions of every instruction of `instructions`,
+            given number of executions of every instruction of `code`
+        """
+        if self.origins is None:
+            return list(counts)
+        result = [0] * len(self.instructions)
+        for origins, count in zip(self.origins, counts):
+            for idx in origins:
+                result[idx] += count
+        return result
+
+    SOURCE_FORMATS = ("xml", "ippcode23")
+
+    @property
+    def fingerprint(self) -> str:
+        """
+            SHA-1 of instructions (orders, opcodes and operands), identifies the program in coverage files.
+            Lazily loaded operands are not decoded (the program may have already ended), they are
+            parsed aside, and if they are invalid, their raw XML text is hashed instead.
+        """
+        text = "\n".join(f"{i.order} {i.opcode} {' '.join(self._operand_texts(i))}"
+                         for i in self.instructions)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _operand_texts(instruction: Instruction) -> list:
+        if instruction.operands is not None:
+            return [operand_text(o) for o in instruction.operands]
+        try:
+            return [operand_text(o) for o in instruction._parse(instruction._elements)]
+        except Exceptions._Exception:
+            return [f"{child.get('type')}@{child.text or ''}"
+                    for child in sorted(instruction._elements, key=lambda child: child.tag)]
+
+    @classmethod
+    def load(cls, source, optimizations=OPTIMIZATIONS, source_format="xml", lazy=False) -> 'Program':
+        """
+            Loads program from XML string, path or file object.
+
+            Params:
+                source_format: "xml" or "ippcode23" (source code itself, see `SourceParser`)
+                lazy: operands of XML instructions are decoded on their first execution
+
+            Raise:
+                OptionError: source file does not exist
+                XMLFormatError: source is not valid XML
+                XMLUnexpectedError: XML is not valid program
+                HeaderError, OpcodeError, SourceSyntaxError: source is not valid IPPcode23
+
+            Return:
+                Instance of `Program`
+        """
+        start = time.perf_counter()
+        if source_format == "ippcode23":
+            program = cls(SourceParser().parse(cls.read_source(source)), optimizations)
+        elif source_format == "xml":
+            program = cls(cls._load_xml(source, lazy), optimizations)
+        else:
+            raise Exceptions.OptionError(f"Unknown source format {source_format}")
+        program.load_time = time.perf_counter() - start
+        return program
+
+    @staticmethod
+    def _load_xml(source, lazy=False) -> list:
+        """
+            Loads instructions from XML string, path or file object
+        """
+        try:
+            if isinstance(source, (bytes, bytearray)) or (
+                    isinstance(source, str) and source.lstrip().startswith("<")):
+                root = XML.fromstring(source)
+            else:
+                root = XML.parse(source).getroot()
+        except FileNotFoundError:
+            raise Exceptions.OptionError(
+                f"{source}: No such file or directory")
+        except XML.ParseError:
+            raise Exceptions.XMLFormatError("Invalid XML format")
 
-        for idx, i in enumerate(instructions):
-            if i.opcode == "LABEL":
-                label, = i.operands
-                if labels.get(label.value) is None:
-                    labels[label.value] = idx
-                else:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is already defined")
+        # TODO validate <?xml version="1.0" encoding="UTF-8"?>
+        if root.tag != "program":
+            raise Exceptions.XMLUnexpectedError("Expected <program> element")
 
-        idx = 0
+        IManager = InstructionManager()
 
-        while idx < len(instructions):
-            instruction = instructions[idx]
+        for child in root:
+            IManager.insert(Parser.Instruction(child).parse(lazy))
+
+        instructions = IManager.instructions()
+
+        # dublicate order check
+        orders = list(map(lambda i: i.order, instructions))
+        if len(orders) != len(set(orders)):
+            raise Exceptions.XMLUnexpectedError("Duplicate order")
+
+        return instructions
+
+    @staticmethod
+    def read_source(source) -> str:
+        """
+            Reads source code from string (containing new line), bytes, path or file object.
+
+            Raise:
+                OptionError: source file does not exist
+        """
+        if isinstance(source, (bytes, bytearray)):
+            return source.decode("utf-8")
+        if isinstance(source, str):
+            if "\n" in source:
+                return source
+            try:
+                with open(source, "r", encoding="utf-8") as file:
+                    return file.read()
+            except FileNotFoundError:
+                raise Exceptions.OptionError(
+                    f"{source}: No such file or directory")
+        return source.read()
+
+    def interpreter(self, input=None, stdout=None, stderr=None,
+                    recorder: FlightRecorder = None, memory: 'MemoryProfiler' = None) -> Interpreter:
+        """
+            Creates new `Interpreter` (state of one run) for this program.
+
+            Params:
+                input: None, string or iterable of lines that READ reads
+                recorder: instance of `FlightRecorder`, new one is created if not given
+                memory: instance of `MemoryProfiler`, that profiles memory of the run
+        """
+        return Interpreter(self.code, self.labels,
+                           read_input_lines(input), stdout, stderr, recorder, self.stack(), memory)
+
+    def stack(self) -> StackManager:
+        """
+            Creates data stack for a new run (`TypedStackManager` if "typed_stack" optimization is on)
+        """
+        if "typed_stack" in self.optimizations:
+            return TypedStackManager()
+        return StackManager()
+
+    def run(self, input=None, stdout=None, stderr=None, metrics: Metrics = None,
+            recorder: FlightRecorder = None, profiler: SamplingProfiler = None,
+            memory: 'MemoryProfiler' = None) -> Result:
+        """
+            Runs program. Never exits the process.
+
+            Params:
+                input: None, string or iterable of lines that READ reads
+                stdout: writer for WRITE, output is captured into `Result.stdout` if not given
+                stderr: writer for DPRINT and BREAK, defaults to sys.stderr
+                metrics: instance of `Metrics`, that measures this run
+                recorder: instance of `FlightRecorder`, that records the last executed instructions
+                profiler: instance of `SamplingProfiler`, that samples this run
+                memory: instance of `MemoryProfiler`, that profiles memory of this run
+
+            Return:
+                Instance of `Result`
+        """
+        output = io.StringIO() if stdout is None else stdout
+        interpreter = self.interpreter(input, output, stderr, recorder, memory)
+        if metrics is not None:
+            metrics.attach(self, interpreter)
+        if profiler is not None:
+            profiler.attach(self, interpreter)
+        if memory is not None:
+            memory.attach(self, interpreter)
+        code, error = 0, None
+        try:
+            interpreter.run()
+        except Exceptions.ProgramExit as e:
+            code = e.code
+        except Exceptions._Exception as e:
+            code, error = e.code, e
+        finally:
+            if metrics is not None:
+                metrics.stop()
+            if profiler is not None:
+                profiler.stop()
+            if memory is not None:
+                memory.stop()
+        return Result(code, output.getvalue() if stdout is None else None, error,
+                      self.instruction_counts(interpreter.counts))
+
+    async def run_async(self, input=None, stdout=None, stderr=None, slice_size=1000) -> Result:
+        """
+            Runs program in slices of `slice_size` instructions and yields to the event loop
+            between them. Never exits the process.
 
-            if instruction.opcode == "CREATEFRAME":
-                FManager.create_frame()
-            elif instruction.opcode == "PUSHFRAME":
-                FManager.push_frame()
-            elif instruction.opcode == "POPFRAME":
-                FManager.pop_frame()
-            elif instruction.opcode == "DEFVAR":
-                var, = instruction.operands
-                FManager.set_var(var)
-            elif instruction.opcode == "WRITE":
-                symb, = instruction.operands
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                    if symb.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                _write(symb)
-            elif instruction.opcode == "DPRINT":
-                symb, = instruction.operands
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                _write(symb, file=sys.stderr)
-            elif instruction.opcode == "BREAK":
-                print(instruction.order, end="", file=sys.stderr)
-                print(FManager, end="", file=sys.stderr)
-                print(SManager, end="", file=sys.stderr)
-                print(CStack, end="", file=sys.stderr)
-            elif instruction.opcode == "READ":
-                var, _type = instruction.operands
-                
+            Params:
+                input: async iterable of lines (like `asyncio.StreamReader`), or anything `run()` accepts
+                stdout: async sink for WRITE (see `AsyncOutput`), output is captured into `Result.stdout` if not given
+                stderr: writer for DPRINT and BREAK, defaults to sys.stderr
+                slice_size: number of instructions executed between yields
+
+            Return:
+                Instance of `Result`
+        """
+        if hasattr(input, "__aiter__"):
+            lines = AsyncInput(input)
+        else:
+            lines = read_input_lines(input)
+        output = AsyncOutput(stdout)
+        interpreter = Interpreter(self.code, self.labels, lines,
+                                  output if stdout is not None else output.buffer, stderr,
+                                  stack=self.stack())
+        code, error = 0, None
+        try:
+            running = True
+            while running:
                 try:
-                    var = FManager.get_var(var)
-                    value = next(input)
-                    if _type.is_int():
-                        int(value)
-                        
-                    var.set_symb(Types.Symb(value, _type))
-                except (ValueError, StopIteration):
-                    var.set_symb(Types.Symb.Nil(None))
-            elif instruction.opcode == "MOVE":
-                var, symb = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                    if symb.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                var.set_symb(symb)
-            elif instruction.opcode == "ADD":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb2.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-
-                var.set_symb(symb1 + symb2)
-            elif instruction.opcode == "SUB":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb2.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-
-                var.set_symb(symb1 - symb2)
-            elif instruction.opcode == "MUL":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb2.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-
-                var.set_symb(symb1 * symb2)
-            elif instruction.opcode == "IDIV":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb2.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-
-                var.set_symb(symb1 // symb2)
-            elif instruction.opcode == "DIV":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb2.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-
-                var.set_symb(symb1 / symb2)
-            elif instruction.opcode == "EXIT":
-                symb, = instruction.operands
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                    if symb.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if not symb.type.is_int():
-                    raise Exceptions.TypeError(
-                        "EXIT accepts only integer")
-                if symb.value < 0 or symb.value > 49:
-                    raise Exceptions.OperandValueError(
-                        "EXIT code must be in interval <0, 49>")
-                exit(symb.value)
-            elif instruction.opcode == "TYPE":
-                var, symb = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                if symb.type.is_undef():
-                    var.set_symb(Types.Symb.Nil(None))
+                    running = interpreter.run_slice(slice_size)
+                except AsyncInput.Pending:
+                    # READ will be executed again, when the line is fetched
+                    interpreter.retry()
+                    await lines.fetch()
+                if stdout is not None:
+                    await output.flush()
+                await asyncio.sleep(0)
+        except Exceptions.ProgramExit as e:
+            code = e.code
+        except Exceptions._Exception as e:
+            code, error = e.code, e
+        if stdout is not None:
+            await output.flush()
+            return Result(code, None, error, self.instruction_counts(interpreter.counts))
+        return Result(code, output.buffer.getvalue(), error,
+                      self.instruction_counts(interpreter.counts))
+
+
+class Scheduler():
+    """
+        Class that runs many programs interleaved in one process (green threads).
+        Every task has its own `Interpreter` (frames, data stack, call stack and index),
+        its own input and output buffer, and runs in round-robin slices.
+
+        Methods:
+            spawn(program, input, name, quota): Adds new task
+            run(): Runs all the tasks until they finish and returns their results
+    """
+
+    class Task():
+        """
+            Class that represents one program run inside of the scheduler
+        """
+
+        def __init__(self, name, program: 'Program', interpreter: Interpreter, stdout: io.StringIO,
+                     quota: int = None):
+            self.name = name
+            self.program = program
+            self.interpreter = interpreter
+            self.stdout = stdout
+            self.quota = quota
+            self.result = None
+
+        def __repr__(self):
+            return f"Task({self.name}, steps={self.interpreter.steps}, result={self.result})"
+
+    def __init__(self, slice_size=1000):
+        self.slice_size = slice_size
+        self.results = {}
+        self._ready = collections.deque()
+        self._spawned = 0
+
+    def spawn(self, program: Program, input=None, name=None, quota: int = None, stderr=None) -> 'Scheduler.Task':
+        """
+            Adds new task.
+
+            Params:
+                program: instance of `Program`
+                input: None, string or iterable of lines that READ reads
+                name: key of the result in `results`, defaults to the number of the task
+                quota: maximal number of instructions the task can execute
+
+            Return:
+                Instance of `Scheduler.Task`
+        """
+        if name is None:
+            name = self._spawned
+        self._spawned += 1
+        stdout = io.StringIO()
+        task = Scheduler.Task(name, program, program.interpreter(input, stdout, stderr), stdout, quota)
+        self._ready.append(task)
+        return task
+
+    def run(self) -> dict:
+        """
+            Runs all the tasks until they finish.
+
+            Return:
+                Dictionary of task names and their instances of `Result`
+        """
+        while self._ready:
+            task = self._ready.popleft()
+            interpreter = task.interpreter
+            count = self.slice_size
+            if task.quota is not None:
+                count = min(count, task.quota - interpreter.steps)
+
+            code, error = 0, None
+            try:
+                if interpreter.run_slice(count):
+                    if task.quota is None or interpreter.steps < task.quota:
+                        self._ready.append(task)
+                        continue
+                    raise Exceptions.QuotaError(
+                        f"Task {task.name} exceeded quota of {task.quota} instructions")
+            except Exceptions.ProgramExit as e:
+                code = e.code
+            except Exceptions._Exception as e:
+                code, error = e.code, e
+
+            task.result = Result(code, task.stdout.getvalue(), error,
+                                 task.program.instruction_counts(interpreter.counts))
+            self.results[task.name] = task.result
+        return self.results
+
+
+class Zygote():
+    """
+        Class that runs a program until its first READ only once, and then forks a child process
+        from that state for every input. Everything before the first READ doesn't depend on input,
+        so children skip loading of the program and its initialization. Output of the initialization
+        is written at the beginning of output of every child.
+
+        Needs `os.fork()` (POSIX), the process must not have any other threads.
+
+        Methods:
+            warm(): Runs program until its first READ
+            fork(input, output): Forks child, that runs the rest of the program with input from file
+            serve(inputs, directory, report): Runs the rest of the program for every input file
+
+        Attributes:
+            code, error: exit code and error of the program, if it ended before any READ
+    """
+
+    class Blocked(Exception):
+        pass
+
+    def __init__(self, program: Program, recorder: FlightRecorder = None, stderr=None):
+        self.program = program
+        self.stderr = sys.stderr if stderr is None else stderr
+        self.prefix = io.StringIO()
+        self.interpreter = program.interpreter(self._gate(), self.prefix, stderr, recorder)
+        self.code = None
+        self.error = None
+
+    @staticmethod
+    def _gate():
+        """
+            Input of the initialization, READ stops the program before it takes a line
+        """
+        raise Zygote.Blocked()
+        yield
+
+    def warm(self) -> bool:
+        """
+            Runs program until its first READ. Objects created so far are excluded from garbage
+            collection, so children don't copy memory pages just by collecting them.
+
+            Return:
+                False if program ended before any READ (see `code` and `error`), otherwise - True
+        """
+        try:
+            self.interpreter.run()
+            self.code = 0
+        except Zygote.Blocked:
+            self.interpreter.retry()
+        except Exceptions.ProgramExit as e:
+            self.code = e.code
+        except Exceptions._Exception as e:
+            self.code, self.error = e.code, e
+        gc.freeze()
+        return self.code is None
+
+    def fork(self, input: str, output: str) -> int:
+        """
+            Forks child, that runs the rest of the program with input from file `input`
+            and writes its output into file `output`. Child exits with exit code of the program.
+
+            Return:
+                pid of the child
+        """
+        sys.stdout.flush()
+        self.stderr.flush()
+        pid = os.fork()
+        if pid != 0:
+            return pid
+
+        code = Exceptions.CodeTypes.ERR_INTERNAL.value
+        try:
+            with open(output, "w") as file:
+                code = self._finish(input, file)
+        except OSError as e:
+            print(e, file=self.stderr)
+            code = Exceptions.CodeTypes.ERR_OUTPUT.value
+        except Exception:
+            sys.excepthook(*sys.exc_info())
+        finally:
+            self.stderr.flush()
+            os._exit(code)
+
+    def _finish(self, input: str, output) -> int:
+        """
+            Runs the rest of the program (inside of the child)
+
+            Return:
+                exit code of the program
+        """
+        interpreter = self.interpreter
+        output.write(self.prefix.getvalue())
+        code, error = self.code, self.error
+        if code is None:
+            interpreter.input = read_input_generator(input)
+            interpreter.stdout = output
+            code = 0
+            try:
+                interpreter.run()
+            except Exceptions.ProgramExit as e:
+                code = e.code
+            except Exceptions._Exception as e:
+                code, error = e.code, e
+        if error is not None:
+            print(error, file=self.stderr)
+            interpreter.recorder.dump(self.stderr)
+        return code
+
+    def serve(self, inputs, directory: str, report=sys.stdout):
+        """
+            Runs the rest of the program for every input file in its own child, one after another.
+            Output of input `<name>.in` is written into `directory/<name>.out` and its exit code
+            into `directory/<name>.rc`. Line `<exit code>\t<input>` is written into report
+            as soon as the child ends.
+
+            Params:
+                inputs: iterable of paths of input files (can be read while serving, like stdin)
+
+            Raise:
+                OptionError: directory can't be created or written into
+        """
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for input in inputs:
+                name = os.path.splitext(os.path.basename(input))[0]
+                if not os.path.isfile(input):
+                    print(f"Input file {input} does not exist", file=self.stderr)
+                    code = Exceptions.CodeTypes.ERR_INPUT.value
                 else:
-                    var.set_symb(Types.Symb.String(str(symb.type)))
-            elif instruction.opcode == "LT":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                var.set_symb(symb1 < symb2)
-
-            elif instruction.opcode == "GT":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                var.set_symb(symb1 > symb2)
-
-            elif instruction.opcode == "EQ":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                var.set_symb(symb1 == symb2)
-
-            elif instruction.opcode == "AND":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb2.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                var.set_symb(symb1 & symb2)
-
-            elif instruction.opcode == "OR":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb2.type.is_nil():
-                        raise Exceptions.ValueUndefinedError("Missing value")
-                var.set_symb(symb1 | symb2)
-
-            elif instruction.opcode == "NOT":
-                var, symb1 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb1.type.is_nil():
-                        raise Exceptions.TypeError("Missing value")
-                var.set_symb(~symb1)
-
-            elif instruction.opcode == "INT2CHAR":
-                var, symb = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                    if symb.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if not symb.type.is_int():
-                    raise Exceptions.TypeError(
-                        "Invalid type in INT2CHAR")
-                try:
-                    var.set_symb(Types.Symb.String(chr(symb.value)))
-                except ValueError as e:
-                    raise Exceptions.StringOperationError(e)
-            elif instruction.opcode == "STRI2INT":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-
-                var.set_symb(Types.Symb.Int(ord(symb1[symb2].value)))
-
-            elif instruction.opcode == "INT2FLOAT":
-                var, symb = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                    if symb.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb.type.is_nil():
-                        raise Exceptions.ValueUndefinedError(
-                            "Cannot convert NIL to FLOAT")
-                if not symb.type.is_int():
-                    raise Exceptions.TypeError(
-                        "Invalid type in convert")
-
-                var.set_symb(Types.Symb.Float(symb.value))
-            elif instruction.opcode == "FLOAT2INT":
-                var, symb = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                    if symb.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                    if symb.type.is_nil():
-                        raise Exceptions.ValueUndefinedError(
-                            "Cannot convert NIL to INT")
-                if not symb.type.is_float():
-                    raise Exceptions.TypeError(
-                        "Invalid type in convert")
+                    pid = self.fork(input, os.path.join(directory, f"{name}.out"))
+                    code = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+                    if code < 0:
+                        # child was killed by a signal
+                        code = Exceptions.CodeTypes.ERR_INTERNAL.value
+                with open(os.path.join(directory, f"{name}.rc"), "w") as file:
+                    file.write(str(code))
+                print(f"{code}\t{input}", file=report, flush=True)
+        except OSError as e:
+            raise Exceptions.OptionError(f"{directory}: {e}")
+
+
+class Coverage():
+    """
+        Class that represents instruction coverage of one or more programs. For every program
+        (identified by `Program.fingerprint`) it keeps its instructions and the number
+        of executions of every instruction, summed over all merged runs.
 
-                var.set_symb(Types.Symb.Int(int(symb.value)))
-            elif instruction.opcode == "LABEL":
-                pass
-            elif instruction.opcode == "CALL":
-                label, = instruction.operands
-                jump_to = labels.get(label.value)
-                if jump_to is None:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is undefined")
-                CStack.push(idx)
-                idx = jump_to
-            elif instruction.opcode == "RETURN":
-                jump_to = CStack.pop()
-                if jump_to is None:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is undefined")
-                idx = jump_to
-            elif instruction.opcode == "JUMP":
-                label, = instruction.operands
-                jump_to = labels.get(label.value)
-                if jump_to is None:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is undefined")
-                idx = jump_to
-            elif instruction.opcode == "JUMPIFEQ":
-                label, symb1, symb2 = instruction.operands
+        Methods:
+            add(program, counts): Adds one run of a program
+            merge(other): Adds all runs of other coverage
+            regions(fingerprint): Returns coverage of label regions of a program
+            report(): Returns coverage report as text
+            save(path): Writes coverage as JSON
 
-                jump_to = labels.get(label.value)
-                if jump_to is None:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is undefined")
-
-                if not symb1.type.is_nil and not symb2.type.is_nil():
-                    if symb1.type != symb2.type:
-                        raise Exceptions.TypeError(
-                            "Incompatible types in JUMPIFEQ")
-
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-
-                if bool(symb1 == symb2):
-                    idx = jump_to
-
-            elif instruction.opcode == "JUMPIFNEQ":
-                label, symb1, symb2 = instruction.operands
-                jump_to = labels.get(label.value)
-                if jump_to is None:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is undefined")
-
-                if not symb1.type.is_nil() and not symb2.type.is_nil():
-                    if symb1.type != symb2.type:
-                        raise Exceptions.TypeError(
-                            "Incompatible types in JUMPIFNEQ")
-
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-
-                if bool(symb1 != symb2):
-                    idx = jump_to
-            elif instruction.opcode == "JUMPIFEQS":
-                label, = instruction.operands
-
-                jump_to = labels.get(label.value)
-                if jump_to is None:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is undefined")
+        Classmethods:
+            load(path): Loads coverage from JSON file
+    """
 
-                symb1, symb2 = SManager.get_symb_symb()
+    def __init__(self):
+        self.programs = {}
 
-                if not symb1.type.is_nil() and not symb2.type.is_nil():
-                    if symb1.type != symb2.type:
-                        raise Exceptions.TypeError(
-                            "Incompatible types in JUMPIFEQS")
+    def add(self, program: 'Program', counts: list):
+        """
+            Adds one run of a program
 
-                if bool(symb1 == symb2):
-                    idx = jump_to
-            elif instruction.opcode == "JUMPIFNEQS":
-                label, = instruction.operands
-                jump_to = labels.get(label.value)
-                if jump_to is None:
-                    raise Exceptions.SemanticError(
-                        f"Label {label.value} is undefined")
-
-                symb1, symb2 = SManager.get_symb_symb()
-
-                if not symb1.type.is_nil() and not symb2.type.is_nil():
-                    if symb1.type != symb2.type:
-                        raise Exceptions.TypeError(
-                            "Incompatible types in JUMPIFNEQ")
-
-                if bool(symb1 != symb2):
-                    idx = jump_to
-            elif instruction.opcode == "PUSHS":
-                symb, = instruction.operands
-                if isinstance(symb, Types.Var):
-                    symb = FManager.get_var(symb)
-                    if symb.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                SManager.push(symb)
-            elif instruction.opcode == "POPS":
-                var, = instruction.operands
-                var = FManager.get_var(var)
-                var.set_symb(SManager.pop())
-            elif instruction.opcode == "CLEARS":
-                SManager.clear()
-            elif instruction.opcode == "ADDS":
-                SManager.add()
-            elif instruction.opcode == "SUBS":
-                SManager.sub()
-            elif instruction.opcode == "MULS":
-                SManager.mul()
-            elif instruction.opcode == "DIVS":
-                SManager.div()
-            elif instruction.opcode == "IDIVS":
-                SManager.idiv()
-            elif instruction.opcode == "LTS":
-                SManager.lt()
-            elif instruction.opcode == "GTS":
-                SManager.gt()
-            elif instruction.opcode == "EQS":
-                SManager.eq()
-            elif instruction.opcode == "ANDS":
-                SManager.ands()
-            elif instruction.opcode == "ORS":
-                SManager.ors()
-            elif instruction.opcode == "NOTS":
-                SManager.nots()
-            elif instruction.opcode == "INT2CHARS":
-                SManager.int2char()
-            elif instruction.opcode == "STRI2INTS":
-                SManager.stri2int()
-            elif instruction.opcode == "FLOAT2INTS":
-                SManager.float2int()
-            elif instruction.opcode == "INT2FLOATS":
-                SManager.int2float()
-            elif instruction.opcode == "CONCAT":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if not symb1.type.is_string() or not symb2.type.is_string():
-                    raise Exceptions.TypeError(
-                        "Both operands must be of type string in CONCAT")
-                var.set_symb(Types.Symb.String(symb1.value + symb2.value))
-            elif instruction.opcode == "STRLEN":
-                var, symb1 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if not symb1.type.is_string():
-                    raise Exceptions.TypeError(
-                        "Operand must be of type string in STRLEN")
-                var.set_symb(Types.Symb.Int(len(symb1.value or "")))
-            elif instruction.opcode == "GETCHAR":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if not symb1.type.is_string():
-                    raise Exceptions.TypeError(
-                        "Second operand in GETCHAR must be string")
-                if not symb2.type.is_int():
-                    raise Exceptions.TypeError(
-                        "Third operand in GETCHAR must be integer")
-                if symb2.value < 0:
-                    raise Exceptions.StringOperationError(
-                        "Second operand in GETCHAR must be >= 0")
-                var.set_symb(Types.Symb.String(symb1[symb2]))
-            elif instruction.opcode == "SETCHAR":
-                var, symb1, symb2 = instruction.operands
-                var = FManager.get_var(var)
-                if var.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb1, Types.Var):
-                    symb1 = FManager.get_var(symb1)
-                    if symb1.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if isinstance(symb2, Types.Var):
-                    symb2 = FManager.get_var(symb2)
-                    if symb2.type.is_undef():
-                        raise Exceptions.ValueUndefinedError(
-                            "Var's value is undefined")
-                if not var.type.is_string():
-                    raise Exceptions.TypeError(
-                        "First operand in SETCHAR must be string")
-                if not symb1.type.is_int():
-                    raise Exceptions.TypeError(
-                        "Second operand in SETCHAR must be integer")
-                if symb1.value < 0:
-                    raise Exceptions.StringOperationError(
-                        "Second operand in SETCHAR must be >= 0")
-                if not symb2.type.is_string():
-                    raise Exceptions.TypeError(
-                        "Third operand in SETCHAR must be string")
-                try:
-                    val1 = deescape_str(var.value)
-                    val2 = deescape_str(symb2.value)
-                    listValue = list(val1)
-                    listValue[symb1.value] = val2[0]
-                    var.set_symb(Types.Symb.String("".join(listValue)))
-                except IndexError as e:
-                    raise Exceptions.StringOperationError(e)
-            idx += 1
+            Params:
+                counts: number of executions of every instruction (see `Result.counts`)
+        """
+        self.merge_program({
+            "fingerprint": program.fingerprint,
+            "runs": 1,
+            "instructions": [[i.order, i.opcode, i.decode()[0].value if i.opcode == "LABEL" else None]
+                             for i in program.instructions],
+            "counts": list(counts),
+        })
+
+    def merge_program(self, entry: dict):
+        """
+            Adds runs of one program (entry of coverage file)
+        """
+        current = self.programs.get(entry["fingerprint"])
+        if current is None:
+            self.programs[entry["fingerprint"]] = {
+                **entry, "counts": list(entry["counts"])}
+            return
+        current["runs"] += entry["runs"]
+        current["counts"] = [a + b for a, b in zip(current["counts"], entry["counts"])]
+
+    def merge(self, other: 'Coverage'):
+        """
+            Adds all runs of other coverage
+        """
+        for entry in other.programs.values():
+            self.merge_program(entry)
+
+    def regions(self, fingerprint: str) -> list:
+        """
+            Returns coverage of label regions of a program. Region starts at a label
+            (or at the beginning of the program) and ends before the next label.
+            Labels themselves are not included.
+
+            Return:
+                list of (label, [(order, opcode, count), ...])
+        """
+        entry = self.programs[fingerprint]
+        regions = [("<main>", [])]
+        for (order, opcode, label), count in zip(entry["instructions"], entry["counts"]):
+            # jumps continue after the label, so labels themselves are never counted
+            if opcode == "LABEL":
+                regions.append((label, []))
+            else:
+                regions[-1][1].append((order, opcode, count))
+        return [region for idx, region in enumerate(regions) if idx or region[1]]
+
+    def report(self) -> str:
+        """
+            Returns coverage report as text
+        """
+        lines = []
+        for fingerprint, entry in self.programs.items():
+            lines.append(f"Program {fingerprint[:12]} ({entry['runs']} runs)")
+            lines.append(f"  {'region':<24} {'covered':>9} {'%':>6} {'hits':>10}")
+            missed = []
+            for label, instructions in self.regions(fingerprint):
+                covered = sum(1 for _, _, count in instructions if count)
+                hits = sum(count for _, _, count in instructions)
+                percent = 100 * covered / len(instructions) if instructions else 100
+                lines.append(f"  {label:<24} {f'{covered}/{len(instructions)}':>9} "
+                             f"{percent:>5.1f}% {hits:>10}")
+                missed += [f"{order} ({opcode})" for order, opcode, count in instructions if not count]
+            if missed:
+                lines.append(f"  never executed: {', '.join(missed)}")
+        return "\n".join(lines)
+
+    def save(self, path: str):
+        """
+            Writes coverage as JSON
+        """
+        with open(path, "w") as file:
+            json.dump({"programs": list(self.programs.values())}, file, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> 'Coverage':
+        """
+            Loads coverage from JSON file
+
+            Raise:
+                OptionError: file does not exist or is not valid coverage
+        """
+        coverage = cls()
+        try:
+            with open(path, "r") as file:
+                data = json.load(file)
+            for entry in data["programs"]:
+                coverage.merge_program(entry)
+        except FileNotFoundError:
+            raise Exceptions.OptionError(f"{path}: No such file or directory")
+        except (ValueError, KeyError, TypeError):
+            raise Exceptions.OptionError(f"{path}: Invalid coverage file")
+        return coverage
+
+
+class Compiler():
+    """
+        Class that translates program ahead of time into Python module. Every basic block
+        becomes a branch of one function, GF variables become its local variables and
+        the most common instructions are written as plain Python. Everything else (frames,
+        stacks, READ and the rest of the instructions) is run by handlers of `Interpreter`,
+        so the module imports interpret.py and behaves exactly like it.
+
+        Compiled module runs the same `code` as `Program` with the same optimizations,
+        but it does not count executed instructions and has no flight recorder.
+
+        Methods:
+            compile(): Returns source code of the module
+            write(path): Writes module into path and compiles it into .pyc
+
+        Raise:
+            XMLUnexpectedError, TypeError: invalid operand of lazily loaded program
+    """
+
+    # instructions, that are written as plain Python, when they are not unchecked
+    OPERATORS = {"ADD": "+", "SUB": "-", "MUL": "*", "IDIV": "//", "DIV": "/",
+                 "AND": "&", "OR": "|", "LT": "<", "GT": ">", "EQ": "=="}
+    # optimizations that change `code`, the module contains already changed code
+    REWRITES = ("inlining", "dead_stores")
+
+    def __init__(self, program: 'Program'):
+        program.validate()
+        self.optimizations = tuple(o for o in Program.OPTIMIZATIONS
+                                   if o in program.optimizations and o not in self.REWRITES)
+        # the same program the module creates, so flags of instructions are the same
+        self.program = Program([Instruction(i.opcode, i.order, i.operands, parsed=True)
+                                for i in program.code], self.optimizations)
+        self.code = self.program.code
+        self.labels = self.program.labels
+        self.locals = {}  # names of GF variables and operands bound to local variables
+
+        starts = {0} if self.code else set()
+        for idx, instruction in enumerate(self.code):
+            if instruction.opcode == "LABEL":
+                # jumps continue after the label, LABEL of counted loop is executed only without jump
+                starts.update((idx, idx + 1))
+                if instruction.loop is not None:
+                    starts.add(instruction.loop.end + 1)
+            elif instruction.opcode in ControlFlowGraph.ENDS:
+                starts.add(idx + 1)
+        self.starts = sorted(start for start in starts if start < len(self.code))
+        self.block_at = {start: number for number, start in enumerate(self.starts)}
+        self.end = len(self.starts)
+
+    def compile(self) -> str:
+        """
+            Returns source code of the module
+        """
+        blocks = [self._block(number) for number in range(self.end)]
+        lines = [
+            f'"""Program compiled by interpret.py, run it with `python -m <module> [--input=FILE]`"""',
+            "",
+            "import getopt",
+            "import io",
+            "import os",
+            "import sys",
+            "",
+            "# interpret.py is looked up next to the module first, then on the usual import path",
+            "sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))",
+            "try:",
+            "    from interpret import (Exceptions, FrameTypes, Instruction, Program, Result, Types,",
+            "                           _write, deescape_str, read_input_generator)",
+            "except ImportError:",
+            "    print(\"interpret.py can't be imported, put it next to the module or on PYTHONPATH\", file=sys.stderr)",
+            "    sys.exit(99)",
+            "",
+            "I = [",
+        ]
+        lines += [f"    Instruction({i.opcode!r}, {i.order}, [{', '.join(self._operand(o) for o in i.operands)}], "
+                  f"parsed=True)," for i in self.code]
+        lines += [
+            "]",
+            f"PROGRAM = Program(I, {self.optimizations!r})",
+            f"RETURNS = {{{', '.join(f'{idx}: {self._after(idx)}' for idx, i in enumerate(self.code) if i.opcode == 'CALL')}}}",
+            "",
+            "",
+            "def _var(var, name):",
+            "    if var is None:",
+            "        raise Exceptions.VariableUndefinedError(f\"Variable '{name}' is not defined at {FrameTypes.GF}\")",
+            "    return var",
+            "",
+            "",
+            "def _symb(var, name):",
+            "    if _var(var, name).type.is_undef():",
+            "        raise Exceptions.ValueUndefinedError(\"Var's value is undefined\")",
+            "    return var",
+            "",
+            "",
+            "def _value(var, name):",
+            "    if _symb(var, name).type.is_nil():",
+            "        raise Exceptions.ValueUndefinedError(\"Missing value\")",
+            "    return var",
+            "",
+            "",
+            "def execute(M):",
+            "    I = PROGRAM.code",
+            "    h = M._handlers",
+            "    calls = M.CStack",
+            "    out = M.stdout",
+            "    push = M.SManager.push",
+            "    gf = M.FManager._gframe.get_var",
+            "    var, unchecked = M.FManager.get_var, M.FManager.get_var_unchecked",
+            "    symb, value = M._symb, M._value",
+            "    BOOL, INT, STRING = Types.Type.Bool(), Types.Type.Int(), Types.Type.String()",
+        ]
+        for (k, j), name in self.locals.items():
+            if isinstance(k, str):
+                lines.append(f"    {name} = None  # GF@{k}")
+            else:
+                lines.append(f"    {name} = I[{k}].operands[{j}]")
+        lines += ["    block = 0", "    while True:"]
+        lines += self._tree(blocks, 0, self.end, "        ")
+        lines += [
+            "",
+            "",
+            "def run(input=None, stdout=None, stderr=None) -> Result:",
+            '    """',
+            "        Runs the program just like `Program.run()` (without counts of instructions)",
+            '    """',
+            "    output = io.StringIO() if stdout is None else stdout",
+            "    code, error = 0, None",
+            "    try:",
+            "        execute(PROGRAM.interpreter(input, output, stderr))",
+            "    except Exceptions.ProgramExit as e:",
+            "        code = e.code",
+            "    except Exceptions._Exception as e:",
+            "        code, error = e.code, e",
+            "    return Result(code, output.getvalue() if stdout is None else None, error)",
+            "",
+            "",
+            "def main():",
+            "    input = None",
+            "    try:",
+            '        opts, args = getopt.getopt(sys.argv[1:], "hi:", ["help", "input="])',
+            "    except getopt.GetoptError as err:",
+            "        Exceptions.exit(Exceptions.OptionError(err))",
+            "    for opt, arg in opts:",
+            '        if opt in ("-h", "--help"):',
+            "            print(__doc__)",
+            "            sys.exit(0)",
+            "        input = arg",
+            "    try:",
+            "        input = read_input_generator(input)",
+            "    except Exceptions.OptionError as e:",
+            "        Exceptions.exit(e)",
+            "    result = run(input, sys.stdout)",
+            "    if result.error is not None:",
+            "        Exceptions.exit(result.error)",
+            "    sys.exit(result.code)",
+            "",
+            "",
+            'if __name__ == "__main__":',
+            "    main()",
+            "",
+        ]
+        return "\n".join(lines)
+
+    def write(self, path: str):
+        """
+            Writes module into path and compiles it into .pyc (into __pycache__ next to it)
+
+            Raise:
+                OptionError: module can't be written
+        """
+        try:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(self.compile())
+            py_compile.compile(path, doraise=True)
+        except (OSError, py_compile.PyCompileError) as e:
+            raise Exceptions.OptionError(f"{path}: {e}")
+
+    @staticmethod
+    def _operand(operand) -> str:
+        """
+            Returns Python expression, that creates the operand
+        """
+        if isinstance(operand, Types.Var):
+            return f"Types.Var({operand.name!r}, {operand.scope.name!r})"
+        if isinstance(operand, Types.Symb):
+            value = operand.value
+            if isinstance(value, float):
+                return f"Types.Symb(float.fromhex({value.hex()!r}), {str(operand.type)!r})"
+            return f"Types.Symb({value!r}, {str(operand.type)!r})"
+        if isinstance(operand, Types.Type):
+            return f"Types.Type.to_type({str(operand)!r})"
+        return f"Types.Label({operand.value!r})"
+
+    def _after(self, idx: int) -> int:
+        """
+            Returns number of block, that starts after instruction at idx (end of the program if there is none)
+        """
+        return self.block_at.get(idx + 1, self.end)
+
+    def _local(self, k: int, j: int) -> str:
+        """
+            Returns local variable with operand j of instruction k, GF variables have one local variable
+        """
+        operand = self.code[k].operands[j]
+        if isinstance(operand, Types.Var) and operand.scope == FrameTypes.GF:
+            return self.locals.setdefault((operand.name, None), f"g{len(self.locals)}")
+        return self.locals.setdefault((k, j), f"c{k}_{j}")
+
+    def _is_gf(self, k: int, j: int) -> bool:
+        operand = self.code[k].operands[j]
+        return isinstance(operand, Types.Var) and operand.scope == FrameTypes.GF
+
+    def _var(self, k: int, j: int) -> str:
+        """
+            Returns expression of variable, like `FrameManager.get_var()`
+        """
+        if self._is_gf(k, j):
+            return f"_var({self._local(k, j)}, {self.code[k].operands[j].name!r})"
+        return f"var({self._local(k, j)})"
+
+    def _symb(self, k: int, j: int, function="symb") -> str:
+        """
+            Returns expression of symb, like `Interpreter._symb()` (or `_value()`)
+        """
+        operand = self.code[k].operands[j]
+        if not isinstance(operand, Types.Var):
+            return self._local(k, j)
+        if self._is_gf(k, j):
+            return f"_{function}({self._local(k, j)}, {operand.name!r})"
+        return f"{function}({self._local(k, j)})"
+
+    def _proven(self, k: int, j: int, lines: list) -> str:
+        """
+            Returns name of proven symb, like `Interpreter._proven()`. Variables of other
+            frames than GF are looked up into temporary local variable.
+        """
+        operand = self.code[k].operands[j]
+        if isinstance(operand, Types.Var) and not self._is_gf(k, j):
+            lines.append(f"s{j} = unchecked({self._local(k, j)})")
+            return f"s{j}"
+        return self._local(k, j)
+
+    def _value_of(self, k: int, j: int, name: str) -> str:
+        """
+            Returns expression of value of proven symb, int and bool constants are written as they are
+        """
+        operand = self.code[k].operands[j]
+        if not isinstance(operand, Types.Var) and (operand.type.is_int() or operand.type.is_bool()):
+            return repr(operand.value)
+        return f"{name}.value"
+
+    def _equal(self, k: int, j1: int, j2: int, lines: list) -> str:
+        """
+            Returns expression that compares proven symbs of the same type, like `Interpreter._equal_unchecked()`
+        """
+        symb1, symb2 = self._proven(k, j1, lines), self._proven(k, j2, lines)
+        value1, value2 = self._value_of(k, j1, symb1), self._value_of(k, j2, symb2)
+        strings = f"deescape_str(str({value1})) == deescape_str(str({value2}))"
+        constants = [o for o in (self.code[k].operands[j1], self.code[k].operands[j2])
+                     if not isinstance(o, Types.Var)]
+        if constants:
+            return f"({strings})" if constants[0].type.is_string() else f"{value1} == {value2}"
+        return f"(({strings}) if {symb1}.type.is_string() else {value1} == {value2})"
+
+    def _instruction(self, k: int) -> list:
+        """
+            Returns lines of instruction at index k, that doesn't end its block
+        """
+        instruction = self.code[k]
+        opcode = instruction.opcode
+        comment = " ".join([f"# {instruction.order}: {opcode}"] + [
+            operand_text(o).encode("unicode_escape").decode("ascii") for o in instruction.operands])
+        lines = [comment]
+
+        if instruction.unchecked and opcode in ("MOVE", "WRITE", "PUSHS", "ADD", "SUB", "MUL", "IDIV",
+                                                "DIV", "LT", "GT", "EQ", "AND", "OR", "NOT", "CONCAT",
+                                                "STRLEN"):
+            return lines + self._unchecked(k)
+        if opcode == "LABEL":
+            return lines
+        if opcode == "DEFVAR" and self._is_gf(k, 0):
+            return lines + [f"h[{k}](I[{k}])",
+                            f"{self._local(k, 0)} = gf({instruction.operands[0].name!r})"]
+        if opcode == "MOVE":
+            return lines + [f"{self._var(k, 0)}.set_symb({self._symb(k, 1)})"]
+        if opcode == "WRITE":
+            return lines + [f"M.bytes_written += _write({self._symb(k, 0)}, out)"]
+        if opcode == "PUSHS":
+            return lines + [f"push({self._symb(k, 0)}.copy())"]
+        if opcode in ("LT", "GT", "EQ"):
+            return lines + [f"{self._var(k, 0)}.set_symb("
+                            f"{self._symb(k, 1)} {self.OPERATORS[opcode]} {self._symb(k, 2)})"]
+        if opcode in self.OPERATORS:
+            return lines + [f"{self._var(k, 0)}.set_symb("
+                            f"{self._symb(k, 1, 'value')} {self.OPERATORS[opcode]} {self._symb(k, 2, 'value')})"]
+        if opcode == "CREATEFRAME":
+            lines.append(f"M.idx = {k}")
+        return lines + [f"h[{k}](I[{k}])"]
+
+    def _unchecked(self, k: int) -> list:
+        """
+            Returns lines of instruction with proven operands, like `_<opcode>_unchecked()` handlers
+        """
+        opcode = self.code[k].opcode
+        lines = []
+        if opcode in ("WRITE", "PUSHS"):
+            symb = self._proven(k, 0, lines)
+            if opcode == "WRITE":
+                return lines + [f"M.bytes_written += _write({symb}, out)"]
+            return lines + [f"push({symb}.copy())"]
+
+        var = self._proven(k, 0, lines)
+        if opcode == "EQ":
+            condition = self._equal(k, 1, 2, lines)
+            return lines + [f"{var}.value, {var}.type = {condition}, BOOL"]
+        symb1 = self._proven(k, 1, lines)
+        value1 = self._value_of(k, 1, symb1)
+        if opcode == "MOVE":
+            return lines + [f"{var}.set_symb({symb1})"]
+        if opcode == "NOT":
+            return lines + [f"{var}.value, {var}.type = not {value1}, BOOL"]
+        if opcode == "STRLEN":
+            return lines + [f"{var}.value, {var}.type = len({value1} or \"\"), INT"]
+
+        symb2 = self._proven(k, 2, lines)
+        value2 = self._value_of(k, 2, symb2)
+        operator = self.OPERATORS.get(opcode)
+        if opcode in ("LT", "GT"):
+            return lines + [
+                f"{var}.value, {var}.type = (deescape_str(str({value1})) {operator} deescape_str(str({value2}))"
+                f" if {symb1}.type.is_string() else {value1} {operator} {value2}), BOOL"]
+        if opcode in ("AND", "OR"):
+            return lines + [f"{var}.value, {var}.type = {value1} {opcode.lower()} {value2}, BOOL"]
+        if opcode == "CONCAT":
+            return lines + [f"{var}.value, {var}.type = {value1} + {value2}, STRING"]
+        if opcode in ("IDIV", "DIV"):
+            lines += [f"if {value2} == 0:",
+                      "    raise Exceptions.OperandValueError(\"0 division is not allowed\")"]
+        lines.append(f"{var}.type = {symb1}.type")
+        if opcode == "DIV":
+            return lines + [f"{var}.value = int({value1} / {value2}) if {symb1}.type.is_int() "
+                            f"else {value1} / {value2}"]
+        return lines + [f"{var}.value = {value1} {operator} {value2}"]
+
+    def _target(self, k: int):
+        """
+            Returns number of block the jump at index k jumps to, None if its label is undefined
+        """
+        label = self.code[k].operands[0].value
+        jump_to = self.labels.get(label)
+        return None if jump_to is None else self._after(jump_to)
+
+    def _block(self, number: int) -> list:
+        """
+            Returns lines of block, that set number of the next block into `block`
+        """
+        start = self.starts[number]
+        end = self.starts[number + 1] if number + 1 < self.end else len(self.code)
+        following = f"block = {number + 1}"
+
+        first = self.code[start]
+        if first.opcode == "LABEL" and first.loop is not None:
+            return [f"# {first.order}: LABEL {first.operands[0].value} (counted loop)",
+                    f"M.idx = {start}", f"h[{start}](I[{start}])",
+                    f"block = {self._after(first.loop.end)} if M.idx != {start} else {number + 1}"]
+
+        lines = []
+        for k in range(start, end - 1):
+            lines += self._instruction(k)
+        k = end - 1
+        instruction = self.code[k]
+        opcode = instruction.opcode
+        if opcode not in ControlFlowGraph.ENDS:
+            return lines + self._instruction(k) + [following]
+
+        lines.append(" ".join([f"# {instruction.order}: {opcode}"] + [
+            operand_text(o).encode("unicode_escape").decode("ascii") for o in instruction.operands]))
+        if opcode == "RETURN":
+            return lines + ["block = RETURNS[calls.pop()]"]
+        if opcode == "EXIT":
+            return lines + [f"h[{k}](I[{k}])"]
+        if opcode in ("JUMPIFEQS", "JUMPIFNEQS"):
+            return lines + ["M.idx = -1", f"h[{k}](I[{k}])",
+                            f"block = {self._target(k)} if M.idx != -1 else {number + 1}"]
+
+        target = self._target(k)
+        if target is None:
+            label = instruction.operands[0].value
+            return lines + [f"raise Exceptions.SemanticError({f'Label {label} is undefined'!r})"]
+        if opcode == "JUMP":
+            return lines + [f"block = {target}"]
+        if opcode == "CALL":
+            if not instruction.tail_call:
+                lines.append(f"calls.push({k})")
+            return lines + [f"block = {target}"]
+
+        if instruction.unchecked:
+            condition = self._equal(k, 1, 2, lines)
+            if opcode == "JUMPIFNEQ":
+                condition = f"not {condition}"
+        else:
+            symb1, symb2 = instruction.operands[1:]
+            if opcode == "JUMPIFNEQ" and not symb1.type.is_nil() and not symb2.type.is_nil() \
+                    and symb1.type != symb2.type:
+                return lines + ["raise Exceptions.TypeError(\"Incompatible types in JUMPIFNEQ\")"]
+            operator = "==" if opcode == "JUMPIFEQ" else "!="
+            condition = f"{self._symb(k, 1)} {operator} {self._symb(k, 2)}"
+        return lines + [f"block = {target} if {condition} else {number + 1}"]
+
+    def _tree(self, blocks: list, low: int, high: int, indent: str) -> list:
+        """
+            Returns binary tree of conditions, that selects block with number from low to high
+            (high is the end of the program)
+        """
+        if low == high:
+            if low == self.end:
+                return [f"{indent}return"]
+            return [indent + line for line in blocks[low]]
+        middle = (low + high + 1) // 2
+        return ([f"{indent}if block < {middle}:"] + self._tree(blocks, low, middle - 1, indent + "    ")
+                + [f"{indent}else:"] + self._tree(blocks, middle, high, indent + "    "))
+
+
+def main():
+
+    source = None  # XML file with source code
+    input = None  # input file
+    source_format = "xml"
+    metrics = Metrics()
+    metrics_file = None  # file for metrics in JSON
+    recorder_file = None  # file for flight recorder, stderr if not given
+    recorder_size = FlightRecorder.SIZE
+    recorder_values = False
+    coverage_file = None  # file for coverage in JSON
+    record_file = None  # file for recorded input
+    replay_file = None  # file with input to replay
+    lazy = False
+    compile_file = None  # Python module the program is compiled into
+    warm_directory = None  # directory for outputs of warm started runs
+    profile_file = None  # file for folded stacks of sampling profiler
+    sample_hz = None
+    memory_file = None  # file for memory profile in JSON
+
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: metrics.dump(
+            sys.stderr if metrics_file is None else metrics_file))
+
+    try:
+
+        try:
+            opts, args = getopt.getopt(
+                sys.argv[1:], "hs:i:", ["help", "source=", "input=", "source-format=", "metrics=",
+                                        "flight-recorder=", "flight-recorder-size=",
+                                        "flight-recorder-values", "coverage=", "record=", "replay=", "lazy",
+                                        "compile-to=", "warm-start=", "sample-profile=", "sample-hz=",
+                                        "memprofile="])
+        except getopt.GetoptError as err:
+            raise Exceptions.OptionError(err)
+
+        for opt, arg in opts:
+            if opt in ('-h', '--help'):
+                if len(opts) > 1:
+                    raise Exceptions.OptionError(
+                        "Option --help(-h) can only be used without any other options)")
+                print(USAGE)
+                exit(0)
+            elif opt in ('-s', '--source'):
+                source = arg
+            elif opt in ('-i', '--input'):
+                input = arg
+            elif opt == '--source-format':
+                if arg not in Program.SOURCE_FORMATS:
+                    raise Exceptions.OptionError(
+                        f"Unknown source format {arg}")
+                source_format = arg
+            elif opt == '--metrics':
+                metrics_file = arg
+            elif opt == '--flight-recorder':
+                recorder_file = arg
+            elif opt == '--flight-recorder-size':
+                if not arg.isnumeric() or int(arg) < 1:
+                    raise Exceptions.OptionError(
+                        f"Invalid size of flight recorder {arg}")
+                recorder_size = int(arg)
+            elif opt == '--flight-recorder-values':
+                recorder_values = True
+            elif opt == '--coverage':
+                coverage_file = arg
+            elif opt == '--record':
+                record_file = arg
+            elif opt == '--replay':
+                replay_file = arg
+            elif opt == '--lazy':
+                lazy = True
+            elif opt == '--compile-to':
+                compile_file = arg
+            elif opt == '--warm-start':
+                warm_directory = arg
+            elif opt == '--sample-profile':
+                profile_file = arg
+            elif opt == '--sample-hz':
+                if not arg.isnumeric() or int(arg) < 1:
+                    raise Exceptions.OptionError(
+                        f"Invalid sampling frequency {arg}")
+                sample_hz = int(arg)
+            elif opt == '--memprofile':
+                memory_file = arg
+
+        if replay_file is not None and (input is not None or record_file is not None):
+            raise Exceptions.OptionError(
+                "Option --replay can't be used with --input or --record")
+
+        if sample_hz is not None and profile_file is None:
+            raise Exceptions.OptionError("Option --sample-hz needs --sample-profile")
+        if profile_file is not None and not hasattr(signal, "setitimer"):
+            raise Exceptions.OptionError("Option --sample-profile needs setitimer()")
+
+        if warm_directory is not None:
+            if any(option is not None for option in (input, metrics_file, recorder_file, coverage_file,
+                                                     record_file, replay_file, compile_file, profile_file,
+                                                     memory_file)):
+                raise Exceptions.OptionError(
+                    "Option --warm-start can't be used with --input, --metrics, --flight-recorder, "
+                    "--coverage, --record, --replay, --compile-to, --sample-profile or --memprofile")
+            if source is None:
+                raise Exceptions.OptionError("Option --warm-start needs --source")
+            if not hasattr(os, "fork"):
+                raise Exceptions.OptionError("Option --warm-start needs fork()")
+
+        if source is None:
+            source = sys.stdin
+
+        program = Program.load(source, source_format=source_format, lazy=lazy)
+        if compile_file is not None:
+            Compiler(program).write(compile_file)
+            exit(0)
+        if warm_directory is not None:
+            zygote = Zygote(program, FlightRecorder(recorder_size, recorder_values))
+            zygote.warm()
+            inputs = args or (line.rstrip("\n") for line in sys.stdin if line.strip())
+            zygote.serve(inputs, warm_directory)
+            exit(0)
+        lines = read_input_generator(input)
+        output = sys.stdout
+        if record_file is not None:
+            record = open(record_file, "wb")
+            lines = RecordLog.record(lines, record)
+            output = ChecksumWriter(sys.stdout)
+        elif replay_file is not None:
+            replay = RecordLog.load(replay_file)
+            lines = replay.replay()
+            output = ChecksumWriter(sys.stdout)
+
+        recorder = FlightRecorder(recorder_size, recorder_values)
+        profiler = None
+        if profile_file is not None:
+            profiler = SamplingProfiler(SamplingProfiler.HZ if sample_hz is None else sample_hz)
+        memory = None if memory_file is None else MemoryProfiler()
+        result = program.run(lines, output, metrics=metrics, recorder=recorder, profiler=profiler,
+                             memory=memory)
+        if profiler is not None:
+            profiler.dump(profile_file)
+        if memory is not None:
+            memory.dump(memory_file)
+
+        if record_file is not None:
+            RecordLog.finish(record, result.code, output)
+            record.close()
+        elif replay_file is not None:
+            output.flush()
+            replay.verify(result.code, output)
+
+        if metrics_file is not None:
+            metrics.dump(metrics_file)
+        if coverage_file is not None:
+            coverage = Coverage()
+            coverage.add(program, result.counts)
+            coverage.save(coverage_file)
 
     except (Exceptions.OptionError,
             Exceptions.XMLFormatError,
             Exceptions.XMLUnexpectedError,
+            Exceptions.HeaderError,
+            Exceptions.OpcodeError,
+            Exceptions.SourceSyntaxError,
             Exceptions.TypeError,
             Exceptions.SemanticError,
             Exceptions.FrameError,
@@ -1923,9 +5848,17 @@ def main():
             Exceptions.StringOperationError,
             Exceptions.ValueUndefinedError,
             Exceptions.VariableUndefinedError,
-            Exceptions.InternalError) as e:
+            Exceptions.InternalError,
+            Exceptions.ReplayError) as e:
+        if metrics_file is not None:
+            metrics.dump(metrics_file)
         Exceptions.exit(e)
 
+    if result.error is not None:
+        recorder.dump(sys.stderr if recorder_file is None else recorder_file)
+        Exceptions.exit(result.error)
+    exit(result.code)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,50 @@
+
+import getopt
+import sys
+
+from interpret import Coverage, Exceptions
+
+USAGE = """
+\bUsage: python merge_coverage.py [--help|--output=FILE] FILE...\n
+\bMerges coverage files written by `interpret.py --coverage=FILE` (or `test.py --coverage=FILE`)
+\band prints coverage of every program per label region.
+\b
+\bOPTIONS:
+\b--help           Show this message and exit.
+\b--output=FILE    Also write merged coverage into FILE.
+"""
+
+
+def main():
+    output = None
+
+    try:
+        try:
+            opts, files = getopt.getopt(sys.argv[1:], "h", ["help", "output="])
+        except getopt.GetoptError as err:
+            raise Exceptions.OptionError(err)
+
+        for opt, arg in opts:
+            if opt in ('-h', '--help'):
+                print(USAGE)
+                exit(0)
+            elif opt == '--output':
+                output = arg
+
+        if not files:
+            raise Exceptions.OptionError("No coverage files given")
+
+        coverage = Coverage()
+        for file in files:
+            coverage.merge(Coverage.load(file))
+
+    except Exceptions.OptionError as e:
+        Exceptions.exit(e)
+
+    print(coverage.report())
+    if output is not None:
+        coverage.save(output)
+
+
+if __name__ == "__main__":
+    main()
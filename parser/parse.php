@@ -27,11 +27,20 @@ enum ErrorCodes: int
     case EXIT_SUCCESS = 0; 
 }
 
+/**
+ * ParserError - error of one source, thrown instead of exiting in batch mode
+ */
+class ParserError extends Exception
+{
+}
+
 /**
  * ErrorHandler
  */
 class ErrorHandler
 {
+    // errors are thrown as ParserError instead of exiting (--batch continues with the next source)
+    public static bool $throw = false;
 
     /**
      * exit_with_error - exits program with given error code and message
@@ -42,6 +51,9 @@ class ErrorHandler
      */
     static function exit_with_error(ErrorCodes $err_code, string $message)
     {
+        if (self::$throw)
+            throw new ParserError($message, $err_code->value);
+
         fwrite(STDERR, "\e[31m[" . $err_code->name . "]\e[0m " . $message . "(" . $err_code->value . ")" . " \n");
         exit($err_code->value);
     }
@@ -281,9 +293,11 @@ class InputReader
 {
     use Formatter;
     private $input;
-    public function __construct()
+    private $file;
+    public function __construct($file = STDIN)
     {
         $this->input = [];
+        $this->file = $file;
     }
 
     /**
@@ -293,14 +307,26 @@ class InputReader
      */
     public function get_input()
     {
-        while (($line = $this->format_line(fgets(STDIN))) !== false) {
-            if ($line === NULL) continue;
-
+        foreach ($this->lines() as $line) {
             array_push($this->input, $line);
         }
 
         return $this->input;
     }
+
+    /**
+     * lines - yields formatted lines of code one by one as they are read, without keeping them
+     *
+     * @return Generator
+     */
+    public function lines()
+    {
+        while (($line = $this->format_line(fgets($this->file))) !== false) {
+            if ($line === NULL) continue;
+
+            yield $line;
+        }
+    }
 }
 
 
@@ -386,6 +412,16 @@ class Instruction
         $this->order = self::$general_order++;
     }
     
+    /**
+     * reset_order - next instruction will have order 1 (used before each source in batch mode)
+     *
+     * @return void
+     */
+    public static function reset_order()
+    {
+        self::$general_order = 1;
+    }
+
     /**
      * get_name - getter for $name
      *
@@ -425,7 +461,7 @@ class InputAnalyser
     private $input;
     private $instructions;
 
-    public function __construct($input)
+    public function __construct(iterable $input)
     {
         $this->input = $input;
         $this->instructions = [];
@@ -438,18 +474,34 @@ class InputAnalyser
      */
     public function get_instructions()
     {
-        if(count($this->input) == 0)
-            ErrorHandler::exit_with_error(ErrorCodes::ERR_HEADER, "invalid header");
-        if (!Validators::is_header($this->input[0]))
-            ErrorHandler::exit_with_error(ErrorCodes::ERR_HEADER, "invalid header");
+        foreach ($this->stream_instructions() as $instruction) {
+            array_push($this->instructions, $instruction);
+        }
 
-        array_shift($this->input);
+        return $this->instructions;
+    }
 
+    /**
+     * stream_instructions - validates header and yields validated instances of instructions one by one
+     *
+     * @return Generator
+     */
+    public function stream_instructions()
+    {
+        $header = false;
         foreach ($this->input as $line) {
-            array_push($this->instructions, new Instruction(preg_split("/\s+/", $line)));
+            if (!$header) {
+                if (!Validators::is_header($line))
+                    ErrorHandler::exit_with_error(ErrorCodes::ERR_HEADER, "invalid header");
+                $header = true;
+                continue;
+            }
+
+            yield new Instruction(preg_split("/\s+/", $line));
         }
 
-        return $this->instructions;
+        if (!$header)
+            ErrorHandler::exit_with_error(ErrorCodes::ERR_HEADER, "invalid header");
     }
 }
 
@@ -523,12 +575,156 @@ class OutputGenerator extends XMLGenerator
     }
 }
 
+/**
+ * StreamGenerator - XML generator that writes every instruction with XMLWriter as soon as it is analysed,
+ * so neither lines nor instructions of the program are kept in memory
+ */
+class StreamGenerator
+{
+    // number of instructions, after which buffered XML is written to output
+    const FLUSH_EVERY = 256;
+
+    private $instructions;
+    private $writer;
+
+    public function __construct(Generator $instructions)
+    {
+        $this->instructions = $instructions;
+        $this->writer = new XMLWriter();
+        $this->writer->openURI("php://output");
+        $this->writer->setIndent(true);
+        $this->writer->setIndentString("  ");
+    }
+
+    /**
+     * generate - writes XML code of valid instructions to output while they are analysed
+     *
+     * Invalid header is reported before anything is written. Instructions before an invalid one
+     * may already be written, the output is then incomplete and only the exit code is valid.
+     *
+     * @return void
+     */
+    public function generate()
+    {
+        // runs analysis up to the first instruction, so header is validated before anything is written
+        $this->instructions->valid();
+
+        $this->writer->startDocument("1.0", "UTF-8");
+        $this->writer->startElement("program");
+        $this->writer->writeAttribute("language", "IPPcode23");
+
+        for ($count = 1; $this->instructions->valid(); $this->instructions->next(), $count++) {
+            $instruction = $this->instructions->current();
+            $this->writer->startElement("instruction");
+            $this->writer->writeAttribute("order", $instruction->get_order());
+            $this->writer->writeAttribute("opcode", $instruction->get_name());
+
+            foreach ($instruction->get_operands() as $key => $operand) {
+                $this->writer->startElement("arg" . ($key + 1));
+                $this->writer->writeAttribute("type", strtolower($operand->type));
+                $this->writer->text($operand->value);
+                $this->writer->endElement();
+            }
+            $this->writer->endElement();
+
+            if ($count % self::FLUSH_EVERY === 0)
+                $this->writer->flush();
+        }
+
+        $this->writer->endElement();
+        $this->writer->endDocument();
+        $this->writer->flush();
+    }
+}
+
+/**
+ * BatchConverter - converts all the sources (*.src) of a directory into XML in one process
+ */
+class BatchConverter
+{
+    private $source_dir;
+    private $out_dir;
+
+    public function __construct(string $source_dir, string $out_dir)
+    {
+        $this->source_dir = $source_dir;
+        $this->out_dir = $out_dir;
+    }
+
+    /**
+     * convert - converts every source into <name>.xml (only valid ones) and <name>.rc with its exit code
+     * in output directory, and writes line "<exit code>\t<source>\t<error>" for every source to output
+     *
+     * @return int number of sources, that are not valid
+     */
+    public function convert()
+    {
+        if (!is_dir($this->source_dir))
+            ErrorHandler::exit_with_error(ErrorCodes::ERR_INPUT, "directory " . $this->source_dir . " does not exist");
+        if (!is_dir($this->out_dir) && !@mkdir($this->out_dir, 0777, true))
+            ErrorHandler::exit_with_error(ErrorCodes::ERR_OUTPUT, "can't create directory " . $this->out_dir);
+
+        $sources = glob(rtrim($this->source_dir, "/") . "/*.src");
+        sort($sources);
+
+        $failed = 0;
+        foreach ($sources as $source) {
+            $target = rtrim($this->out_dir, "/") . "/" . basename($source, ".src");
+            [$code, $message] = $this->convert_source($source, $target . ".xml");
+
+            if (@file_put_contents($target . ".rc", $code) === false)
+                ErrorHandler::exit_with_error(ErrorCodes::ERR_OUTPUT, "can't write " . $target . ".rc");
+            if ($code !== ErrorCodes::EXIT_SUCCESS->value)
+                $failed++;
+
+            echo $code . "\t" . $source . "\t" . $message . "\n";
+        }
+
+        return $failed;
+    }
+
+    /**
+     * convert_source - converts one source into XML file
+     *
+     * @param  string $source
+     * @param  string $target
+     * @return array exit code and error message of the source
+     */
+    private function convert_source(string $source, string $target)
+    {
+        @unlink($target);
+
+        $file = @fopen($source, "r");
+        if ($file === false)
+            return [ErrorCodes::ERR_INPUT->value, "can't open " . $source];
+
+        Instruction::reset_order();
+        ErrorHandler::$throw = true;
+        try {
+            $inputAnalyser = new InputAnalyser((new InputReader($file))->get_input());
+            $output = (new OutputGenerator($inputAnalyser->get_instructions()))->generate();
+        } catch (ParserError $e) {
+            return [$e->getCode(), $e->getMessage()];
+        } finally {
+            ErrorHandler::$throw = false;
+            fclose($file);
+        }
+
+        if (@file_put_contents($target, $output) === false)
+            return [ErrorCodes::ERR_OUTPUT->value, "can't write " . $target];
+        return [ErrorCodes::EXIT_SUCCESS->value, ""];
+    }
+}
+
 /* Main here */
 
 $shortopts = "h";
 
 $longopts = [
     "help",
+    "stream",
+    "batch:",
+    "out:",
 ];
 
 $options = getopt($shortopts, $longopts);
@@ -545,11 +741,36 @@ if (isset($options["help"])) {
 
    \rDefault options:
    \r  --help or -h\tprints help info
+   \r  --stream\twrites every instruction as soon as it is read (bounded memory),
+   \r\t\toutput of invalid source may be incomplete
+   \r  --batch=DIR --out=DIR
+   \r\t\tconverts every DIR/*.src into <name>.xml and <name>.rc (exit code) in --out DIR,
+   \r\t\twrites \"<exit code>\\t<source>\\t<error>\" line for every source
    \r\n";
     exit(0);
 }
 
+if (isset($options["batch"]) || isset($options["out"])) {
+    if (!isset($options["batch"]) || !isset($options["out"]) || isset($options["stream"])
+            || is_array($options["batch"]) || is_array($options["out"]))
+        ErrorHandler::exit_with_error(ErrorCodes::ERR_PARAMETER, "--batch and --out must be used together once, without --stream");
+
+    $converter = new BatchConverter($options["batch"], $options["out"]);
+    $converter->convert();
+
+    exit(0);
+}
+
 $reader = new InputReader();
+
+if (isset($options["stream"])) {
+    $inputAnalyser = new InputAnalyser($reader->lines());
+    $output_generator = new StreamGenerator($inputAnalyser->stream_instructions());
+    $output_generator->generate();
+
+    exit(0);
+}
+
 $input = $reader->get_input();
 
 $inputAnalyser = new InputAnalyser($input);
@@ -0,0 +1,413 @@
+
+import getopt
+import html
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+USAGE = """
+\bUsage: python test.py [--help|OPTIONS]\n
+\bOPTIONS:
+\b--help                 Show this message and exit.
+\b--directory=PATH       Look for tests in specified directory.
+\b--recursive            Look for tests in specified directory and its subdirectories.
+\b--parse-script=FILE    PHP 8.1 script for the analysis of a source code in IPPcode23.
+\b--int-script=FILE      Python 3.8 script for the interpreter of XML representation of IPPcode23.
+\b--parse-only           Test only parser.
+\b--int-only             Test only interpreter.
+\b--jexampath=PATH       Path to directory containing jexamxml.jar.
+\b--noclean              Don't remove temporary files.
+\b--jobs=N               Number of tests that run in parallel (default: number of CPUs).
+\b--json=FILE            Also write results as JSON into FILE.
+\b--coverage=FILE        Write merged instruction coverage of all tests into FILE
+\b                       (see interpret/merge_coverage.py).
+\b
+\bInterpreter is imported and run in process (see `Program` in interpret.py),
+\bparser converts all the tests of a directory in one process (parse.php --batch).
+"""
+
+
+class Options:
+    """
+        Class that holds command line options of the test runner
+    """
+
+    def __init__(self):
+        self.directory = "."
+        self.recursive = False
+        self.parse_script = "parse.php"
+        self.int_script = "interpret.py"
+        self.parse_only = False
+        self.int_only = False
+        self.jexampath = "/pub/courses/ipp/jexamxml/"
+        self.noclean = False
+        self.jobs = os.cpu_count() or 1
+        self.json = None
+        self.coverage = None
+
+    @classmethod
+    def parse(cls, argv: list) -> 'Options':
+        """
+            Parses command line arguments, exits with code 10 or 41 on invalid ones
+        """
+        options = cls()
+        try:
+            opts, args = getopt.getopt(argv, "", [
+                "help", "directory=", "recursive", "parse-script=", "int-script=",
+                "parse-only", "int-only", "jexampath=", "noclean", "jobs=", "json=",
+                "coverage="])
+        except getopt.GetoptError as err:
+            print(err, file=sys.stderr)
+            exit(10)
+
+        for opt, arg in opts:
+            if opt == "--help":
+                print(USAGE)
+                exit(0)
+            elif opt == "--directory":
+                options.directory = _existing(arg)
+            elif opt == "--recursive":
+                options.recursive = True
+            elif opt == "--parse-script":
+                options.parse_script = _existing(arg)
+            elif opt == "--int-script":
+                options.int_script = _existing(arg)
+            elif opt == "--parse-only":
+                options.parse_only = True
+            elif opt == "--int-only":
+                options.int_only = True
+            elif opt == "--jexampath":
+                options.jexampath = os.path.join(_existing(arg), "")
+            elif opt == "--noclean":
+                options.noclean = True
+            elif opt == "--jobs":
+                if not arg.isnumeric() or int(arg) < 1:
+                    print(f"Invalid number of jobs: {arg}", file=sys.stderr)
+                    exit(10)
+                options.jobs = int(arg)
+            elif opt == "--json":
+                options.json = arg
+            elif opt == "--coverage":
+                options.coverage = arg
+
+        if options.int_only and options.parse_only:
+            print("Incorrect flag combination [--int-only && --parse-only]", file=sys.stderr)
+            exit(10)
+        if not options.parse_only and not os.path.exists(options.int_script):
+            print(f"{options.int_script} not found", file=sys.stderr)
+            exit(41)
+        if not options.int_only and not os.path.exists(options.parse_script):
+            print(f"{options.parse_script} not found", file=sys.stderr)
+            exit(41)
+        if options.parse_only:
+            for name in ("jexamxml.jar", "options"):
+                if not os.path.exists(options.jexampath + name):
+                    print(f"{options.jexampath}{name} not found", file=sys.stderr)
+                    exit(41)
+        return options
+
+
+def _existing(path: str) -> str:
+    if not os.path.exists(path):
+        print(f"{path} not found", file=sys.stderr)
+        exit(41)
+    return path
+
+
+def _read(path: str) -> str:
+    with open(path, "r") as file:
+        return file.read()
+
+
+class TestFile:
+    """
+        Class that represents single test (path without extension of its .src/.in/.out/.rc files)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path = os.path.dirname(name)
+        self.parsed = None  # (XML, return code) of parser, if it was run in batch
+
+    def file(self, extension: str) -> str:
+        return f"{self.name}.{extension}"
+
+    @staticmethod
+    def find(directory: str, recursive: bool) -> list:
+        """
+            Finds all tests with .src file, missing .in/.out/.rc files are created
+        """
+        tests = []
+        for path, dirs, files in os.walk(directory):
+            if not recursive:
+                dirs.clear()
+            dirs.sort()
+            for file in sorted(files):
+                name, extension = os.path.splitext(file)
+                if extension != ".src":
+                    continue
+                test = TestFile(os.path.join(os.path.realpath(path), name))
+                for extension, default in (("in", ""), ("out", ""), ("rc", "0")):
+                    if not os.path.exists(test.file(extension)):
+                        with open(test.file(extension), "w") as f:
+                            f.write(default)
+                tests.append(test)
+        return tests
+
+
+_interpret = None
+
+
+def _load_interpret(path: str):
+    """
+        Imports interpreter script as a module (once per worker process)
+    """
+    global _interpret
+    spec = importlib.util.spec_from_file_location("interpret", path)
+    _interpret = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(_interpret)
+
+
+def _interpret_xml(source, input: str):
+    """
+        Runs interpreter in process
+
+        Return:
+            (output, return code, coverage entries of the run)
+    """
+    try:
+        program = _interpret.Program.load(source)
+        result = program.run(input, stderr=io.StringIO())
+        coverage = _interpret.Coverage()
+        coverage.add(program, result.counts)
+        return result.stdout, result.code, list(coverage.programs.values())
+    except _interpret.Exceptions._Exception as e:
+        return "", e.code, []
+    except Exception:
+        # the same as uncaught exception in separate process
+        return "", 1, []
+
+
+def _run_test(test: TestFile, options: Options) -> dict:
+    """
+        Runs single test
+
+        Return:
+            dictionary with output, return code, expected values and wall time of the test
+    """
+    start = time.perf_counter()
+    expected_out = _read(test.file("out"))
+    expected_rc = _read(test.file("rc")).strip()
+    is_ok = None
+    coverage = []
+
+    if options.int_only:
+        output, rc, coverage = _interpret_xml(test.file("src"), _read(test.file("in")))
+    else:
+        if test.parsed is None:
+            with open(test.file("src"), "rb") as src:
+                parsed = subprocess.run(["php", options.parse_script], stdin=src,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            test.parsed = (parsed.stdout, parsed.returncode)
+        xml, rc = test.parsed
+        output = xml.decode()
+
+        if options.parse_only:
+            if expected_rc == "0" and rc == 0:
+                is_ok = _jexamxml(test, output, options)
+        elif rc == 0:
+            output, rc, coverage = _interpret_xml(xml, _read(test.file("in")))
+
+    if is_ok is None:
+        is_ok = output == expected_out and str(rc) == expected_rc
+
+    return {
+        "name": os.path.basename(test.name),
+        "path": test.path,
+        "ok": is_ok,
+        "output": output,
+        "rc": rc,
+        "expected_output": expected_out,
+        "expected_rc": expected_rc,
+        "time": time.perf_counter() - start,
+        "coverage": coverage,
+    }
+
+
+def _jexamxml(test: TestFile, output: str, options: Options) -> bool:
+    """
+        Compares XML output of parser with expected one using jexamxml.jar
+    """
+    output_file = f"{test.name}_tempOut.xml"
+    delta_file = f"{test.name}_tempDelta.xml"
+    with open(output_file, "w") as f:
+        f.write(output)
+    rc = subprocess.run(["java", "-jar", options.jexampath + "jexamxml.jar",
+                         output_file, test.file("out"), delta_file, "-D",
+                         options.jexampath + "options"],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+    if not options.noclean:
+        for file in (output_file, output_file + ".log", delta_file):
+            if os.path.exists(file):
+                os.remove(file)
+    return rc == 0
+
+
+def parse_batch(tests: list, options: Options):
+    """
+        Runs parser once per directory of tests (parse.php --batch) and stores its results
+        into `TestFile.parsed`. Tests without result are parsed one by one later.
+    """
+    directories = {}
+    for test in tests:
+        directories.setdefault(test.path, []).append(test)
+
+    for path, directory_tests in directories.items():
+        with tempfile.TemporaryDirectory() as out:
+            subprocess.run(["php", options.parse_script, f"--batch={path}", f"--out={out}"],
+                           stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            for test in directory_tests:
+                name = os.path.join(out, os.path.basename(test.name))
+                if not os.path.exists(f"{name}.rc"):
+                    continue
+                rc = int(_read(f"{name}.rc"))
+                xml = b""
+                if rc == 0:
+                    with open(f"{name}.xml", "rb") as file:
+                        xml = file.read()
+                test.parsed = (xml, rc)
+
+
+def _run_chunk(tests: list, options: Options) -> list:
+    if _interpret is None and not options.parse_only:
+        _load_interpret(options.int_script)
+    return [_run_test(test, options) for test in tests]
+
+
+def run_tests(tests: list, options: Options) -> list:
+    """
+        Runs tests in `options.jobs` worker processes. Every worker imports
+        the interpreter once and runs its tests in process.
+    """
+    if options.jobs == 1 or len(tests) < 2:
+        return _run_chunk(tests, options)
+
+    chunks = [tests[i::options.jobs] for i in range(options.jobs)]
+    results = []
+    with ProcessPoolExecutor(max_workers=options.jobs) as executor:
+        for chunk in executor.map(_run_chunk, chunks, [options] * len(chunks)):
+            results.extend(chunk)
+    return sorted(results, key=lambda r: (r["path"], r["name"]))
+
+
+class TestEnv:
+    """
+        Class that holds all the test results and generates reports
+    """
+
+    def __init__(self, results: list, wall_time: float):
+        self.results = results
+        self.wall_time = wall_time
+        self.ok = sum(1 for r in results if r["ok"])
+        self.failed = len(results) - self.ok
+
+    def _by_path(self, ok: bool) -> dict:
+        paths = {}
+        for result in self.results:
+            if result["ok"] == ok:
+                paths.setdefault(result["path"], []).append(result)
+        return paths
+
+    def get_json(self) -> str:
+        return json.dumps({
+            "tests": len(self.results),
+            "passed": self.ok,
+            "failed": self.failed,
+            "time": self.wall_time,
+            "results": [{key: value for key, value in result.items() if key != "coverage"}
+                        for result in self.results],
+        }, indent=2)
+
+    def get_html(self) -> str:
+        e = html.escape
+        out = [f"""<!DOCTYPE html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="description" content="Test results">
+    <style>
+    th, td {{ padding-left:10px; padding-right:10px; color:white; }}
+    h1,h2,h3,h4 {{ color:white; }}
+    textarea {{ background-color: rgb(18, 18, 18); color:white; }}
+    body {{ padding-left: 1em; padding-right: 1em; background-color: rgb(18, 18, 18); }}
+    </style>
+</head>
+
+<body>
+    <h1 style="text-align: center;">Test result</h1>
+    <h2>Tests run: {len(self.results)}</h2>
+    <h2>Passed: {self.ok} </h2>
+    <h2>Failed: {self.failed} </h2>
+    <h2>Wall time: {self.wall_time:.3f} s</h2>
+    <hr>
+    <h3 style="text-align: center; color:red">Failed tests</h3>"""]
+
+        for path, results in self._by_path(False).items():
+            out.append(f"<hr><h4>{e(path)}</h4><table><tr><th>Test name</th><th>Return code</th>"
+                       "<th>Expected return code</th><th>Output</th><th>Expected output</th>"
+                       "<th>Time [s]</th></tr>")
+            for r in results:
+                out.append(f"\n<tr><td>{e(r['name'])}</td><td>{r['rc']}</td><td>{e(r['expected_rc'])}</td>"
+                           f"<td><textarea readonly rows=5 cols=50>{e(r['output'])}</textarea></td>"
+                           f"<td><textarea readonly rows=5 cols=50>{e(r['expected_output'])}</textarea></td>"
+                           f"<td>{r['time']:.3f}</td></tr>\n")
+            out.append("\n</table>\n")
+
+        out.append("<hr><h3 style=\"text-align: center; color:green\">Passed tests</h3>")
+
+        for path, results in self._by_path(True).items():
+            out.append(f"<hr><h4>{e(path)}</h4><table><tr><th>Test name</th><th>Return code</th>"
+                       "<th>Output</th><th>Time [s]</th></tr>")
+            for r in results:
+                out.append(f"\n<tr><td>{e(r['name'])}</td><td>{r['rc']}</td>"
+                           f"<td><textarea readonly rows=5 cols=50>{e(r['expected_output'])}</textarea></td>"
+                           f"<td>{r['time']:.3f}</td></tr>\n")
+            out.append("\n</table>\n")
+
+        return "".join(out) + "</body></html>"
+
+
+def main():
+    options = Options.parse(sys.argv[1:])
+    options.int_script = os.path.realpath(options.int_script)
+
+    start = time.perf_counter()
+    tests = TestFile.find(options.directory, options.recursive)
+    if not options.int_only:
+        parse_batch(tests, options)
+    results = run_tests(tests, options)
+    env = TestEnv(results, time.perf_counter() - start)
+
+    if options.coverage is not None:
+        if _interpret is None:
+            _load_interpret(options.int_script)
+        coverage = _interpret.Coverage()
+        for result in results:
+            for entry in result["coverage"]:
+                coverage.merge_program(entry)
+        coverage.save(options.coverage)
+
+    print(env.get_html())
+    if options.json is not None:
+        with open(options.json, "w") as file:
+            file.write(env.get_json())
+
+
+if __name__ == "__main__":
+    main()